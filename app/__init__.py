@@ -1,5 +1,9 @@
+import os
+
 from flask import Flask
 from flask_login import LoginManager
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import inspect
 from .config import Config
 from .models import db, User
 
@@ -8,10 +12,17 @@ login_manager = LoginManager()
 login_manager.login_view = 'auth.login'  # redirect here if not logged in
 login_manager.login_message = "Please log in to access this page."
 
-def create_app():
-    # Application factory
+def create_app(config=None):
+    # Application factory; `config` overrides settings (e.g. from the test suite)
     app = Flask(__name__)
     app.config.from_object(Config)  # load config settings
+    if config:
+        app.config.update(config)
+
+    # Reuse compiled templates across process starts (see `flask compile-templates`)
+    cache_dir = app.config['TEMPLATE_CACHE_DIR'] or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(cache_dir)}
     
     # Initialize extensions with app
     db.init_app(app)
@@ -29,8 +40,66 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(main_bp)
 
-    # Create database tables if they don't exist
+    # Read replicas for GET requests (see app/routing.py)
+    from . import routing
+    routing.init_app(app)
+
+    # Per-course database shards (see app/sharding.py)
+    from . import sharding
+    sharding.init_app(app)
+
+    # Fingerprinted static assets and response compression
+    from . import assets
+    assets.init_app(app)
+
+    # Two-level read cache (L1 per process, L2 shared SQLite file)
+    from . import cache
+    cache.init_app(app)
+
+    # Idempotency keys for write endpoints
+    from . import idempotency
+    idempotency.init_app(app)
+
+    # Background task queue (starts in-process workers on demand)
+    from . import tasks
+    tasks.init_app(app)
+
+    # Register maintenance CLI commands
+    from .commands import register_commands
+    register_commands(app)
+
+    # The factory never touches the database; create the tables with
+    # `flask init-db` (run.py does it for the development server)
+    return app
+
+
+def init_db(app):
+    """
+    Create any missing tables in the main database and every bind, bring older
+    tables' columns, foreign keys and AUTOINCREMENT up to date, fill a newly
+    created schedule table from the existing memberships, create the course
+    shards, then refresh the read replicas.
+    """
+    from .routing import replicas, sync_replicas
+    from .schema import add_missing_columns, upgrade_foreign_keys
+    from .sharding import create_shards
+
     with app.app_context():
+        had_schedules = inspect(db.engine).has_table('schedule_entry')
         db.create_all()
-    
-    return app
+        for key, metadata in db.metadatas.items():
+            for name in add_missing_columns(db.engines[key], metadata):
+                app.logger.info('Added column %s', name)
+            for name in upgrade_foreign_keys(db.engines[key], metadata):
+                app.logger.info('Rebuilt table %s with its ON DELETE rules and AUTOINCREMENT', name)
+        # Events recorded before AUTOINCREMENT may have reused ids the digest already covered
+        from .notifications import reserve_sent_event_ids
+        reserve_sent_event_ids()
+        if not had_schedules:
+            # A database from before the schedule table already has memberships
+            from .main import schedule
+            schedule.rebuild()
+            db.session.commit()
+        create_shards(app)
+        if replicas(app):
+            sync_replicas()
@@ -0,0 +1,251 @@
+# app/asgi.py
+"""
+ASGI deployment mode (run with `uvicorn asgi:app`, see asgi.py at the repo root).
+
+The read-heavy GET endpoints are served natively by coroutines that query
+SQLite through SQLAlchemy's asyncio extension and the aiosqlite driver:
+
+    /sessions                              the sessions listing
+    /session/<id>                          the detail page
+    /session/<id>/comments/fragment        comment fragment (long-poll with ?wait=)
+
+While they wait on the database or a long poll, they hold no thread. Every
+other request (forms, writes, auth, static files, exports, archived
+sessions, ...) goes to the unchanged Flask app through asgiref's WsgiToAsgi, on the
+event loop's default thread pool.
+The async handlers render the same templates inside a Flask request
+context, so sessions, flashed messages, after_request hooks and cookies
+behave exactly as on the WSGI path. With course shards configured
+(COURSE_SHARDS, see app/sharding.py) every request goes to the Flask app.
+
+Needs the packages in requirements-asgi.txt.
+"""
+import asyncio
+import random
+import re
+import time
+from datetime import datetime
+
+from flask import g, render_template, request, session
+from sqlalchemy import select
+
+try:
+    from asgiref.sync import sync_to_async
+    from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+    from sqlalchemy.ext.asyncio import create_async_engine
+except ImportError as exc:  # optional dependencies
+    raise ImportError('The ASGI mode needs the packages in requirements-asgi.txt') from exc
+
+from app import create_app, routing, sharding
+from app.forms import SessionCommentForm
+from app.main import recommend, summaries
+from app.main.utils import suggest_location
+from app.models import db, SessionWaitlist, User
+
+
+class _WsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs every WSGI call on one shared thread by default; Flask
+    # requests don't need that, so spread them over the loop's thread pool
+    run_wsgi_app = sync_to_async(vars(WsgiToAsgiInstance)['run_wsgi_app'].func, thread_sensitive=False)
+
+
+class _WsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await _WsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+def _async_url(engine):
+    return engine.url.set(drivername='sqlite+aiosqlite')
+
+
+def _environ(scope):
+    """A WSGI environ for the ASGI request, so Flask can build its request context."""
+    server, port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server,
+        'SERVER_PORT': str(port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': None,
+        'wsgi.errors': None,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class AsgiApp:
+    """ASGI application: async read endpoints in front of the Flask app."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = _WsgiToAsgi(flask_app)
+        with flask_app.app_context():
+            self.primary = create_async_engine(_async_url(db.engines[None]))
+        self.replicas = [create_async_engine(_async_url(e)) for e in routing.replicas(flask_app)]
+        self.routes = [
+            (re.compile(r'/sessions'), self.view_sessions),
+            (re.compile(r'/session/(\d+)'), self.session_detail),
+            (re.compile(r'/session/(\d+)/comments/fragment'), self.comments_fragment),
+        ]
+        if sharding.shards(flask_app):
+            # The async queries only know the primary database
+            self.routes = []
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            for pattern, handler in self.routes:
+                match = pattern.fullmatch(scope['path'])
+                if match:
+                    response = await self._handle(scope, handler, *match.groups())
+                    if response is not None:
+                        await self._send(scope, send, response)
+                        return
+        await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dispose(self):
+        for engine in [self.primary, *self.replicas]:
+            await engine.dispose()
+
+    # -- request plumbing -------------------------------------------------------
+
+    async def _handle(self, scope, handler, *args):
+        """
+        Run a handler inside a Flask request context. Returns the Flask response,
+        or None to let the WSGI app answer instead (not logged in, archived
+        session, ...).
+        """
+        app = self.flask_app
+        with app.request_context(_environ(scope)):
+            user_id = session.get('_user_id')
+            if user_id is None:
+                return None
+            early = app.preprocess_request()
+            if early is not None:
+                # A before_request hook answered (maintenance page, redirect, ...)
+                return app.process_response(app.make_response(early))
+
+            sticky = session.get(routing.STICKY_KEY, 0) > time.time()
+            engine = random.choice(self.replicas) if self.replicas and not sticky else self.primary
+            async with engine.connect() as conn:
+                row = (await conn.execute(
+                    select(User.id, User.username, User.email).where(User.id == int(user_id)))).first()
+            if row is None:
+                return None
+            # flask_login reads the user from g; a detached User needs no query
+            g._login_user = User(id=row.id, username=row.username, email=row.email)
+            response = await handler(engine, row.id, *args)
+            if response is None:
+                return None
+            return app.process_response(app.make_response(response))
+
+    async def _send(self, scope, send, response):
+        body = b'' if scope['method'] == 'HEAD' else response.get_data()
+        headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _in_app_context(self, func, *args):
+        with self.flask_app.app_context():
+            return func(*args)
+
+    # -- endpoints ----------------------------------------------------------------
+
+    async def view_sessions(self, engine, user_id):
+        joined, available = [], []
+        today = datetime.utcnow().date()
+        async with engine.connect() as conn:
+            rows = (await conn.execute(summaries.summary_query(user_id))).all()
+        for row in rows:
+            summary = summaries.SessionSummary(row, today)
+            (joined if summary.is_member else available).append(summary)
+        # The recommendation index lives in memory but may need (sync) rebuilding
+        available, recommended_ids = await asyncio.to_thread(
+            self._in_app_context, recommend.order_available, user_id, available)
+        return render_template(
+            'main/sessions.html',
+            joined_sessions=joined,
+            available_sessions=available,
+            recommended_ids=recommended_ids,
+        )
+
+    async def session_detail(self, engine, user_id, session_id):
+        session_id = int(session_id)
+        async with engine.connect() as conn:
+            row = (await conn.execute(summaries.detail_query(session_id))).first()
+            if row is None:
+                return None   # archived or missing: the WSGI view handles it
+            members = (await conn.execute(summaries.members_query(session_id))).all()
+            comments = (await conn.execute(summaries.comments_query(session_id))).all()
+            waitlisted = (await conn.execute(
+                select(SessionWaitlist.id).where(
+                    SessionWaitlist.session_id == session_id, SessionWaitlist.user_id == user_id)
+            )).first() is not None
+        detail = summaries.SessionDetail(row, members, comments, datetime.utcnow().date())
+
+        is_member = any(member.id == user_id for member in detail.members)
+        is_waitlisted = not is_member and waitlisted
+        return render_template(
+            'main/session_detail.html',
+            session=detail,
+            is_member=is_member,
+            is_waitlisted=is_waitlisted,
+            is_creator=detail.creator_id == user_id,
+            comment_form=SessionCommentForm(),
+            location_suggestion=suggest_location(detail.participant_count),
+            poll_wait=self.flask_app.config['COMMENT_POLL_MAX_WAIT'],
+        )
+
+    async def comments_fragment(self, engine, user_id, session_id):
+        config = self.flask_app.config
+        session_id = int(session_id)
+        after_id = request.args.get('after', type=int)
+        wait = min(request.args.get('wait', 0, type=float), config['COMMENT_POLL_MAX_WAIT'])
+        deadline = time.monotonic() + wait
+
+        async with engine.connect() as conn:
+            if (await conn.execute(summaries.detail_query(session_id))).first() is None:
+                return None
+        while True:
+            # A connection only for the query itself: waiting holds neither a
+            # pooled connection nor a read snapshot
+            async with engine.connect() as conn:
+                comments = [summaries.CommentItem(*row) for row in
+                            await conn.execute(summaries.comments_query(session_id, after_id))]
+            if comments or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(config['COMMENT_POLL_INTERVAL'])
+
+        if not comments:
+            return '', 204
+        return render_template('main/_comments.html', comments=comments)
+
+
+def create_asgi_app(config=None):
+    """Build the Flask app and wrap it for an ASGI server."""
+    return AsgiApp(create_app(config))
@@ -0,0 +1,173 @@
+# app/assets.py
+"""
+Static asset fingerprinting and response compression.
+
+`flask build-assets` copies every file in app/static to the dist folder under
+a content-hashed name (styles.css -> styles.3f2a9c1b7d4e.css), writes gzip
+(and brotli, when the optional `brotli` package is installed) variants next to
+it, and records the mapping in manifest.json. Templates call
+asset_url('styles.css'), which resolves the hashed name; those URLs never
+change content, so they are served with a one-year immutable Cache-Control
+and the precompressed variant the client accepts. Without a build, asset_url
+falls back to the plain /static URL.
+
+Dynamic responses (HTML, JSON, CSV, ...) above COMPRESS_MIN_SIZE bytes are
+compressed on the fly with the best encoding the client accepts.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import Blueprint, abort, current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+assets_bp = Blueprint('assets', __name__)
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+# Encodings we can produce, best first
+_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def dist_folder(app):
+    return app.config['ASSETS_DIST_FOLDER'] or os.path.join(app.static_folder, 'dist')
+
+
+# ---------------------------------------------------------------------------
+# Build step
+# ---------------------------------------------------------------------------
+
+def build_assets(static_folder, output_folder):
+    """Fingerprint and precompress every static file. Returns the manifest."""
+    if os.path.isdir(output_folder):
+        shutil.rmtree(output_folder)
+    os.makedirs(output_folder)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        # Never fingerprint a previous build
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != os.path.abspath(output_folder)]
+        for name in files:
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as fh:
+                data = fh.read()
+
+            stem, ext = os.path.splitext(logical)
+            hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+            target = os.path.join(output_folder, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as fh:
+                fh.write(data)
+            with open(target + '.gz', 'wb') as fh:
+                fh.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(target + '.br', 'wb') as fh:
+                    fh.write(brotli.compress(data, quality=11))
+            manifest[logical] = hashed
+
+    with open(os.path.join(output_folder, 'manifest.json'), 'w') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    return manifest
+
+
+def _manifest():
+    app = current_app._get_current_object()
+    manifest = app.extensions.get('asset_manifest')
+    if manifest is None:
+        try:
+            with open(os.path.join(dist_folder(app), 'manifest.json')) as fh:
+                manifest = json.load(fh)
+        except FileNotFoundError:
+            manifest = {}
+        app.extensions['asset_manifest'] = manifest
+    return manifest
+
+
+def asset_url(filename):
+    """URL of a static file, fingerprinted when the assets have been built."""
+    hashed = _manifest().get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('assets.fingerprinted', filename=hashed)
+
+
+# ---------------------------------------------------------------------------
+# Serving
+# ---------------------------------------------------------------------------
+
+def _accepted_encoding(available=_ENCODINGS):
+    for encoding in available:
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+@assets_bp.route('/assets/<path:filename>')
+def fingerprinted(filename):
+    folder = dist_folder(current_app)
+    if filename not in _manifest().values():
+        abort(404)
+
+    variants = [e for e in _ENCODINGS if os.path.exists(os.path.join(folder, filename + _SUFFIXES[e]))]
+    encoding = _accepted_encoding(variants)
+    if encoding:
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(
+            folder, filename + _SUFFIXES[encoding], mimetype=mimetype, max_age=ONE_YEAR)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(folder, filename, max_age=ONE_YEAR)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def compress_response(response):
+    """after_request hook: compress eligible dynamic responses."""
+    config = current_app.config
+    if (
+        not config['COMPRESS_ENABLED']
+        or response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in config['COMPRESS_MIMETYPES']
+    ):
+        return response
+
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _accepted_encoding()
+    if encoding is None:
+        return response
+
+    if encoding == 'br':
+        body = brotli.compress(data, quality=config['COMPRESS_LEVEL'])
+    else:
+        body = gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'])
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # The representation changed, so a strong ETag no longer matches it
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    app.register_blueprint(assets_bp)
+    app.after_request(compress_response)
+    app.jinja_env.globals['asset_url'] = asset_url
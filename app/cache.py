@@ -0,0 +1,362 @@
+# app/cache.py
+"""
+Two-level cache for read models that are viewed far more often than they change.
+
+L1 is an LRU dict in each process (CACHE_L1_SIZE entries). L2 is a SQLite file
+shared by every process on the host (CACHE_L2_PATH, default
+<instance>/cache.sqlite3), so a value computed by one worker serves all of
+them. Values are pickled; anything that is not picklable cannot be cached.
+
+Keys are versioned. Each cached key belongs to a tag (e.g. 'session:42')
+whose version number lives in L2, and values are stored under
+'<key>@<version>'. invalidate(tag) bumps the version, which makes every
+value under the tag unreachable at once in all processes. A value computed
+from data read before a write commits can only land under the old version,
+so the race between a slow fill and an invalidation can't leave stale data
+behind. Each process re-reads a tag's version at most every CACHE_L1_TTL
+seconds, so other processes see an invalidation within that window; the
+process that invalidates sees it at once.
+
+A missing value is computed once: threads of one process wait on a per-key
+lock, and other processes wait (up to CACHE_LEASE_TIMEOUT) on a lease row in
+L2 for the value to appear. Hits, misses and waits are counted in stats().
+
+L2 failures (a locked or unreadable file) are logged and treated as misses,
+so the cache never takes a page down. Set CACHE_L2_PATH to '' for L1 only.
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entry (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS cache_version (tag TEXT PRIMARY KEY, version INTEGER NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS cache_lease (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)',
+)
+
+
+class SQLiteStore:
+    """
+    A small SQLite file shared by the processes on one host, in autocommit
+    mode. Subclasses list their CREATE TABLE IF NOT EXISTS statements in
+    `schema`; the file and tables are created on first use.
+    """
+
+    schema = ()
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        # One connection per thread, reopened in forked workers
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in self.schema:
+                conn.execute(statement)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+
+class L2Store(SQLiteStore):
+    """The shared SQLite file: values, tag versions and fill leases."""
+
+    schema = _SCHEMA
+
+    def get(self, key, now):
+        row = self._conn().execute(
+            'SELECT value, expires_at FROM cache_entry WHERE key = ? AND expires_at > ?', (key, now)).fetchone()
+        return _MISSING if row is None else (row[1], row[0])
+
+    def set(self, key, data, expires_at):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO cache_entry (key, value, expires_at) VALUES (?, ?, ?)', (key, data, expires_at))
+
+    def version(self, tag):
+        row = self._conn().execute('SELECT version FROM cache_version WHERE tag = ?', (tag,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, tag):
+        return self._conn().execute(
+            'INSERT INTO cache_version (tag, version) VALUES (?, 1) '
+            'ON CONFLICT (tag) DO UPDATE SET version = version + 1 RETURNING version', (tag,)).fetchone()[0]
+
+    def acquire_lease(self, key, now, seconds):
+        conn = self._conn()
+        conn.execute('DELETE FROM cache_lease WHERE key = ? AND expires_at <= ?', (key, now))
+        return conn.execute(
+            'INSERT OR IGNORE INTO cache_lease (key, expires_at) VALUES (?, ?)', (key, now + seconds)).rowcount == 1
+
+    def release_lease(self, key):
+        self._conn().execute('DELETE FROM cache_lease WHERE key = ?', (key,))
+
+    def purge_expired(self, now):
+        conn = self._conn()
+        removed = conn.execute('DELETE FROM cache_entry WHERE expires_at <= ?', (now,)).rowcount
+        conn.execute('DELETE FROM cache_lease WHERE expires_at <= ?', (now,))
+        return removed
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute('DELETE FROM cache_entry')
+        conn.execute('DELETE FROM cache_lease')
+
+    def size(self):
+        return self._conn().execute('SELECT count(*) FROM cache_entry').fetchone()[0]
+
+
+class Cache:
+    """L1 LRU in front of an optional L2Store, with versioned keys."""
+
+    def __init__(self, l2=None, l1_size=1024, l1_ttl=2.0, default_ttl=300, lease_timeout=2.0):
+        self.l2 = l2
+        self.l1_size = l1_size
+        self.l1_ttl = l1_ttl
+        self.default_ttl = default_ttl
+        self.lease_timeout = lease_timeout
+        self._l1 = OrderedDict()      # versioned key -> (expires_at, value)
+        self._versions = {}           # tag -> (version, checked_at)
+        self._fills = {}              # versioned key -> lock held while computing it
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    # -- versions ---------------------------------------------------------------
+
+    def version(self, tag):
+        """Current version of a tag (re-read from L2 at most every l1_ttl seconds)."""
+        now = time.monotonic()
+        cached = self._versions.get(tag)
+        if cached is not None and now - cached[1] < self.l1_ttl:
+            return cached[0]
+        version = cached[0] if cached else 0
+        if self.l2 is not None:
+            try:
+                version = self.l2.version(tag)
+            except sqlite3.Error:
+                self._l2_failed('read the version of', tag)
+        self._versions[tag] = (version, now)
+        return version
+
+    def invalidate(self, *tags):
+        """Make every value cached under the tags stale, in every process."""
+        for tag in tags:
+            version = self._versions.get(tag, (0, 0))[0] + 1
+            if self.l2 is not None:
+                try:
+                    version = self.l2.bump(tag)
+                except sqlite3.Error:
+                    self._l2_failed('invalidate', tag)
+            self._versions[tag] = (version, time.monotonic())
+            self._count('invalidations')
+
+    # -- reads ------------------------------------------------------------------
+
+    def _l1_get(self, key, now):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= now:
+                del self._l1[key]
+                return _MISSING
+            self._l1.move_to_end(key)
+            return entry[1]
+
+    def _l1_set(self, key, value, expires_at):
+        with self._lock:
+            self._l1[key] = (expires_at, value)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_size:
+                self._l1.popitem(last=False)
+
+    def _l2_get(self, key, now):
+        if self.l2 is None:
+            return _MISSING
+        try:
+            entry = self.l2.get(key, now)
+            if entry is _MISSING:
+                return _MISSING
+            expires_at, data = entry
+            value = pickle.loads(data)
+        except sqlite3.Error:
+            self._l2_failed('read', key)
+            return _MISSING
+        except Exception:
+            # Written by an older version of the code; recompute it
+            return _MISSING
+        self._l1_set(key, value, expires_at)
+        return value
+
+    def _l2_failed(self, action, key):
+        self._count('l2_errors')
+        logger.warning('Cache L2 (%s): could not %s %s', self.l2.path, action, key, exc_info=True)
+
+    def get_or_set(self, key, loader, tag=None, ttl=None):
+        """
+        Return the cached value for key, calling loader() to compute it on a
+        miss. The value is cached under tag (default: the key itself). A None
+        result is returned but not cached.
+        """
+        vkey = f'{key}@{self.version(tag or key)}'
+        now = time.time()
+        value = self._l1_get(vkey, now)
+        if value is not _MISSING:
+            self._count('l1_hits')
+            return value
+        value = self._l2_get(vkey, now)
+        if value is not _MISSING:
+            self._count('l2_hits')
+            return value
+
+        with self._lock:
+            fill = self._fills.setdefault(vkey, threading.Lock())
+        with fill:
+            try:
+                return self._fill(vkey, loader, ttl)
+            finally:
+                with self._lock:
+                    self._fills.pop(vkey, None)
+
+    def _fill(self, vkey, loader, ttl):
+        # Another thread of this process may have filled it while we waited
+        value = self._l1_get(vkey, time.time())
+        if value is not _MISSING:
+            self._count('l1_hits')
+            return value
+
+        leased = self._lease(vkey)
+        if not leased:
+            # Another process is computing it; wait for its result
+            self._count('lease_waits')
+            deadline = time.monotonic() + self.lease_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.02)
+                value = self._l2_get(vkey, time.time())
+                if value is not _MISSING:
+                    self._count('l2_hits')
+                    return value
+
+        self._count('misses')
+        try:
+            value = loader()
+            if value is not None:
+                self.set(vkey, value, ttl)
+        finally:
+            if leased:
+                self._release(vkey)
+        return value
+
+    def _lease(self, key):
+        if self.l2 is None:
+            return True
+        try:
+            return self.l2.acquire_lease(key, time.time(), self.lease_timeout)
+        except sqlite3.Error:
+            self._l2_failed('lease', key)
+            return True
+
+    def _release(self, key):
+        if self.l2 is not None:
+            try:
+                self.l2.release_lease(key)
+            except sqlite3.Error:
+                self._l2_failed('release the lease on', key)
+
+    def set(self, vkey, value, ttl=None):
+        expires_at = time.time() + (ttl or self.default_ttl)
+        self._l1_set(vkey, value, expires_at)
+        if self.l2 is not None:
+            try:
+                self.l2.set(vkey, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at)
+            except sqlite3.Error:
+                self._l2_failed('write', vkey)
+
+    # -- maintenance ------------------------------------------------------------
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+            self._versions.clear()
+        if self.l2 is not None:
+            self.l2.clear()
+
+    def stats(self):
+        """This process's counters plus the cache sizes and hit ratio."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['l1_size'] = len(self._l1)
+        for name in ('l1_hits', 'l2_hits', 'misses', 'lease_waits', 'invalidations', 'l2_errors'):
+            stats.setdefault(name, 0)
+        lookups = stats['l1_hits'] + stats['l2_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['l1_hits'] + stats['l2_hits']) / lookups if lookups else 0.0
+        if self.l2 is not None:
+            try:
+                stats['l2_size'] = self.l2.size()
+            except sqlite3.Error:
+                stats['l2_size'] = None
+        return stats
+
+
+def get_cache(app=None):
+    """The app's Cache, created on first use."""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('cache')
+    if cache is None:
+        config = app.config
+        path = config['CACHE_L2_PATH']
+        if path is None:
+            path = os.path.join(app.instance_path, 'cache.sqlite3')
+        cache = app.extensions.setdefault('cache', Cache(
+            l2=L2Store(path) if path else None,
+            l1_size=config['CACHE_L1_SIZE'],
+            l1_ttl=config['CACHE_L1_TTL'],
+            default_ttl=config['CACHE_DEFAULT_TTL'],
+            lease_timeout=config['CACHE_LEASE_TIMEOUT'],
+        ))
+    return cache
+
+
+def get_or_set(key, loader, tag=None, ttl=None):
+    return get_cache().get_or_set(key, loader, tag=tag, ttl=ttl)
+
+
+def invalidate(*tags):
+    get_cache().invalidate(*tags)
+
+
+def purge_cache():
+    """Delete expired entries from L2. Returns how many were removed."""
+    cache = get_cache()
+    if cache.l2 is None:
+        return 0
+    return cache.l2.purge_expired(time.time())
+
+
+def init_app(app):
+    """Register the periodic L2 purge."""
+    from app.tasks import task
+
+    task('purge_cache')(purge_cache)
+    app.config['TASK_SCHEDULE'] = {
+        **app.config['TASK_SCHEDULE'],
+        'purge_cache': app.config['CACHE_PURGE_INTERVAL'],
+    }
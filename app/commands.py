@@ -0,0 +1,165 @@
+# app/commands.py
+"""Maintenance commands registered on the Flask CLI (run with `flask <name>`)."""
+import click
+
+from app.models import db
+
+
+def register_commands(app):
+    """Attach the maintenance commands to the app's CLI."""
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Create any missing tables (main database, archive and task queue)."""
+        from app import init_db as create_tables
+
+        create_tables(app)
+        click.echo('Database initialized.')
+
+    @app.cli.command('rebuild-schedules')
+    def rebuild_schedules():
+        """Recompute every user's "my schedule" table from session memberships."""
+        from app import sharding
+        from app.main import schedule
+
+        sharding.fan_out(schedule.rebuild)
+        db.session.commit()
+        click.echo('Schedules rebuilt.')
+
+    @app.cli.command('archive-sessions')
+    @click.option('--days', type=int, default=None,
+                  help='Archive sessions older than this many days (default: ARCHIVE_HORIZON_DAYS).')
+    def archive_sessions(days):
+        """Move past sessions, their members and comments into the archive database."""
+        from app.main import archive
+
+        moved = archive.archive_sessions(horizon_days=days)
+        click.echo(f'Archived {moved} session(s).')
+
+    @app.cli.command('sweep-orphans')
+    def sweep_orphans():
+        """Delete members, comments, waitlist and schedule rows whose session no longer exists."""
+        from app.main import purge
+
+        for table, count in purge.sweep_orphans().items():
+            click.echo(f'{table}: {count}')
+
+    @app.cli.command('create-course')
+    @click.argument('code')
+    @click.argument('name')
+    def create_course(code, name):
+        """Add a course; its sessions go to the shard holding the fewest courses."""
+        from app import sharding
+        from app.models import Course
+
+        if Course.query.filter_by(code=code).first() is not None:
+            raise click.ClickException(f'Course {code!r} already exists.')
+        course = Course(code=code, name=name, shard=sharding.assign_shard())
+        db.session.add(course)
+        db.session.commit()
+        click.echo(f'Created course {code} in shard {course.shard}.')
+
+    @app.cli.command('run-worker')
+    @click.option('--concurrency', type=int, default=None,
+                  help='Worker threads in this process (default: TASK_WORKER_CONCURRENCY).')
+    @click.option('--burst', is_flag=True, help='Run due tasks until the queue is empty, then exit.')
+    def run_worker(concurrency, burst):
+        """Run background tasks. Start several processes to scale out."""
+        from app.tasks import Worker
+
+        worker = Worker(app, concurrency=concurrency)
+        if burst:
+            click.echo(f'Ran {worker.run_until_empty()} task(s).')
+        else:
+            click.echo(f'Worker {worker.name} running with {worker.concurrency} thread(s).')
+            worker.run_forever()
+
+    @app.cli.command('send-digests')
+    def send_digests():
+        """Send activity digests for everything since the last run."""
+        from app.notifications import send_digests as send
+
+        click.echo(f'Sent {send()} digest(s).')
+
+    @app.cli.command('import-sessions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--creator', required=True, help='Email or username of the user who will own the sessions.')
+    def import_sessions(path, creator):
+        """Bulk-import sessions from a .csv or .json file."""
+        from app.main import bulk
+        from app.models import User
+
+        owner = User.query.filter((User.email == creator) | (User.username == creator)).first()
+        if owner is None:
+            raise click.ClickException(f'No user {creator!r}.')
+        with open(path, encoding='utf-8-sig', newline='') as fh:
+            result = bulk.import_sessions(bulk.read_rows(fh, _format_of(path)), owner.id)
+        _report(result, 'session(s)')
+
+    @app.cli.command('import-memberships')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    def import_memberships(path):
+        """Bulk-import session memberships (session_id, member) from a .csv or .json file."""
+        from app.main import bulk
+
+        with open(path, encoding='utf-8-sig', newline='') as fh:
+            result = bulk.import_memberships(bulk.read_rows(fh, _format_of(path)))
+        _report(result, 'membership(s)')
+
+    @app.cli.command('export')
+    @click.argument('what', type=click.Choice(['sessions', 'rosters']))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), default='csv')
+    @click.option('--output', type=click.File('w', encoding='utf-8'), default='-')
+    def export(what, fmt, output):
+        """Stream all sessions or all rosters to a file (default: stdout)."""
+        from app.main import bulk
+
+        if what == 'sessions':
+            chunks = bulk.stream(fmt, bulk.SESSION_COLUMNS, bulk.sessions_query(), all_shards=True)
+        else:
+            chunks = bulk.stream(fmt, bulk.ROSTER_COLUMNS, bulk.roster_query(), all_shards=True)
+        for chunk in chunks:
+            output.write(chunk)
+
+    @app.cli.command('build-assets')
+    def build_assets():
+        """Fingerprint and precompress static files into the dist folder."""
+        from app.assets import build_assets as build, dist_folder
+
+        manifest = build(app.static_folder, dist_folder(app))
+        for logical, hashed in sorted(manifest.items()):
+            click.echo(f'{logical} -> {hashed}')
+
+
+    @app.cli.command('sync-replicas')
+    def sync_replicas():
+        """Copy the primary database into every read replica now."""
+        from app.routing import sync_replicas as sync
+
+        click.echo(f'Synced {sync()} replica(s).')
+
+    @app.cli.command('compile-templates')
+    def compile_templates():
+        """Compile every template into the bytecode cache (run on deploy)."""
+        names = app.jinja_env.list_templates(filter_func=lambda name: not name.startswith('.'))
+        for name in names:
+            app.jinja_env.get_template(name)
+        click.echo(f'Compiled {len(names)} template(s).')
+
+    @app.cli.command('clear-cache')
+    def clear_cache():
+        """Empty the shared (L2) cache, e.g. after a deploy that changes cached objects."""
+        from app.cache import get_cache
+
+        get_cache(app).clear()
+        click.echo('Cache cleared.')
+
+
+def _format_of(path):
+    return path.rsplit('.', 1)[-1].lower()
+
+
+def _report(result, noun):
+    for error in result.errors:
+        click.echo(f'line {error.line}: {error.message}', err=True)
+    click.echo(f'Imported {len(result.imported)} {noun}, {len(result.errors)} problem(s).')
@@ -3,4 +3,93 @@ import os
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///studysessions.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Sessions older than the horizon are moved to a separate archive database
+    SQLALCHEMY_BINDS = {
+        'archive': os.environ.get('ARCHIVE_DATABASE_URL') or 'sqlite:///studysessions_archive.db',
+        'tasks': os.environ.get('TASKS_DATABASE_URL') or 'sqlite:///studysessions_tasks.db',
+    }
+    ARCHIVE_HORIZON_DAYS = int(os.environ.get('ARCHIVE_HORIZON_DAYS') or 90)
+
+    # Read replicas (see app/routing.py): comma-separated SQLite URLs
+    SQLALCHEMY_REPLICAS = [url for url in (os.environ.get('DATABASE_REPLICA_URLS') or '').split(',') if url]
+    REPLICA_STICKY_SECONDS = 10      # a client reads from the primary this long after it writes
+    REPLICA_SYNC_INTERVAL = 5        # seconds between replica refreshes (periodic task)
+
+    # Per-course shards (see app/sharding.py): comma-separated SQLite URLs, only ever appended to
+    COURSE_SHARDS = [url for url in (os.environ.get('COURSE_SHARD_URLS') or '').split(',') if url]
+
+    # Background task queue (see app/tasks.py)
+    # 'thread'   - worker threads inside each web process (default)
+    # 'external' - only enqueue; run `flask run-worker` in separate processes
+    # 'eager'    - run tasks inline when enqueued (tests)
+    TASK_QUEUE_MODE = os.environ.get('TASK_QUEUE_MODE') or 'thread'
+    TASK_WORKER_CONCURRENCY = int(os.environ.get('TASK_WORKER_CONCURRENCY') or 2)
+    TASK_POLL_INTERVAL = 1.0         # seconds between polls when the queue is empty
+    TASK_MAX_ATTEMPTS = 3
+    TASK_RETRY_BACKOFF = 5           # seconds, doubled after every failed attempt
+    TASK_LOCK_TIMEOUT = 300          # a running task older than this is assumed crashed
+    TASK_RETENTION_DAYS = 7          # finished tasks are deleted after this (purge_finished_tasks)
+    # Periodic tasks: task name -> interval in seconds
+    TASK_SCHEDULE = {
+        'archive_sessions': 24 * 60 * 60,
+        'sweep_orphans': 24 * 60 * 60,
+        'send_digests': 60 * 60,
+        'purge_finished_tasks': 24 * 60 * 60,
+    }
+
+    # Activity digests (see app/notifications.py)
+    # Sink is 'maildir' (one file per message, under NOTIFICATION_MAILDIR) or 'memory'
+    NOTIFICATION_SINK = os.environ.get('NOTIFICATION_SINK') or 'maildir'
+    NOTIFICATION_MAILDIR = os.environ.get('NOTIFICATION_MAILDIR')  # default: <instance>/maildir
+    NOTIFICATION_EVENT_RETENTION_DAYS = 30
+
+    # Session recommendations (see app/main/recommend.py)
+    RECOMMEND_INDEX_TTL = 300        # seconds before a background rebuild of the index
+    RECOMMEND_TOP_N = 3              # sessions flagged as "Recommended" in the listing
+
+    # Group commit for joins and comments (see app/writes.py)
+    WRITE_BATCHING = os.environ.get('WRITE_BATCHING') == '1'
+    WRITE_BATCH_WINDOW = 0.005      # seconds the writer waits for more writes after the first
+    WRITE_BATCH_MAX = 200           # writes per transaction at most
+
+    # Organizer analytics (see app/main/analytics.py; needs requirements-analytics.txt)
+    ANALYTICS_TTL = 300                     # seconds a computed report is served from the cache
+    ANALYTICS_REBUILD_INTERVAL = 60 * 60    # seconds before the columns are reloaded in full
+    ANALYTICS_TREND_WEEKS = 12              # weeks shown in the weekly trend
+
+    # Comment fragments long-poll for new comments in the ASGI mode (app/asgi.py). The Flask
+    # view would hold a worker thread per waiting page, so under WSGI pages poll briefly instead.
+    COMMENT_POLL_INTERVAL = 1.0      # seconds between checks
+    COMMENT_POLL_MAX_WAIT = 25       # longest wait a client may ask for (ASGI)
+    COMMENT_POLL_WSGI_MAX_WAIT = 0   # longest wait in the Flask view
+    COMMENT_POLL_REFRESH = 5         # seconds between the pages' short polls
+
+    # Two-level cache for session detail pages (see app/cache.py)
+    CACHE_L2_PATH = os.environ.get('CACHE_L2_PATH')  # default: <instance>/cache.sqlite3; '' for L1 only
+    CACHE_L1_SIZE = 1024             # entries kept in each process
+    CACHE_L1_TTL = 2.0               # seconds a process trusts its copy of a tag's version
+    CACHE_DEFAULT_TTL = 300          # seconds a value lives without being invalidated
+    CACHE_LEASE_TIMEOUT = 2.0        # longest wait for another process to compute a value
+    CACHE_PURGE_INTERVAL = 60 * 60   # seconds between purges of expired L2 entries (periodic task)
+
+    # Idempotency keys for create/join/comment POSTs (see app/idempotency.py)
+    IDEMPOTENCY_STORE_PATH = os.environ.get('IDEMPOTENCY_STORE_PATH')  # default: <instance>/idempotency.sqlite3
+    IDEMPOTENCY_TTL = 24 * 60 * 60   # seconds a finished request's result is replayed
+    IDEMPOTENCY_LOCK_TIMEOUT = 60    # a request still running after this is assumed crashed
+    IDEMPOTENCY_WAIT = 5.0           # seconds a repeat waits for the first request to finish
+    IDEMPOTENCY_PURGE_INTERVAL = 60 * 60
+
+    # Static assets and compression (see app/assets.py)
+    ASSETS_DIST_FOLDER = None        # default: app/static/dist
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 500          # bytes; smaller bodies aren't worth compressing
+    COMPRESS_LEVEL = 6
+    COMPRESS_MIMETYPES = {
+        'text/html', 'text/css', 'text/plain', 'text/csv', 'text/calendar',
+        'application/json', 'application/javascript',
+    }
+
+    # Compiled templates are cached on disk so new processes skip the Jinja compile
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')  # default: instance/jinja_cache
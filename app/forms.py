@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, SelectField, TextAreaField, BooleanField, DateTimeField
-from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import StringField, PasswordField, SubmitField, SelectField, TextAreaField, BooleanField, DateTimeField, IntegerField
+from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length, NumberRange, Optional
 from datetime import datetime
 from app.models import User
 
@@ -56,6 +57,9 @@ class StudySessionForm(FlaskForm):
     time = StringField('Time (e.g., 3:00 PM - 5:00 PM)', validators=[DataRequired(), Length(max=20)])  # time range text
     location = StringField('Location', validators=[DataRequired(), Length(max=200)])   # where the session takes place
     topic = StringField('Topic (Optional)', validators=[Length(max=100)])              # optional topic/subject
+    capacity = IntegerField('Capacity (Optional)', validators=[Optional(), NumberRange(min=1)])  # blank = unlimited
+    # Choices (0 = no course, then the courses) are filled in by the view
+    course = SelectField('Course (Optional)', coerce=int, default=0, validate_choice=False)
     #Recurring session fields
     is_recurring = BooleanField('Repeat Session')
     recurrence_interval = SelectField(
@@ -68,4 +72,14 @@ class SessionCommentForm(FlaskForm):
     content = TextAreaField(
         'Add a comment', 
         validators=[DataRequired(), Length(max=500)])
-    submit = SubmitField('Post Comment')
\ No newline at end of file
+    submit = SubmitField('Post Comment')
+
+# Form for bulk-importing sessions or memberships from a CSV/JSON file
+class BulkImportForm(FlaskForm):
+    kind = SelectField(
+        'Import',
+        choices=[('sessions', 'Sessions'), ('memberships', 'Memberships')])
+    file = FileField(
+        'File (.csv or .json)',
+        validators=[FileRequired(), FileAllowed(['csv', 'json'], 'Upload a .csv or .json file.')])
+    submit = SubmitField('Import')
@@ -0,0 +1,188 @@
+# app/idempotency.py
+"""
+Idempotency keys for POST endpoints that create things.
+
+A client sends a key with the request, either in an `Idempotency-Key` header
+(API clients retrying on a flaky network) or in an `idempotency_key` form
+field. Every form rendered with {{ idempotency_field() }} gets a fresh key, so
+a double-submitted or resent form carries the same key twice. Views decorated
+with @idempotent then run at most once per (user, path, key):
+
+- the first request reserves the key and runs the view
+- a repeat of a finished request gets the recorded redirect and flash
+  messages back without running the view (a single indexed lookup)
+- a repeat that arrives while the first is still running waits up to
+  IDEMPOTENCY_WAIT seconds for its result, then gets 409 Conflict
+
+Only redirect results are recorded; these views redirect after POST. If the
+view fails or renders a page (e.g. form errors), the reservation is dropped
+and the same key may be tried again.
+
+Keys live in a small SQLite file shared by the processes on the host
+(IDEMPOTENCY_STORE_PATH, default <instance>/idempotency.sqlite3). Results are
+kept for IDEMPOTENCY_TTL seconds; a reservation whose request crashed lapses
+after IDEMPOTENCY_LOCK_TIMEOUT. The 'purge_idempotency_keys' periodic task
+removes expired keys. If the store can't be used, the view simply runs.
+"""
+import functools
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+from flask import current_app, flash, redirect, request, session
+from flask_login import current_user
+from markupsafe import Markup
+
+from app.cache import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 100
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS idempotency_key ('
+    ' key TEXT PRIMARY KEY, status INTEGER, location TEXT, flashes TEXT, expires_at REAL NOT NULL)',
+)
+
+
+class IdempotencyStore(SQLiteStore):
+    """Recent keys and the (status, location, flashes) they produced; status is NULL while running."""
+
+    schema = _SCHEMA
+
+    def reserve(self, key, now, lock_timeout):
+        """Claim the key. Returns None when claimed, else the existing row."""
+        conn = self._conn()
+        conn.execute('DELETE FROM idempotency_key WHERE key = ? AND expires_at <= ?', (key, now))
+        if conn.execute('INSERT OR IGNORE INTO idempotency_key (key, expires_at) VALUES (?, ?)',
+                        (key, now + lock_timeout)).rowcount == 1:
+            return None
+        return self.get(key)
+
+    def get(self, key):
+        return self._conn().execute(
+            'SELECT status, location, flashes FROM idempotency_key WHERE key = ?', (key,)).fetchone()
+
+    def complete(self, key, status, location, flashes, expires_at):
+        self._conn().execute(
+            'UPDATE idempotency_key SET status = ?, location = ?, flashes = ?, expires_at = ? WHERE key = ?',
+            (status, location, json.dumps(flashes), expires_at, key))
+
+    def release(self, key):
+        self._conn().execute('DELETE FROM idempotency_key WHERE key = ?', (key,))
+
+    def purge_expired(self, now):
+        return self._conn().execute('DELETE FROM idempotency_key WHERE expires_at <= ?', (now,)).rowcount
+
+
+def get_store(app=None):
+    """The app's IdempotencyStore, created on first use."""
+    app = app or current_app._get_current_object()
+    store = app.extensions.get('idempotency')
+    if store is None:
+        path = app.config['IDEMPOTENCY_STORE_PATH'] or os.path.join(app.instance_path, 'idempotency.sqlite3')
+        store = app.extensions.setdefault('idempotency', IdempotencyStore(path))
+    return store
+
+
+def idempotency_field():
+    """Hidden form input carrying a fresh idempotency key (for templates)."""
+    return Markup(f'<input type="hidden" name="{FIELD}" value="{uuid.uuid4().hex}">')
+
+
+def _replay(row):
+    status, location, flashes = row
+    for category, message in json.loads(flashes):
+        flash(message, category)
+    response = redirect(location, code=status)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(store, key):
+    """
+    Reserve the key, waiting while another request holds it. Returns None when
+    this request should run the view, else the finished request's row (or the
+    still-pending one if the wait ran out).
+    """
+    config = current_app.config
+    deadline = time.monotonic() + config['IDEMPOTENCY_WAIT']
+    row = store.reserve(key, time.time(), config['IDEMPOTENCY_LOCK_TIMEOUT'])
+    while row is not None and row[0] is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+        row = store.get(key)
+        if row is None:
+            # The first request gave its key up (it failed or showed form errors)
+            row = store.reserve(key, time.time(), config['IDEMPOTENCY_LOCK_TIMEOUT'])
+    return row
+
+
+def idempotent(view):
+    """Run a POST view at most once per idempotency key (see the module docstring)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER) or request.form.get(FIELD)
+        if request.method != 'POST' or not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return f'{HEADER} is longer than {MAX_KEY_LENGTH} characters.', 400
+
+        store = get_store()
+        key = f'{current_user.get_id()}:{request.path}:{key}'
+        try:
+            row = _claim(store, key)
+        except sqlite3.Error:
+            logger.warning('Idempotency store %s unavailable; running the view', store.path, exc_info=True)
+            return view(*args, **kwargs)
+        if row is not None:
+            if row[0] is None:
+                return 'This request is already being processed.', 409
+            return _replay(row)
+
+        flashed = len(session.get('_flashes', []))
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except BaseException:
+            _forget(store, key)
+            raise
+        if 300 <= response.status_code < 400:
+            try:
+                store.complete(key, response.status_code, response.location,
+                               list(session.get('_flashes', []))[flashed:],
+                               time.time() + current_app.config['IDEMPOTENCY_TTL'])
+            except sqlite3.Error:
+                logger.warning('Could not record idempotency key %s', key, exc_info=True)
+        else:
+            _forget(store, key)
+        return response
+
+    return wrapper
+
+
+def _forget(store, key):
+    try:
+        store.release(key)
+    except sqlite3.Error:
+        logger.warning('Could not release idempotency key %s', key, exc_info=True)
+
+
+def purge_idempotency_keys():
+    """Delete expired keys. Returns how many were removed."""
+    return get_store().purge_expired(time.time())
+
+
+def init_app(app):
+    """Expose idempotency_field() to templates and register the periodic purge."""
+    from app.tasks import task
+
+    app.jinja_env.globals['idempotency_field'] = idempotency_field
+    task('purge_idempotency_keys')(purge_idempotency_keys)
+    app.config['TASK_SCHEDULE'] = {
+        **app.config['TASK_SCHEDULE'],
+        'purge_idempotency_keys': app.config['IDEMPOTENCY_PURGE_INTERVAL'],
+    }
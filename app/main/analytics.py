@@ -0,0 +1,275 @@
+# app/main/analytics.py
+"""
+Attendance and utilization statistics for organizers.
+
+Sessions, memberships and comments are pulled in bulk as columns (one query
+per table, no ORM objects) into NumPy arrays. Every statistic is then a
+vectorized group-by over those columns (np.bincount on category codes)
+rather than a get_participant_count() query per session:
+
+- per topic, per location and per weekday: sessions, participants, average
+  participants, comments and average seat utilization (participants /
+  capacity, over sessions that have a capacity)
+- a histogram of participant counts
+- weekly trends of sessions, participants and comments
+
+The columns live in a Dataset held by each process and cover every course
+shard (app/sharding.py). refresh() appends the sessions and comments added
+to each shard since the last refresh (both tables only grow, apart from
+deletes) and re-reads the membership column, which is a single integer per
+row. The whole dataset is reloaded once it is older than
+ANALYTICS_REBUILD_INTERVAL (picking up edited sessions) or as soon as
+sessions have been deleted. Finished reports go into the shared cache for
+ANALYTICS_TTL seconds, so one process computes them for all of them.
+
+NumPy is optional (requirements-analytics.txt) and imported on first use;
+without it report() raises AnalyticsUnavailable.
+"""
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, literal, select
+
+from app import cache, sharding
+from app.models import db, session_members, SessionComment, StudySession
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+# Lower edges of the participant-count histogram buckets
+SIZE_BUCKETS = (0, 1, 2, 3, 5, 10, 20)
+NO_TOPIC = '(no topic)'
+
+
+class AnalyticsUnavailable(RuntimeError):
+    """NumPy is not installed."""
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as exc:  # optional dependency
+        raise AnalyticsUnavailable(
+            'Analytics need NumPy: pip install -r requirements-analytics.txt') from exc
+    return numpy
+
+
+def _days(np, dates):
+    # datetime64 day numbers since 1970-01-01 (a Thursday)
+    return np.array(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+class Dataset:
+    """Sessions, memberships and comments of the live database as NumPy columns."""
+
+    def __init__(self, np):
+        self.np = np
+        self.loaded_at = 0.0
+        self.loads = 0                                  # full loads so far
+        self.session_id = np.empty(0, dtype=np.int64)   # sorted
+        self.session_ids = {}                           # newest session loaded, per shard
+        self.session_day = np.empty(0, dtype=np.int64)
+        self.topic = np.empty(0, dtype=str)
+        self.location = np.empty(0, dtype=str)
+        self.capacity = np.empty(0, dtype=np.float64)   # NaN = unlimited
+        self.participants = np.empty(0, dtype=np.int64)
+        self.comment_ids = {}                           # newest comment loaded, per shard
+        self.comment_session = np.empty(0, dtype=np.int64)
+        self.comment_day = np.empty(0, dtype=np.int64)
+
+    def refresh(self, rebuild_interval):
+        """Bring the columns up to date (see the module docstring)."""
+        if (not self.loads or time.monotonic() - self.loaded_at > rebuild_interval
+                or self._loaded_sessions() != len(self.session_id)):
+            self._load({}, {})
+            self.loaded_at = time.monotonic()
+            self.loads += 1
+        else:
+            self._load(self.session_ids, self.comment_ids)
+        self._count_members()
+
+    def _loaded_sessions(self):
+        # Sessions still in the database out of those loaded (fewer once any were deleted)
+        return sum(sharding.fan_out(lambda: db.session.scalar(
+            select(func.count()).where(StudySession.id <= self.session_ids.get(sharding.current_shard(), 0)))))
+
+    def _load(self, after_sessions, after_comments):
+        """Load the sessions and comments past after_sessions / after_comments ({shard: id}; {} = all)."""
+        np = self.np
+        rows = list(sharding.merged(lambda: db.session.execute(
+            select(literal(sharding.current_shard()), StudySession.id, StudySession.date,
+                   StudySession.topic, StudySession.location, StudySession.capacity)
+            .where(StudySession.id > after_sessions.get(sharding.current_shard(), 0))
+            .order_by(StudySession.id)
+        )))
+        shards, ids, dates, topics, locations, capacities = zip(*rows) if rows else ((),) * 6
+        columns = (
+            np.array(ids, dtype=np.int64),
+            _days(np, dates),
+            np.array([(topic or '').strip() or NO_TOPIC for topic in topics], dtype=str),
+            np.array([(location or '').strip() for location in locations], dtype=str),
+            np.array([np.nan if c is None else c for c in capacities], dtype=np.float64),
+        )
+        comments = list(sharding.merged(lambda: db.session.execute(
+            select(literal(sharding.current_shard()), SessionComment.id, SessionComment.session_id,
+                   SessionComment.timestamp)
+            .where(SessionComment.id > after_comments.get(sharding.current_shard(), 0))
+            .order_by(SessionComment.id)
+        )))
+        comment_shards, comment_ids, comment_sessions, stamps = zip(*comments) if comments else ((),) * 4
+
+        names = ('session_id', 'session_day', 'topic', 'location', 'capacity')
+        if not after_sessions:
+            self.session_ids = {}
+            for name, column in zip(names, columns):
+                setattr(self, name, column)
+        elif ids:
+            # New sessions of a lower shard belong before those of higher ones
+            order = np.argsort(np.concatenate([self.session_id, columns[0]]), kind='stable')
+            for name, column in zip(names, columns):
+                setattr(self, name, np.concatenate([getattr(self, name), column])[order])
+        self.session_ids.update(zip(shards, ids))    # rows come in id order within each shard
+        new_sessions = np.array(comment_sessions, dtype=np.int64)
+        new_days = _days(np, [stamp or datetime.utcnow() for stamp in stamps])
+        if not after_comments:
+            self.comment_ids = {}
+            self.comment_session, self.comment_day = new_sessions, new_days
+        else:
+            self.comment_session = np.concatenate([self.comment_session, new_sessions])
+            self.comment_day = np.concatenate([self.comment_day, new_days])
+        self.comment_ids.update(zip(comment_shards, comment_ids))
+
+    def positions(self, session_ids):
+        """Row of each session id in the session columns (-1 where unknown)."""
+        np = self.np
+        if not len(self.session_id):
+            return np.full(len(session_ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.session_id, session_ids), len(self.session_id) - 1)
+        return np.where(self.session_id[rows] == session_ids, rows, -1)
+
+    def _count_members(self):
+        np = self.np
+        member_sessions = np.fromiter(
+            sharding.merged(lambda: db.session.execute(select(session_members.c.session_id)).scalars()),
+            dtype=np.int64)
+        rows = self.positions(member_sessions)
+        self.participants = np.bincount(rows[rows >= 0], minlength=len(self.session_id))
+
+
+def _breakdown(np, codes, names, participants, comments, utilization, order_by_size=True):
+    """Per-group totals for rows labelled with integer codes into names."""
+    k = len(names)
+    sessions = np.bincount(codes, minlength=k)
+    people = np.bincount(codes, weights=participants, minlength=k)
+    talk = np.bincount(codes, weights=comments, minlength=k)
+    capped = ~np.isnan(utilization)
+    used = np.bincount(codes[capped], weights=utilization[capped], minlength=k)
+    capped_sessions = np.bincount(codes[capped], minlength=k)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_people = np.where(sessions > 0, people / sessions, 0.0)
+        avg_talk = np.where(sessions > 0, talk / sessions, 0.0)
+        avg_used = used / capped_sessions
+    order = np.argsort(-sessions, kind='stable') if order_by_size else np.arange(k)
+    return [
+        {
+            'name': str(names[i]),
+            'sessions': int(sessions[i]),
+            'participants': int(people[i]),
+            'avg_participants': round(float(avg_people[i]), 2),
+            'comments': int(talk[i]),
+            'comments_per_session': round(float(avg_talk[i]), 2),
+            'utilization': None if capped_sessions[i] == 0 else round(float(avg_used[i]), 3),
+        }
+        for i in order
+    ]
+
+
+def compute_report(dataset, trend_weeks=12, today=None):
+    """All statistics for the dataset, as plain JSON-ready values."""
+    np = dataset.np
+    participants = dataset.participants
+    rows = dataset.positions(dataset.comment_session)
+    comments = np.bincount(rows[rows >= 0], minlength=len(dataset.session_id))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        utilization = participants / dataset.capacity    # NaN where unlimited
+
+    def grouped(labels):
+        names, codes = np.unique(labels, return_inverse=True)
+        return _breakdown(np, codes.ravel(), names, participants, comments, utilization)
+
+    weekday = (dataset.session_day + 3) % 7
+    buckets = np.digitize(participants, SIZE_BUCKETS[1:])
+    labels = [
+        f'{low}' if high == low + 1 else f'{low}-{high - 1}'
+        for low, high in zip(SIZE_BUCKETS, SIZE_BUCKETS[1:])
+    ] + [f'{SIZE_BUCKETS[-1]}+']
+
+    # Weeks start on Monday; week number = (day number + 3) // 7
+    this_week = (_days(np, [today or datetime.utcnow()])[0] + 3) // 7
+    first_week = this_week - trend_weeks + 1
+    session_week = (dataset.session_day + 3) // 7 - first_week
+    comment_week = (dataset.comment_day + 3) // 7 - first_week
+    in_range = (session_week >= 0) & (session_week < trend_weeks)
+    comments_in_range = (comment_week >= 0) & (comment_week < trend_weeks)
+    weekly_sessions = np.bincount(session_week[in_range], minlength=trend_weeks)
+    weekly_people = np.bincount(session_week[in_range], weights=participants[in_range], minlength=trend_weeks)
+    weekly_comments = np.bincount(comment_week[comments_in_range], minlength=trend_weeks)
+    week_starts = (np.arange(first_week, this_week + 1) * 7 - 3).astype('datetime64[D]')
+
+    capped = ~np.isnan(utilization)
+    return {
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'totals': {
+            'sessions': int(len(participants)),
+            'participants': int(participants.sum()),
+            'comments': int(comments.sum()),
+            'avg_participants': round(float(participants.mean()), 2) if len(participants) else 0.0,
+            'median_participants': float(np.median(participants)) if len(participants) else 0.0,
+            'utilization': round(float(utilization[capped].mean()), 3) if capped.any() else None,
+            'full_sessions': int((participants[capped] >= dataset.capacity[capped]).sum()),
+        },
+        'by_topic': grouped(dataset.topic),
+        'by_location': grouped(dataset.location),
+        'by_weekday': _breakdown(np, weekday, WEEKDAYS, participants, comments, utilization,
+                                 order_by_size=False),
+        'participant_histogram': [
+            {'participants': label, 'sessions': int(count)}
+            for label, count in zip(labels, np.bincount(buckets, minlength=len(labels)))
+        ],
+        'weekly': [
+            {'week_start': str(start), 'sessions': int(s), 'participants': int(p), 'comments': int(c)}
+            for start, s, p, c in zip(week_starts, weekly_sessions, weekly_people, weekly_comments)
+        ],
+    }
+
+
+class Analytics:
+    """A process's Dataset and the lock that serializes its refreshes."""
+
+    def __init__(self):
+        self.dataset = None
+        self.lock = threading.Lock()
+
+    def report(self, app):
+        config = app.config
+        with self.lock:
+            if self.dataset is None:
+                self.dataset = Dataset(_numpy())
+            self.dataset.refresh(config['ANALYTICS_REBUILD_INTERVAL'])
+            return compute_report(self.dataset, config['ANALYTICS_TREND_WEEKS'])
+
+
+def _analytics():
+    app = current_app._get_current_object()
+    analytics = app.extensions.get('analytics')
+    if analytics is None:
+        analytics = app.extensions.setdefault('analytics', Analytics())
+    return analytics
+
+
+def report():
+    """The current report (cached for ANALYTICS_TTL seconds in every process)."""
+    app = current_app._get_current_object()
+    _numpy()   # fail before touching the cache
+    return cache.get_or_set(
+        'analytics:report', lambda: _analytics().report(app), ttl=app.config['ANALYTICS_TTL'])
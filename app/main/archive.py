@@ -0,0 +1,115 @@
+# app/main/archive.py
+"""
+Archival of past sessions.
+
+Sessions older than ARCHIVE_HORIZON_DAYS are copied, together with their
+members and comments, into the 'archive' bind (a separate SQLite file) and
+then removed from the live tables. The copy is committed before the live rows
+are deleted and uses INSERT OR REPLACE, so a job interrupted between the two
+steps simply redoes the batch on its next run.
+
+Each course shard (see app/sharding.py) is archived in turn. It runs daily
+as the 'archive_sessions' periodic task (see TASK_SCHEDULE), or manually with
+`flask archive-sessions`.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import insert, select
+
+from app import sharding
+from app.main import purge
+from app.tasks import task
+from app.models import (
+    db, session_members, ArchivedComment, ArchivedMember, ArchivedSession, SessionComment, StudySession, User,
+)
+
+
+def archive_cutoff(horizon_days=None, now=None):
+    """Sessions dated before the returned datetime are due for archival."""
+    if horizon_days is None:
+        horizon_days = current_app.config['ARCHIVE_HORIZON_DAYS']
+    today = (now or datetime.utcnow()).date()
+    return datetime.combine(today - timedelta(days=horizon_days), datetime.min.time())
+
+
+@task('archive_sessions')
+def archive_sessions(horizon_days=None, batch_size=500, now=None):
+    """Move every session past the horizon into the archive. Returns how many moved."""
+    cutoff = archive_cutoff(horizon_days, now)
+    return sum(sharding.fan_out(_archive_shard, cutoff, batch_size))
+
+
+def _archive_shard(cutoff, batch_size):
+    moved = 0
+
+    while True:
+        ids = db.session.execute(
+            select(StudySession.id)
+            .where(StudySession.date < cutoff)
+            .order_by(StudySession.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        _copy_to_archive(ids)
+        db.session.commit()
+        # Members, comments etc. go with the sessions (ON DELETE CASCADE)
+        purge.purge_sessions(ids)
+        db.session.commit()
+        purge.purged(ids)
+        moved += len(ids)
+
+    return moved
+
+
+def _copy_to_archive(ids):
+    sessions = db.session.execute(
+        select(
+            StudySession.id, StudySession.title, StudySession.date, StudySession.time,
+            StudySession.location, StudySession.topic, StudySession.creator_id,
+            User.username.label('creator_name'), StudySession.created_at,
+            StudySession.is_recurring, StudySession.recurrence_interval,
+            StudySession.parent_id, StudySession.capacity,
+        )
+        .outerjoin(User, User.id == StudySession.creator_id)
+        .where(StudySession.id.in_(ids))
+    ).mappings().all()
+
+    members = db.session.execute(
+        select(session_members.c.session_id, session_members.c.user_id, User.username)
+        .outerjoin(User, User.id == session_members.c.user_id)
+        .where(session_members.c.session_id.in_(ids))
+    ).mappings().all()
+
+    comments = db.session.execute(
+        select(
+            SessionComment.id, SessionComment.session_id, SessionComment.user_id,
+            User.username, SessionComment.content, SessionComment.timestamp,
+        )
+        .outerjoin(User, User.id == SessionComment.user_id)
+        .where(SessionComment.session_id.in_(ids))
+    ).mappings().all()
+
+    archived_at = datetime.utcnow()
+    db.session.execute(
+        insert(ArchivedSession.__table__).prefix_with('OR REPLACE'),
+        [dict(row, archived_at=archived_at) for row in sessions],
+    )
+    for model, rows in ((ArchivedMember, members), (ArchivedComment, comments)):
+        if rows:
+            db.session.execute(
+                insert(model.__table__).prefix_with('OR REPLACE'),
+                [dict(row) for row in rows],
+            )
+
+
+def get_archived(session_id):
+    """Return (session, members, comments) from the archive, or None if not archived."""
+    session = db.session.get(ArchivedSession, session_id)
+    if session is None:
+        return None
+    members = ArchivedMember.query.filter_by(session_id=session_id).order_by(ArchivedMember.username).all()
+    comments = ArchivedComment.query.filter_by(session_id=session_id).order_by(ArchivedComment.timestamp).all()
+    return session, members, comments
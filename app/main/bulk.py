@@ -0,0 +1,314 @@
+# app/main/bulk.py
+"""
+Bulk import and streaming export of sessions, memberships and comments.
+
+Imports read CSV or JSON and validate each row on its own. Bad rows are
+reported with their line number and skipped; good rows are inserted in
+chunks, one transaction per chunk. Exports are generators over server-side
+batches (yield_per), so an entire semester streams in constant memory.
+
+CSV/JSON session columns:
+    title, date (YYYY-MM-DD), time, location, topic, capacity,
+    members (emails or usernames separated by ';')
+Membership columns:
+    session_id, member (email or username)
+"""
+import csv
+import io
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import sharding
+from app.main import membership, recommend, schedule, summaries
+from app.models import db, session_members, SessionComment, StudySession, User
+
+ImportResult = namedtuple('ImportResult', ['imported', 'errors'])
+RowError = namedtuple('RowError', ['line', 'message'])
+
+
+class ImportFormatError(ValueError):
+    """The uploaded file could not be parsed at all."""
+
+
+# ---------------------------------------------------------------------------
+# Reading input
+# ---------------------------------------------------------------------------
+
+def read_rows(stream, fmt):
+    """
+    Yield (line_number, row_dict) from a text stream in 'csv' or 'json' format.
+    JSON may be a list of objects or one object per line.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {k.strip().lower(): (v or '').strip() for k, v in row.items() if k}
+    elif fmt == 'json':
+        text = stream.read()
+        try:
+            data = json.loads(text)
+            rows = data if isinstance(data, list) else [data]
+        except json.JSONDecodeError:
+            try:
+                rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+            except json.JSONDecodeError as exc:
+                raise ImportFormatError(f'Invalid JSON: {exc}') from exc
+        for number, row in enumerate(rows, start=1):
+            if not isinstance(row, dict):
+                raise ImportFormatError(f'Item {number} is not an object')
+            yield number, {str(k).lower(): v for k, v in row.items()}
+    else:
+        raise ImportFormatError(f'Unsupported format: {fmt}')
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _text(row, key):
+    value = row.get(key)
+    return '' if value is None else str(value).strip()
+
+
+def _split_members(value):
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value or '').split(';') if v.strip()]
+
+
+def _resolve_users(identifiers):
+    """Map emails/usernames to user ids with one query."""
+    identifiers = set(identifiers)
+    if not identifiers:
+        return {}
+    found = {}
+    for user_id, email, username in db.session.execute(
+            select(User.id, User.email, User.username)
+            .where(or_(User.email.in_(identifiers), User.username.in_(identifiers)))):
+        found[email] = user_id
+        found[username] = user_id
+    return found
+
+
+# ---------------------------------------------------------------------------
+# Sessions
+# ---------------------------------------------------------------------------
+
+def _validate_session(row):
+    """Return (values, member identifiers) or raise ValueError with a message."""
+    title, time, location = _text(row, 'title'), _text(row, 'time'), _text(row, 'location')
+    topic, capacity = _text(row, 'topic'), _text(row, 'capacity')
+    for name, value, limit in (('title', title, 200), ('time', time, 20), ('location', location, 200)):
+        if not value:
+            raise ValueError(f'{name} is required')
+        if len(value) > limit:
+            raise ValueError(f'{name} is longer than {limit} characters')
+    if len(topic) > 100:
+        raise ValueError('topic is longer than 100 characters')
+    try:
+        date = datetime.strptime(_text(row, 'date'), '%Y-%m-%d')
+    except ValueError:
+        raise ValueError('date must be YYYY-MM-DD') from None
+    if capacity:
+        if not capacity.isdigit() or int(capacity) < 1:
+            raise ValueError('capacity must be a positive whole number')
+        capacity = int(capacity)
+    members = _split_members(row.get('members'))
+    if capacity and len(set(members)) + 1 > capacity:
+        raise ValueError('more members than the capacity allows')
+
+    values = dict(title=title, date=date, time=time, location=location, topic=topic,
+                  capacity=capacity or None, is_recurring=False, created_at=datetime.utcnow())
+    return values, members
+
+
+def import_sessions(rows, creator_id, chunk_size=500):
+    """
+    Create sessions (creator auto-joined, plus any listed members) from
+    (line, row) pairs. Returns an ImportResult with the new session ids.
+    """
+    imported, errors = [], []
+
+    for chunk in _chunks(rows, chunk_size):
+        valid = []
+        for line, row in chunk:
+            try:
+                valid.append((line,) + _validate_session(row))
+            except ValueError as exc:
+                errors.append(RowError(line, str(exc)))
+        if not valid:
+            continue
+
+        users = _resolve_users(m for _, _, members in valid for m in members)
+        ids = db.session.execute(
+            insert(StudySession).returning(StudySession.id, sort_by_parameter_order=True),
+            [dict(values, creator_id=creator_id) for _, values, _ in valid],
+        ).scalars().all()
+
+        pairs = set()
+        for session_id, (line, _, members) in zip(ids, valid):
+            pairs.add((creator_id, session_id))
+            for member in members:
+                if member in users:
+                    pairs.add((users[member], session_id))
+                else:
+                    errors.append(RowError(line, f'unknown member {member!r} was not added'))
+        db.session.execute(
+            sqlite_insert(session_members).on_conflict_do_nothing(),
+            [{'user_id': u, 'session_id': s} for u, s in pairs],
+        )
+        schedule.add_sessions(ids)
+        db.session.commit()
+        imported.extend(ids)
+
+    if imported:
+        recommend.invalidate()
+    return ImportResult(imported, sorted(errors))
+
+
+def import_memberships(rows, creator_id=None, chunk_size=500):
+    """
+    Add members to existing sessions from (line, row) pairs with session_id and
+    member columns. Capacity and waitlists apply as for a normal join. When
+    creator_id is given, only that user's sessions may be changed.
+    Returns an ImportResult with the (session_id, user_id) pairs that joined.
+    """
+    imported, errors = [], []
+
+    for chunk in _chunks(rows, chunk_size):
+        users = _resolve_users(_text(row, 'member') for _, row in chunk)
+        session_ids = {int(_text(r, 'session_id')) for _, r in chunk if _text(r, 'session_id').isdigit()}
+        owners = dict(sharding.merged(lambda: db.session.execute(
+            select(StudySession.id, StudySession.creator_id).where(StudySession.id.in_(session_ids)))))
+
+        touched = set()
+        for line, row in chunk:
+            session_id, member = _text(row, 'session_id'), _text(row, 'member')
+            if not session_id.isdigit() or int(session_id) not in owners:
+                errors.append(RowError(line, f'unknown session {session_id!r}'))
+                continue
+            session_id = int(session_id)
+            if creator_id is not None and owners[session_id] != creator_id:
+                errors.append(RowError(line, 'you can only import members into sessions you created'))
+                continue
+            if member not in users:
+                errors.append(RowError(line, f'unknown member {member!r}'))
+                continue
+            with sharding.for_session(session_id):
+                status = membership.join_session(session_id, users[member])
+            if status == membership.JOINED:
+                imported.append((session_id, users[member]))
+                touched.add(session_id)
+            elif status == membership.WAITLISTED:
+                errors.append(RowError(line, f'{member} was waitlisted (session is full)'))
+        db.session.commit()
+        for session_id in touched:
+            recommend.members_changed(session_id)
+        summaries.invalidate_detail(*touched)
+
+    return ImportResult(imported, sorted(errors))
+
+
+# ---------------------------------------------------------------------------
+# Streaming export
+# ---------------------------------------------------------------------------
+
+def _csv_stream(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 16384:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _json_stream(header, rows):
+    yield '['
+    first = True
+    for row in rows:
+        item = {key: value.isoformat() if isinstance(value, datetime) else value
+                for key, value in zip(header, row)}
+        yield ('\n' if first else ',\n') + json.dumps(item)
+        first = False
+    yield '\n]\n'
+
+
+def stream(fmt, header, stmt, batch_size=1000, all_shards=False):
+    """
+    Yield the result of a column-only select as CSV or JSON text chunks. With
+    all_shards, the statement runs in every shard and the rows follow each
+    other in shard order.
+    """
+    stmt = stmt.execution_options(yield_per=batch_size)
+    if all_shards:
+        rows = sharding.merged(lambda: db.session.execute(stmt))
+    else:
+        rows = db.session.execute(stmt)
+    return (_csv_stream if fmt == 'csv' else _json_stream)(header, rows)
+
+
+SESSION_COLUMNS = ['id', 'title', 'date', 'time', 'location', 'topic', 'capacity',
+                   'creator', 'participants', 'parent_id']
+
+
+def sessions_query(creator_id=None):
+    participants = (
+        select(func.count()).select_from(session_members)
+        .where(session_members.c.session_id == StudySession.id)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(StudySession.id, StudySession.title, StudySession.date, StudySession.time,
+               StudySession.location, StudySession.topic, StudySession.capacity,
+               User.username, participants, StudySession.parent_id)
+        .join(User, User.id == StudySession.creator_id)
+        .order_by(StudySession.date, StudySession.id)
+    )
+    if creator_id is not None:
+        stmt = stmt.where(StudySession.creator_id == creator_id)
+    return stmt
+
+
+ROSTER_COLUMNS = ['session_id', 'session_title', 'username', 'email']
+
+
+def roster_query(session_id=None, creator_id=None):
+    stmt = (
+        select(StudySession.id, StudySession.title, User.username, User.email)
+        .join(session_members, session_members.c.session_id == StudySession.id)
+        .join(User, User.id == session_members.c.user_id)
+        .order_by(StudySession.date, StudySession.id, User.username)
+    )
+    if session_id is not None:
+        stmt = stmt.where(StudySession.id == session_id)
+    if creator_id is not None:
+        stmt = stmt.where(StudySession.creator_id == creator_id)
+    return stmt
+
+
+COMMENT_COLUMNS = ['id', 'session_id', 'username', 'timestamp', 'content']
+
+
+def comments_query(session_id):
+    return (
+        select(SessionComment.id, SessionComment.session_id, User.username,
+               SessionComment.timestamp, SessionComment.content)
+        .join(User, User.id == SessionComment.user_id)
+        .where(SessionComment.session_id == session_id)
+        .order_by(SessionComment.timestamp, SessionComment.id)
+    )
@@ -0,0 +1,26 @@
+# app/main/commenting.py
+"""Posting comments as a single Core write (so it can be batched, see app/writes.py)."""
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app import notifications
+from app.models import db, SessionComment
+
+_comments = SessionComment.__table__
+
+
+def add_comment(session_id, user_id, content, executor=None):
+    """
+    Add a comment and its activity event. Returns the new comment's id.
+    The caller is responsible for committing.
+    """
+    executor = executor or db.session
+    comment_id = executor.execute(insert(_comments).values(
+        session_id=session_id,
+        user_id=user_id,
+        content=content,
+        timestamp=datetime.utcnow(),
+    )).inserted_primary_key[0]
+    notifications.record_event(session_id, user_id, notifications.COMMENTED, content, executor=executor)
+    return comment_id
@@ -0,0 +1,152 @@
+# app/main/membership.py
+"""
+Join/leave logic for study sessions.
+
+Every membership change is a single conditional INSERT/DELETE so that two
+requests racing on the same session can never both take the last seat or
+trip the session_members primary key. SQLite serializes writers, which makes
+each statement (including its sub-selects) atomic.
+"""
+from datetime import datetime
+
+from sqlalchemy import delete, exists, func, literal, or_, select
+from sqlalchemy.dialects.sqlite import insert
+
+from app import notifications
+from app.main import schedule
+from app.models import db, session_members, StudySession, SessionWaitlist
+
+# Outcomes returned by join_session()
+JOINED = 'joined'
+ALREADY_MEMBER = 'already_member'
+WAITLISTED = 'waitlisted'
+ALREADY_WAITLISTED = 'already_waitlisted'
+
+
+def _seat_available(session_id):
+    """SQL condition: the session has no capacity or still has a free seat."""
+    taken = (
+        select(func.count())
+        .select_from(session_members)
+        .where(session_members.c.session_id == session_id)
+        .scalar_subquery()
+    )
+    return or_(StudySession.capacity.is_(None), taken < StudySession.capacity)
+
+
+def _insert_member(session_id, user_id, executor):
+    """Atomically add a member if a seat is free. Returns True if a row was added."""
+    source = select(literal(user_id), StudySession.id).where(
+        StudySession.id == session_id,
+        _seat_available(session_id),
+    )
+    stmt = (
+        insert(session_members)
+        .from_select(['user_id', 'session_id'], source)
+        .on_conflict_do_nothing()
+    )
+    return executor.execute(stmt).rowcount == 1
+
+
+def is_member(session_id, user_id, executor=None):
+    """Return True if the user is a member of the session."""
+    executor = executor or db.session
+    stmt = select(exists().where(
+        session_members.c.session_id == session_id,
+        session_members.c.user_id == user_id,
+    ))
+    return bool(executor.execute(stmt).scalar())
+
+
+def is_waitlisted(session_id, user_id, executor=None):
+    """Return True if the user is waiting for a seat in the session."""
+    executor = executor or db.session
+    stmt = select(exists().where(
+        SessionWaitlist.session_id == session_id,
+        SessionWaitlist.user_id == user_id,
+    ))
+    return bool(executor.execute(stmt).scalar())
+
+
+def join_session(session_id, user_id, executor=None):
+    """
+    Add a user to a session, or to its waitlist when the session is full.
+    The caller is responsible for committing.
+    """
+    executor = executor or db.session
+
+    if _insert_member(session_id, user_id, executor):
+        schedule.add_entry(session_id, user_id, executor)
+        notifications.record_event(session_id, user_id, notifications.JOINED, executor=executor)
+        return JOINED
+    if is_member(session_id, user_id, executor):
+        return ALREADY_MEMBER
+
+    # No seat left: queue the user instead
+    stmt = (
+        insert(SessionWaitlist)
+        .values(user_id=user_id, session_id=session_id, created_at=datetime.utcnow())
+        .on_conflict_do_nothing()
+    )
+    if executor.execute(stmt).rowcount == 1:
+        return WAITLISTED
+    return ALREADY_WAITLISTED
+
+
+def leave_session(session_id, user_id, executor=None):
+    """
+    Remove a user from a session (or its waitlist) and hand any freed seat to
+    the waitlist. Returns True if the user held a seat.
+    The caller is responsible for committing.
+    """
+    executor = executor or db.session
+
+    removed = executor.execute(
+        delete(session_members).where(
+            session_members.c.session_id == session_id,
+            session_members.c.user_id == user_id,
+        )
+    ).rowcount == 1
+    executor.execute(
+        delete(SessionWaitlist).where(
+            SessionWaitlist.session_id == session_id,
+            SessionWaitlist.user_id == user_id,
+        )
+    )
+
+    if removed:
+        schedule.remove_entry(session_id, user_id, executor)
+        notifications.record_event(session_id, user_id, notifications.LEFT, executor=executor)
+        promote_waitlist(session_id, executor)
+    return removed
+
+
+def promote_waitlist(session_id, executor=None):
+    """
+    Move users from the head of the waitlist into the session while seats are
+    free. Returns the ids of the promoted users.
+    The caller is responsible for committing.
+    """
+    executor = executor or db.session
+    promoted = []
+
+    while True:
+        head = executor.execute(
+            select(SessionWaitlist.id, SessionWaitlist.user_id)
+            .where(SessionWaitlist.session_id == session_id)
+            .order_by(SessionWaitlist.created_at, SessionWaitlist.id)
+            .limit(1)
+        ).first()
+        if head is None:
+            break
+
+        if _insert_member(session_id, head.user_id, executor):
+            schedule.add_entry(session_id, head.user_id, executor)
+            notifications.record_event(session_id, head.user_id, notifications.JOINED, executor=executor)
+            promoted.append(head.user_id)
+        elif not is_member(session_id, head.user_id, executor):
+            break  # session is full again
+
+        executor.execute(delete(SessionWaitlist).where(SessionWaitlist.id == head.id))
+
+    return promoted
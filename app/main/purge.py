@@ -0,0 +1,103 @@
+# app/main/purge.py
+"""
+Deleting sessions, and sweeping up rows whose session is gone.
+
+Everything that hangs off a session (members, comments, waitlist entries,
+schedule entries, activity events) references it with ON DELETE CASCADE, and
+later occurrences of a recurring session point at it with ON DELETE SET NULL
+(see app/models.py). Foreign keys are enforced on every connection, so
+removing any number of sessions is a couple of set-based statements:
+bump the affected members' schedule versions, then DELETE the session rows.
+The ORM never loads the children.
+
+Databases created before the cascades existed get them from `flask init-db`
+(see app/schema.py). Rows orphaned before then, or by writes made with
+foreign keys off, are removed by the daily 'sweep_orphans' task, or manually
+with `flask sweep-orphans`, in every course shard (see app/sharding.py).
+"""
+from sqlalchemy import delete, exists, func, or_, select, update
+
+from app import sharding
+from app.main import recommend, schedule, summaries
+from app.models import (
+    db, session_members, ActivityEvent, ScheduleEntry, SessionComment, SessionWaitlist, StudySession, User,
+)
+from app.tasks import task
+
+
+def series_ids(session):
+    """Ids of the recurring series a session belongs to: its root and every occurrence created from it."""
+    root_id = session.parent_id or session.id
+    return db.session.execute(
+        select(StudySession.id)
+        .where(or_(StudySession.id == root_id, StudySession.parent_id == root_id),
+               StudySession.creator_id == session.creator_id)
+        .order_by(StudySession.id)
+    ).scalars().all()
+
+
+def purge_sessions(ids):
+    """
+    Delete sessions and (through the database's cascades) everything attached
+    to them. Runs in the current transaction; call purged() after committing.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    # Members' calendar feeds must see the change, so schedule rows go first
+    schedule.remove_sessions(ids)
+    db.session.execute(
+        delete(StudySession).where(StudySession.id.in_(ids)).execution_options(synchronize_session=False))
+    db.session.expire_all()
+
+
+def purged(ids):
+    """Drop deleted sessions from the in-process indexes and caches (after commit)."""
+    for session_id in ids:
+        recommend.session_removed(session_id)
+    summaries.invalidate_detail(*ids)
+
+
+def _missing_session(column):
+    return ~exists().where(StudySession.id == column)
+
+
+@task('sweep_orphans')
+def sweep_orphans():
+    """Delete rows whose session (or member) no longer exists. Returns the count per table."""
+    totals = {}
+    for removed in sharding.fan_out(_sweep_shard):
+        for table, count in removed.items():
+            totals[table] = totals.get(table, 0) + count
+    return totals
+
+
+def _sweep_shard():
+    removed = {
+        'session_members': db.session.execute(delete(session_members).where(or_(
+            _missing_session(session_members.c.session_id),
+            ~exists().where(User.id == session_members.c.user_id),
+        ))).rowcount,
+        'session_comment': db.session.execute(
+            delete(SessionComment).where(_missing_session(SessionComment.session_id))).rowcount,
+        'session_waitlist': db.session.execute(
+            delete(SessionWaitlist).where(_missing_session(SessionWaitlist.session_id))).rowcount,
+        'activity_event': db.session.execute(
+            delete(ActivityEvent).where(_missing_session(ActivityEvent.session_id))).rowcount,
+    }
+    # Through schedule.remove_sessions, so the members' calendar feeds change too
+    stale = select(ScheduleEntry.session_id).where(_missing_session(ScheduleEntry.session_id))
+    removed['schedule_entry'] = db.session.scalar(select(func.count()).select_from(stale.subquery()))
+    if removed['schedule_entry']:
+        schedule.remove_sessions(stale.distinct())
+
+    parent = StudySession.__table__.alias('parent')
+    removed['study_session.parent_id'] = db.session.execute(
+        update(StudySession)
+        .where(StudySession.parent_id.is_not(None),
+               ~exists().where(parent.c.id == StudySession.parent_id))
+        .values(parent_id=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return removed
@@ -0,0 +1,288 @@
+# app/main/recommend.py
+"""
+Session recommendations for the "Available Sessions to Join" list.
+
+Upcoming sessions are ranked for a user by two signals:
+
+- topic similarity: cosine similarity between a session's TF-IDF vector
+  (title + topic words) and the sum of the vectors of sessions the user joined
+- co-membership: how often the session's members have studied with the user
+
+Both come from a SimilarityIndex held in memory by each process. It is built
+once, patched incrementally when sessions or memberships change in this
+process, and fully rebuilt on a background thread once it is older than
+RECOMMEND_INDEX_TTL (picking up changes made by other processes). Ranked
+results are cached per user, so ranking the listing is normally a dictionary
+lookup. A new, edited or removed session changes every user's candidates and
+bumps the index version. A join or leave only bumps the versions of the users
+whose ranking it can change: the session's members and everyone who shares a
+session with the user who joined or left.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import sharding
+from app.models import db, session_members, StudySession
+
+# Relative weight of the two signals in the final score
+TEXT_WEIGHT = 0.7
+PEER_WEIGHT = 0.3
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_STOPWORDS = frozenset(
+    'a an and are at be for from in into is it of on or the to with session sessions study review'.split()
+)
+
+
+def tokenize(*texts):
+    """Lowercase words from the given texts, without stopwords and 1-letter words."""
+    words = []
+    for text in texts:
+        words.extend(w for w in _WORD_RE.findall((text or '').lower()) if len(w) > 1 and w not in _STOPWORDS)
+    return words
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    return {t: w / norm for t, w in vector.items()} if norm else {}
+
+
+class SimilarityIndex:
+    """Sparse TF-IDF vectors and co-membership sets for every live session."""
+
+    def __init__(self):
+        self.version = 0                      # bumped when sessions change
+        self.user_versions = Counter()        # user id -> bumped when the user's peers change
+        self.built_at = 0.0
+        self.terms = {}                       # session id -> Counter of words
+        self.vectors = {}                     # session id -> normalized {word: weight}
+        self.doc_freq = Counter()             # word -> number of sessions using it
+        self.dates = {}                       # session id -> date
+        self.members = defaultdict(set)       # session id -> user ids
+        self.joined = defaultdict(set)        # user id -> session ids
+        self.lock = threading.RLock()
+
+    # -- building -------------------------------------------------------------
+
+    @classmethod
+    def build(cls):
+        """Load every session and membership with two column-only queries (per shard)."""
+        index = cls()
+        for row in sharding.merged(lambda: db.session.execute(
+                select(StudySession.id, StudySession.title, StudySession.topic, StudySession.date))):
+            index._set_terms(row.id, row.title, row.topic, row.date)
+        for user_id, session_id in sharding.merged(lambda: db.session.execute(
+                select(session_members.c.user_id, session_members.c.session_id))):
+            index.members[session_id].add(user_id)
+            index.joined[user_id].add(session_id)
+        index.vectors = {sid: index._vectorize(terms) for sid, terms in index.terms.items()}
+        index.built_at = time.monotonic()
+        return index
+
+    def _set_terms(self, session_id, title, topic, date):
+        old = self.terms.pop(session_id, None)
+        if old:
+            self.doc_freq.subtract(old.keys())
+        terms = Counter(tokenize(title, topic))
+        self.terms[session_id] = terms
+        self.doc_freq.update(terms.keys())
+        self.dates[session_id] = date
+
+    def _vectorize(self, terms):
+        total = len(self.terms) or 1
+        return _normalize({
+            t: (1 + math.log(count)) * math.log((1 + total) / (1 + self.doc_freq[t]))
+            for t, count in terms.items()
+        })
+
+    # -- incremental updates ----------------------------------------------------
+
+    def update_session(self, session_id):
+        """Re-read one session (new or edited) and re-vectorize it."""
+        row = db.session.execute(
+            select(StudySession.title, StudySession.topic, StudySession.date)
+            .where(StudySession.id == session_id)
+        ).first()
+        with self.lock:
+            if row is None:
+                self.remove_session(session_id)
+                return
+            self._set_terms(session_id, row.title, row.topic, row.date)
+            self.vectors[session_id] = self._vectorize(self.terms[session_id])
+            self.version += 1
+
+    def remove_session(self, session_id):
+        with self.lock:
+            terms = self.terms.pop(session_id, None)
+            if terms:
+                self.doc_freq.subtract(terms.keys())
+            self.vectors.pop(session_id, None)
+            self.dates.pop(session_id, None)
+            for user_id in self.members.pop(session_id, ()):
+                self.joined[user_id].discard(session_id)
+            self.version += 1
+
+    def refresh_members(self, session_id):
+        """Re-read one session's member list."""
+        current = set(db.session.execute(
+            select(session_members.c.user_id).where(session_members.c.session_id == session_id)
+        ).scalars())
+        with self.lock:
+            previous = self.members[session_id]
+            for user_id in previous - current:
+                self.joined[user_id].discard(session_id)
+            for user_id in current - previous:
+                self.joined[user_id].add(session_id)
+            self.members[session_id] = current
+            # Members' joined sessions and peers changed; so did the peer score
+            # of this session for anyone who studies with a joiner or leaver
+            affected = previous | current
+            for user_id in previous ^ current:
+                for sid in self.joined.get(user_id, ()):
+                    affected |= self.members.get(sid, set())
+            for user_id in affected:
+                self.user_versions[user_id] += 1
+
+    # -- scoring ----------------------------------------------------------------
+
+    def rank(self, user_id, today=None):
+        """Return [(session_id, score)] for upcoming sessions the user hasn't joined, best first."""
+        today = today or datetime.utcnow().date()
+        with self.lock:
+            joined = self.joined.get(user_id, set())
+
+            profile = Counter()
+            for sid in joined:
+                profile.update(self.vectors.get(sid, {}))
+            profile = _normalize(profile)
+
+            # Peers weighted by the number of sessions shared with the user
+            peers = Counter()
+            for sid in joined:
+                peers.update(self.members[sid])
+            peers.pop(user_id, None)
+            peer_total = sum(peers.values()) or 1
+
+            scored = []
+            for sid, vector in self.vectors.items():
+                if sid in joined or self.dates[sid].date() < today:
+                    continue
+                text = sum(w * profile.get(t, 0.0) for t, w in vector.items())
+                peer = sum(peers[m] for m in self.members.get(sid, ())) / peer_total
+                scored.append((sid, TEXT_WEIGHT * text + PEER_WEIGHT * peer))
+
+            scored.sort(key=lambda item: (-item[1], self.dates[item[0]], item[0]))
+        return scored
+
+
+# ---------------------------------------------------------------------------
+# Per-process index and ranked-result cache
+# ---------------------------------------------------------------------------
+
+class Recommender:
+    """The app's current index plus an LRU of ranked results per user."""
+
+    def __init__(self, max_cached_users=1024):
+        self.index = None
+        self.rebuilding = False
+        self.lock = threading.Lock()
+        self.ranked = OrderedDict()   # user id -> (index and user versions, {session id: score})
+        self.max_cached_users = max_cached_users
+
+    def get_index(self, app):
+        """Return the index, building it on first use and refreshing it in the background when stale."""
+        index = self.index
+        if index is None:
+            index = self.index = SimilarityIndex.build()
+        elif time.monotonic() - index.built_at > app.config['RECOMMEND_INDEX_TTL']:
+            with self.lock:
+                if not self.rebuilding:
+                    self.rebuilding = True
+                    threading.Thread(
+                        target=self._rebuild, args=(app,), name='recommend-rebuild', daemon=True).start()
+        return index
+
+    def _rebuild(self, app):
+        try:
+            with app.app_context():
+                self.index = SimilarityIndex.build()
+        finally:
+            self.rebuilding = False
+
+    def scores_for(self, app, user_id):
+        index = self.get_index(app)
+        key = (id(index), index.version, index.user_versions[user_id])
+        with self.lock:
+            cached = self.ranked.get(user_id)
+            if cached is not None and cached[0] == key:
+                self.ranked.move_to_end(user_id)
+                return cached[1]
+
+        scores = dict(index.rank(user_id))
+        with self.lock:
+            self.ranked[user_id] = (key, scores)
+            if len(self.ranked) > self.max_cached_users:
+                self.ranked.popitem(last=False)
+        return scores
+
+
+def _recommender():
+    app = current_app._get_current_object()
+    recommender = app.extensions.get('recommender')
+    if recommender is None:
+        recommender = app.extensions.setdefault('recommender', Recommender())
+    return recommender
+
+
+def scores_for(user_id):
+    """Return {session_id: score} for the user's upcoming, not yet joined sessions."""
+    return _recommender().scores_for(current_app._get_current_object(), user_id)
+
+
+def order_available(user_id, sessions):
+    """
+    Sort the user's available sessions best match first. Past sessions (which
+    have no score) keep their relative order at the end.
+    Returns (sessions, recommended_ids) where recommended_ids are the top picks.
+    """
+    scores = scores_for(user_id)
+    ordered = sorted(sessions, key=lambda s: (s.id not in scores, -scores.get(s.id, 0.0)))
+    top = [s.id for s in ordered if scores.get(s.id, 0.0) > 0][:current_app.config['RECOMMEND_TOP_N']]
+    return ordered, set(top)
+
+
+# Hooks called by the write routes (after commit) so this process sees its own
+# changes at once; other processes pick them up on their next rebuild
+
+def session_changed(session_id):
+    index = _recommender().index
+    if index is not None:
+        index.update_session(session_id)
+
+
+def session_removed(session_id):
+    index = _recommender().index
+    if index is not None:
+        index.remove_session(session_id)
+
+
+def invalidate():
+    """
+    Drop the index after a bulk import of sessions; it is rebuilt on next use.
+    New sessions are candidates for every user, so no cached ranking survives
+    them anyway. (Membership imports use members_changed().)
+    """
+    _recommender().index = None
+
+
+def members_changed(session_id):
+    index = _recommender().index
+    if index is not None:
+        index.refresh_members(session_id)
@@ -1,8 +1,18 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request, abort, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
-from app.models import StudySession, SessionComment, db
-from app.forms import StudySessionForm, SessionCommentForm
+from app.models import Course, StudySession, User, db, session_members
+from app.forms import StudySessionForm, SessionCommentForm, BulkImportForm
+from app import cache, notifications, sharding, writes
+from app.idempotency import idempotent
+from app.main import commenting, membership, purge, recommend, schedule, summaries
+from app.main.utils import suggest_location
+from app.tasks import enqueue, task
 from datetime import datetime, timedelta
+import io
+import time
+
+# bulk (csv/json export), archive and analytics are imported inside the views that use
+# them, which keeps them off the startup path
 
 main_bp = Blueprint('main', __name__, template_folder='templates')
 
@@ -18,19 +28,86 @@ def feature():
 @main_bp.route('/sessions')
 @login_required
 def view_sessions():
-    joined = StudySession.query.filter(StudySession.members.any(id=current_user.id)).all()
-    available = StudySession.query.filter(~StudySession.members.any(id=current_user.id)).all()
-    return render_template('main/sessions.html', joined_sessions=joined, available_sessions=available)
+    # Read-only summaries: one column-only query instead of ORM objects plus lazy loads
+    joined, available = summaries.listing(current_user.id)
+    available, recommended_ids = recommend.order_available(current_user.id, available)
+    return render_template(
+        'main/sessions.html',
+        joined_sessions=joined,
+        available_sessions=available,
+        recommended_ids=recommended_ids
+    )
+
+# READ (JSON): the same listing for API clients
+@main_bp.route('/api/sessions')
+@login_required
+def api_sessions():
+    joined, available = summaries.listing(current_user.id)
+    available, recommended_ids = recommend.order_available(current_user.id, available)
+    return jsonify(
+        joined=[s.to_dict() for s in joined],
+        available=[dict(s.to_dict(), recommended=s.id in recommended_ids) for s in available],
+    )
+
+# CACHE: this process's cache counters (hits, misses, waits, sizes)
+@main_bp.route('/api/cache-stats')
+@login_required
+def cache_stats():
+    return jsonify(cache.get_cache().stats())
+
+# ANALYTICS: attendance and utilization stats for organizers
+@main_bp.route('/analytics')
+@login_required
+def analytics_report():
+    from app.main import analytics
+
+    try:
+        report = analytics.report()
+    except analytics.AnalyticsUnavailable as exc:
+        return render_template('main/analytics.html', report=None, error=str(exc)), 503
+    return render_template('main/analytics.html', report=report, error=None)
+
+@main_bp.route('/api/analytics')
+@login_required
+def api_analytics():
+    from app.main import analytics
+
+    try:
+        return jsonify(analytics.report())
+    except analytics.AnalyticsUnavailable as exc:
+        return jsonify(error=str(exc)), 503
+
+# COURSES: Every course, and one course's sessions
+@main_bp.route('/courses')
+@login_required
+def courses():
+    return render_template('main/courses.html', courses=Course.query.order_by(Course.code).all())
+
+@main_bp.route('/course/<course_code>')
+@login_required
+def course_sessions(course_code):
+    # The before_request hook has routed this request to the course's shard
+    course = Course.query.filter_by(code=course_code).first_or_404()
+    sessions = summaries.course_listing(course.id, current_user.id)
+    return render_template('main/course.html', course=course, sessions=sessions)
 
 # CREATE: Create a new session
 @main_bp.route('/create_session', methods=['GET', 'POST'])
 @login_required
+@idempotent
 def create_session():
     form = StudySessionForm()
+    courses = Course.query.order_by(Course.code).all()
+    form.course.choices = [(0, 'No course')] + [(c.id, f'{c.code} - {c.name}') for c in courses]
+    if request.method == 'GET' and request.args.get('course'):
+        form.course.data = next((c.id for c in courses if c.code == request.args['course']), 0)
     if form.validate_on_submit():
+        course = next((c for c in courses if c.id == form.course.data), None)
         try:
             session_date = datetime.strptime(form.date.data, '%Y-%m-%d')
             
+            # The session and everything attached to it live in the course's shard
+            sharding.use_shard(course.shard if course else 0)
             session = StudySession(
                 title=form.title.data,
                 date=session_date,
@@ -39,19 +116,28 @@ def create_session():
                 topic=form.topic.data or '',
                 creator_id=current_user.id,
                 is_recurring=form.is_recurring.data,
-                recurrence_interval=form.recurrence_interval.data if form.is_recurring.data else None
+                recurrence_interval=form.recurrence_interval.data if form.is_recurring.data else None,
+                capacity=form.capacity.data,
+                course_id=course.id if course else None
             )
             
-            session.members.append(current_user)
             db.session.add(session)
+            db.session.flush()
+            # Not session.members.append(): the ORM would write the membership
+            # through User's mapper, i.e. to the primary rather than the shard
+            db.session.execute(session_members.insert().values(session_id=session.id, user_id=current_user.id))
+            schedule.add_entry(session.id, current_user.id)
             db.session.commit()
+            recommend.session_changed(session.id)
+            recommend.members_changed(session.id)
 
-            # Create recurring sessions if applicable
+            # Create recurring sessions in the background if applicable
             if session.is_recurring:
-                create_recurring_sessions(session)
-                db.session.commit()
+                enqueue('create_recurring_sessions', session.id)
             
             flash('Study session created successfully!', 'success')
+            if course:
+                return redirect(url_for('main.course_sessions', course_code=course.code))
             return redirect(url_for('main.view_sessions'))
         except ValueError:
             flash('Invalid date format. Please use YYYY-MM-DD', 'error')
@@ -78,12 +164,29 @@ def create_recurring_sessions(parent_session, count=4):
             location=parent_session.location,
             topic=parent_session.topic or '',
             creator_id=parent_session.creator_id,
+            capacity=parent_session.capacity,
             parent_id=parent_session.id,
             is_recurring=False,  # Child sessions are not recurring themselves
-            recurrence_interval=None
+            recurrence_interval=None,
+            course_id=parent_session.course_id
         )
         db.session.add(new_session)
 
+@task('create_recurring_sessions')
+def create_recurring_sessions_task(parent_id):
+    """Background task: create the copies of a newly created recurring session"""
+    with sharding.for_session(parent_id):
+        _create_recurring_copies(parent_id)
+
+def _create_recurring_copies(parent_id):
+    parent_session = db.session.get(StudySession, parent_id)
+    if parent_session is None or StudySession.query.filter_by(parent_id=parent_id).first():
+        return  # deleted meanwhile, or a retry after the copies were committed
+    create_recurring_sessions(parent_session)
+    db.session.commit()
+    for child in StudySession.query.filter_by(parent_id=parent_id):
+        recommend.session_changed(child.id)
+
 # UPDATE: Edit a session
 @main_bp.route('/edit_session/<int:session_id>', methods=['GET', 'POST'])
 @login_required
@@ -103,8 +206,17 @@ def edit_session(session_id):
             session.time = form.time.data
             session.location = form.location.data
             session.topic = form.topic.data or ''
+            session.capacity = form.capacity.data
             
+            # A raised (or removed) capacity frees seats for the waitlist
+            db.session.flush()
+            membership.promote_waitlist(session.id)
+            schedule.refresh_session(session.id)
+            notifications.record_event(session.id, current_user.id, notifications.EDITED)
             db.session.commit()
+            recommend.session_changed(session.id)
+            recommend.members_changed(session.id)
+            summaries.invalidate_detail(session.id)
             flash('Session updated successfully!', 'success')
             return redirect(url_for('main.view_sessions'))
         except ValueError:
@@ -116,6 +228,7 @@ def edit_session(session_id):
         form.time.data = session.time
         form.location.data = session.location
         form.topic.data = session.topic
+        form.capacity.data = session.capacity
     
     return render_template('main/edit_session.html', form=form, session=session)
 
@@ -129,14 +242,23 @@ def delete_session(session_id):
         flash('You can only delete sessions you created.', 'error')
         return redirect(url_for('main.view_sessions'))
     
-    db.session.delete(session)
+    # "Delete series" removes every occurrence of a recurring session, in one statement
+    ids = [session.id]
+    if request.form.get('series') and (session.is_recurring or session.parent_id):
+        ids = purge.series_ids(session)
+    purge.purge_sessions(ids)
     db.session.commit()
-    flash('Session deleted successfully!', 'success')
+    purge.purged(ids)
+    if len(ids) > 1:
+        flash(f'Deleted {len(ids)} sessions in the series.', 'success')
+    else:
+        flash('Session deleted successfully!', 'success')
     return redirect(url_for('main.view_sessions'))
 
 # JOIN: Join a session
 @main_bp.route('/join_session/<int:session_id>', methods=['POST'])
 @login_required
+@idempotent
 def join_session(session_id):
     session = StudySession.query.get_or_404(session_id)
     
@@ -144,13 +266,18 @@ def join_session(session_id):
         flash('Cannot join a session that has already occurred.', 'error')
         return redirect(url_for('main.view_sessions'))
     
-    if current_user in session.members.all():
+    status = writes.run(membership.join_session, session.id, current_user.id)
+    recommend.members_changed(session.id)
+    summaries.invalidate_detail(session.id)
+
+    if status == membership.JOINED:
+        flash('Successfully joined the session!', 'success')
+    elif status == membership.ALREADY_MEMBER:
         flash('You have already joined this session.', 'info')
-        return redirect(url_for('main.view_sessions'))
-    
-    session.members.append(current_user)
-    db.session.commit()
-    flash('Successfully joined the session!', 'success')
+    elif status == membership.WAITLISTED:
+        flash('This session is full. You have been added to the waitlist.', 'info')
+    else:
+        flash('You are already on the waitlist for this session.', 'info')
     return redirect(url_for('main.view_sessions'))
 
 # LEAVE: Leave a session
@@ -159,16 +286,23 @@ def join_session(session_id):
 def leave_session(session_id):
     session = StudySession.query.get_or_404(session_id)
     
-    if current_user not in session.members.all():
-        flash('You are not a member of this session.', 'error')
-        return redirect(url_for('main.view_sessions'))
-    
     if session.creator_id == current_user.id:
         flash('You cannot leave a session you created. Delete it instead.', 'error')
         return redirect(url_for('main.view_sessions'))
     
-    session.members.remove(current_user)
+    if membership.is_waitlisted(session.id, current_user.id):
+        membership.leave_session(session.id, current_user.id)
+        db.session.commit()
+        flash('You have left the waitlist.', 'info')
+        return redirect(url_for('main.view_sessions'))
+    
+    if not membership.leave_session(session.id, current_user.id):
+        flash('You are not a member of this session.', 'error')
+        return redirect(url_for('main.view_sessions'))
+    
     db.session.commit()
+    recommend.members_changed(session.id)
+    summaries.invalidate_detail(session.id)
     flash('You have left the session.', 'info')
     return redirect(url_for('main.view_sessions'))
 
@@ -176,41 +310,181 @@ def leave_session(session_id):
 @main_bp.route('/session/<int:session_id>')
 @login_required
 def session_detail(session_id):
-    session = StudySession.query.get_or_404(session_id)
-    is_member = current_user in session.members.all()
+    session = summaries.cached_detail(session_id)
+    if session is None:
+        # Old sessions are moved to the archive database; show them read-only
+        from app.main import archive
+
+        archived = archive.get_archived(session_id)
+        if archived is None:
+            abort(404)
+        session, members, comments = archived
+        return render_template(
+            'main/archived_session_detail.html',
+            session=session,
+            members=members,
+            comments=comments
+        )
+
+    is_member = any(member.id == current_user.id for member in session.members)
+    is_waitlisted = not is_member and membership.is_waitlisted(session.id, current_user.id)
     is_creator = session.creator_id == current_user.id
     comment_form = SessionCommentForm()
     
     # Get location suggestion
-    location_suggestion = suggest_location(session)
+    location_suggestion = suggest_location(session.participant_count)
     
     return render_template(
         'main/session_detail.html',
         session=session,
         is_member=is_member,
+        is_waitlisted=is_waitlisted,
         is_creator=is_creator,
         comment_form=comment_form,
-        location_suggestion=location_suggestion
+        location_suggestion=location_suggestion,
+        poll_wait=current_app.config['COMMENT_POLL_WSGI_MAX_WAIT']
     )
 
+# COMMENTS: HTML fragment of a session's comments, optionally long-polling for new ones
+@main_bp.route('/session/<int:session_id>/comments/fragment')
+@login_required
+def comments_fragment(session_id):
+    after_id = request.args.get('after', type=int)
+    wait = min(request.args.get('wait', 0, type=float), current_app.config['COMMENT_POLL_WSGI_MAX_WAIT'])
+    deadline = time.monotonic() + wait
+
+    if db.session.get(StudySession, session_id) is None:
+        abort(404)
+    comments = summaries.load_comments(session_id, after_id)
+    while not comments and time.monotonic() < deadline:
+        # Don't hold a read transaction open while sleeping
+        db.session.rollback()
+        time.sleep(current_app.config['COMMENT_POLL_INTERVAL'])
+        comments = summaries.load_comments(session_id, after_id)
+
+    if not comments:
+        return Response(status=204)
+    return render_template('main/_comments.html', comments=comments)
+
 # COMMENT: Add comment to session
 @main_bp.route('/session/<int:session_id>/comment', methods=['POST'])
 @login_required
+@idempotent
 def add_comment(session_id):
     session = StudySession.query.get_or_404(session_id)
     form = SessionCommentForm()
     
     if form.validate_on_submit():
-        comment = SessionComment(
-            content=form.content.data,
-            user_id=current_user.id,
-            session_id=session.id
-        )
-        db.session.add(comment)
-        db.session.commit()
+        # Committed on its own, or with other requests' writes (WRITE_BATCHING)
+        writes.run(commenting.add_comment, session.id, current_user.id, form.content.data)
+        summaries.invalidate_detail(session.id)
         flash('Comment added successfully!', 'success')
     
     return redirect(url_for('main.session_detail', session_id=session.id))
 
-# Helper import
-from app.main.utils import suggest_location
\ No newline at end of file
+# SCHEDULE: Upcoming sessions the user has joined
+@main_bp.route('/my_schedule')
+@login_required
+def my_schedule():
+    # Every shard holds part of the schedule; merge them soonest first
+    entries = list(sharding.merged(lambda: schedule.upcoming(current_user.id), key=schedule.entry_order))
+    feed_url = url_for('main.calendar_feed', token=schedule.feed_token(current_user), _external=True)
+    return render_template('main/my_schedule.html', entries=entries, feed_url=feed_url)
+
+# SCHEDULE: iCalendar feed for calendar apps (authenticated by the signed token)
+@main_bp.route('/schedule/<token>.ics')
+def calendar_feed(token):
+    user_id = schedule.user_id_from_token(token)
+    user = db.session.get(User, user_id) if user_id is not None else None
+    if user is None:
+        abort(404)
+
+    etag = schedule.feed_etag(user)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        entries = sharding.merged(lambda: schedule.upcoming(user.id).yield_per(200), key=schedule.entry_order)
+        response = Response(
+            stream_with_context(schedule.ics_lines(entries, host=request.host)),
+            mimetype='text/calendar',
+        )
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = 300
+    return response
+
+# IMPORT: Bulk-load sessions or memberships from a CSV/JSON file
+@main_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def bulk_import():
+    from app.main import bulk
+
+    form = BulkImportForm()
+    result = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        fmt = upload.filename.rsplit('.', 1)[-1].lower()
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig')
+        try:
+            rows = bulk.read_rows(stream, fmt)
+            if form.kind.data == 'sessions':
+                result = bulk.import_sessions(rows, current_user.id)
+            else:
+                result = bulk.import_memberships(rows, creator_id=current_user.id)
+        except (bulk.ImportFormatError, UnicodeDecodeError) as exc:
+            db.session.rollback()
+            flash(f'Could not read the file: {exc}', 'error')
+        else:
+            flash(f'Imported {len(result.imported)} {form.kind.data}.', 'success')
+    return render_template('main/import.html', form=form, result=result)
+
+def _export_response(fmt, filename, header, stmt, all_shards=False):
+    from app.main import bulk
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/json'
+    return Response(
+        stream_with_context(bulk.stream(fmt, header, stmt, all_shards=all_shards)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}.{fmt}'},
+    )
+
+# EXPORT: All sessions (streamed)
+@main_bp.route('/export/sessions.<any(csv, json):fmt>')
+@login_required
+def export_sessions(fmt):
+    from app.main import bulk
+
+    mine = request.args.get('mine') == '1'
+    stmt = bulk.sessions_query(creator_id=current_user.id if mine else None)
+    return _export_response(fmt, 'sessions', bulk.SESSION_COLUMNS, stmt, all_shards=True)
+
+# EXPORT: Rosters (with emails) of every session the user created
+@main_bp.route('/export/rosters.<any(csv, json):fmt>')
+@login_required
+def export_rosters(fmt):
+    from app.main import bulk
+
+    stmt = bulk.roster_query(creator_id=current_user.id)
+    return _export_response(fmt, 'rosters', bulk.ROSTER_COLUMNS, stmt, all_shards=True)
+
+# EXPORT: One session's roster (creator only)
+@main_bp.route('/session/<int:session_id>/roster.<any(csv, json):fmt>')
+@login_required
+def export_roster(session_id, fmt):
+    from app.main import bulk
+
+    session = StudySession.query.get_or_404(session_id)
+    if session.creator_id != current_user.id:
+        abort(403)
+    stmt = bulk.roster_query(session_id=session.id)
+    return _export_response(fmt, f'roster-{session.id}', bulk.ROSTER_COLUMNS, stmt)
+
+# EXPORT: One session's comments
+@main_bp.route('/session/<int:session_id>/comments.<any(csv, json):fmt>')
+@login_required
+def export_comments(session_id, fmt):
+    from app.main import bulk
+
+    session = StudySession.query.get_or_404(session_id)
+    stmt = bulk.comments_query(session.id)
+    return _export_response(fmt, f'comments-{session.id}', bulk.COMMENT_COLUMNS, stmt)
@@ -0,0 +1,205 @@
+# app/main/schedule.py
+"""
+Per-user "my schedule" table and iCalendar feed.
+
+schedule_entry holds one denormalized row per (member, session) and is
+maintained incrementally whenever a membership or session changes, so reading
+a schedule never touches study_session or session_members. Every change also
+bumps user.schedule_version, which the calendar feed uses as its ETag.
+"""
+import re
+from datetime import datetime, timedelta
+
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import delete, insert, literal, select, update
+from flask import current_app
+
+from app.models import db, session_members, ScheduleEntry, StudySession, User
+
+_entries = ScheduleEntry.__table__
+_users = User.__table__
+_sessions = StudySession.__table__
+
+# Session columns copied into schedule_entry
+_MIRRORED = ('title', 'date', 'time', 'location', 'topic')
+
+
+def _bump_versions(user_ids, executor):
+    # user_ids is a list or a query on course data. The query is resolved on
+    # its own first: user lives in the primary, and an UPDATE with a subquery on
+    # a sharded table would run in the shard, writing the attached primary
+    # while this session's primary connection may hold its write lock
+    if not isinstance(user_ids, list):
+        user_ids = list(executor.execute(user_ids).scalars())
+    if user_ids:
+        executor.execute(
+            update(_users)
+            .where(_users.c.id.in_(user_ids))
+            .values(schedule_version=_users.c.schedule_version + 1)
+        )
+
+
+def _members_of(session_id):
+    return select(_entries.c.user_id).where(_entries.c.session_id == session_id)
+
+
+def add_entry(session_id, user_id, executor=None):
+    """Copy a session into a member's schedule."""
+    executor = executor or db.session
+    source = select(
+        literal(user_id), _sessions.c.id, *(_sessions.c[name] for name in _MIRRORED)
+    ).where(_sessions.c.id == session_id)
+    executor.execute(
+        insert(_entries)
+        .from_select(['user_id', 'session_id', *_MIRRORED], source)
+        .prefix_with('OR REPLACE')
+    )
+    _bump_versions([user_id], executor)
+
+
+def remove_entry(session_id, user_id, executor=None):
+    """Drop a session from a member's schedule."""
+    executor = executor or db.session
+    removed = executor.execute(
+        delete(_entries).where(_entries.c.session_id == session_id, _entries.c.user_id == user_id)
+    ).rowcount
+    if removed:
+        _bump_versions([user_id], executor)
+
+
+def add_sessions(session_ids, executor=None):
+    """Copy several sessions into the schedules of all their current members."""
+    executor = executor or db.session
+    source = select(
+        session_members.c.user_id, _sessions.c.id, *(_sessions.c[name] for name in _MIRRORED)
+    ).join(_sessions, _sessions.c.id == session_members.c.session_id).where(_sessions.c.id.in_(session_ids))
+    executor.execute(
+        insert(_entries)
+        .from_select(['user_id', 'session_id', *_MIRRORED], source)
+        .prefix_with('OR REPLACE')
+    )
+    _bump_versions(
+        select(session_members.c.user_id).where(session_members.c.session_id.in_(session_ids)), executor)
+
+
+def refresh_session(session_id, executor=None):
+    """Re-copy an edited session into every member's schedule."""
+    executor = executor or db.session
+    values = {
+        name: select(_sessions.c[name]).where(_sessions.c.id == session_id).scalar_subquery()
+        for name in _MIRRORED
+    }
+    executor.execute(update(_entries).where(_entries.c.session_id == session_id).values(**values))
+    _bump_versions(_members_of(session_id), executor)
+
+
+def remove_sessions(session_ids, executor=None):
+    """Drop sessions (about to be deleted) from every member's schedule in one pass."""
+    executor = executor or db.session
+    _bump_versions(
+        select(_entries.c.user_id).where(_entries.c.session_id.in_(session_ids)), executor)
+    executor.execute(delete(_entries).where(_entries.c.session_id.in_(session_ids)))
+
+
+def rebuild(executor=None):
+    """Recompute every schedule from session_members (repairs drift)."""
+    executor = executor or db.session
+    executor.execute(delete(_entries))
+    source = select(
+        session_members.c.user_id, _sessions.c.id, *(_sessions.c[name] for name in _MIRRORED)
+    ).join(_sessions, _sessions.c.id == session_members.c.session_id)
+    executor.execute(insert(_entries).from_select(['user_id', 'session_id', *_MIRRORED], source))
+    executor.execute(update(_users).values(schedule_version=_users.c.schedule_version + 1))
+
+
+def entry_order(entry):
+    """Sort key of upcoming(), for merging the schedules held by several shards."""
+    return entry.date, entry.session_id
+
+
+def upcoming(user_id):
+    """Return the user's sessions from today onward, soonest first."""
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    return (
+        ScheduleEntry.query
+        .filter(ScheduleEntry.user_id == user_id, ScheduleEntry.date >= today)
+        .order_by(ScheduleEntry.date, ScheduleEntry.session_id)
+    )
+
+
+# ---------------------------------------------------------------------------
+# Calendar feed
+# ---------------------------------------------------------------------------
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='calendar-feed')
+
+
+def feed_token(user):
+    """Signed, URL-safe token identifying the user's calendar feed."""
+    return _serializer().dumps(user.id)
+
+
+def user_id_from_token(token):
+    """Return the user id for a feed token, or None if it was tampered with."""
+    try:
+        return _serializer().loads(token)
+    except BadSignature:
+        return None
+
+
+def feed_etag(user):
+    return f'sched-{user.id}-{user.schedule_version}'
+
+
+_TIME_RE = re.compile(r'(\d{1,2})(?::(\d{2}))?\s*([AaPp][Mm])')
+
+
+def _parse_times(session_date, time_text):
+    """
+    Best-effort parse of the free-text time field ("3:00 PM - 5:00 PM").
+    Returns (start, end) datetimes, or None if no time could be read.
+    """
+    matches = _TIME_RE.findall(time_text or '')
+    if not matches:
+        return None
+
+    def to_datetime(hour, minute, meridiem):
+        hour = int(hour) % 12 + (12 if meridiem.lower() == 'pm' else 0)
+        return datetime.combine(session_date.date(), datetime.min.time()).replace(
+            hour=hour, minute=int(minute or 0))
+
+    start = to_datetime(*matches[0])
+    end = to_datetime(*matches[1]) if len(matches) > 1 else start + timedelta(hours=1)
+    if end <= start:
+        end = start + timedelta(hours=1)
+    return start, end
+
+
+def _escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def ics_lines(entries, host='studysessions'):
+    """Yield an iCalendar document line by line (CRLF-terminated)."""
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    yield 'BEGIN:VCALENDAR\r\n'
+    yield 'VERSION:2.0\r\n'
+    yield 'PRODID:-//Study Sessions//My Schedule//EN\r\n'
+    yield 'CALSCALE:GREGORIAN\r\n'
+    for entry in entries:
+        yield 'BEGIN:VEVENT\r\n'
+        yield f'UID:session-{entry.session_id}@{host}\r\n'
+        yield f'DTSTAMP:{stamp}\r\n'
+        times = _parse_times(entry.date, entry.time)
+        if times:
+            yield f'DTSTART:{times[0]:%Y%m%dT%H%M%S}\r\n'
+            yield f'DTEND:{times[1]:%Y%m%dT%H%M%S}\r\n'
+        else:
+            yield f'DTSTART;VALUE=DATE:{entry.date:%Y%m%d}\r\n'
+        yield f'SUMMARY:{_escape(entry.title)}\r\n'
+        yield f'LOCATION:{_escape(entry.location)}\r\n'
+        if entry.topic:
+            yield f'DESCRIPTION:{_escape(entry.topic)}\r\n'
+        yield 'END:VEVENT\r\n'
+    yield 'END:VCALENDAR\r\n'
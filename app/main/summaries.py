@@ -0,0 +1,204 @@
+# app/main/summaries.py
+"""
+Read-only session summaries for listings and the detail page.
+
+SessionSummary is a plain __slots__ object built from one column-only query:
+no identity map, no change tracking and no lazy loads. The creator's name,
+participant count, is_past and is_full are computed once while loading, so
+templates and JSON responses read plain attributes. SessionDetail adds the
+member list and comments for the detail page; cached_detail() serves it from
+the two-level cache (app/cache.py) until a write calls invalidate_detail().
+
+The statements are plain Core selects, so the async endpoints (app/asgi.py)
+run the same queries through an async engine.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import exists, func, literal, select
+
+from app import cache, routing, sharding
+from app.models import db, session_members, SessionComment, StudySession, User
+
+Member = namedtuple('Member', ['id', 'username'])
+CommentItem = namedtuple('CommentItem', ['id', 'username', 'content', 'timestamp'])
+
+
+class SessionSummary:
+    """What a session card shows, without the ORM instance behind it."""
+
+    __slots__ = (
+        'id', 'title', 'date', 'time', 'location', 'topic', 'capacity',
+        'creator_id', 'creator_name', 'participant_count', 'is_member',
+        'is_past', 'is_full',
+    )
+
+    def __init__(self, row, today):
+        (self.id, self.title, self.date, self.time, self.location, self.topic, self.capacity,
+         self.creator_id, self.creator_name, self.participant_count, is_member) = row
+        self.is_member = bool(is_member)
+        self.is_past = self.date.date() < today
+        self.is_full = self.capacity is not None and self.participant_count >= self.capacity
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'date': self.date.isoformat(),
+            'time': self.time,
+            'location': self.location,
+            'topic': self.topic,
+            'capacity': self.capacity,
+            'creator': self.creator_name,
+            'participants': self.participant_count,
+            'is_member': self.is_member,
+            'is_past': self.is_past,
+            'is_full': self.is_full,
+        }
+
+    def __repr__(self):
+        return f'<SessionSummary {self.id} {self.title!r}>'
+
+
+def summary_query(user_id=None):
+    """Column-only select of every session, with is_member relative to user_id."""
+    # Counted once for all sessions: session_members has no index leading with
+    # session_id, so a per-row correlated count would scan it for every session
+    participants = (
+        select(session_members.c.session_id, func.count().label('count'))
+        .group_by(session_members.c.session_id)
+        .subquery()
+    )
+    if user_id is None:
+        is_member = literal(False)
+    else:
+        is_member = exists().where(
+            session_members.c.session_id == StudySession.id,
+            session_members.c.user_id == user_id,
+        )
+    return (
+        select(
+            StudySession.id, StudySession.title, StudySession.date, StudySession.time,
+            StudySession.location, StudySession.topic, StudySession.capacity,
+            StudySession.creator_id, User.username, func.coalesce(participants.c.count, 0), is_member,
+        )
+        .outerjoin(User, User.id == StudySession.creator_id)
+        .outerjoin(participants, participants.c.session_id == StudySession.id)
+        .order_by(StudySession.id)
+    )
+
+
+def load_summaries(stmt, today=None):
+    """Run a summary_query() statement and return a list of SessionSummary."""
+    today = today or datetime.utcnow().date()
+    return [SessionSummary(row, today) for row in db.session.execute(stmt)]
+
+
+def listing(user_id):
+    """Return (joined, available) summaries for the sessions page, in one query per shard."""
+    joined, available = [], []
+    for summary in sharding.merged(lambda: load_summaries(summary_query(user_id))):
+        (joined if summary.is_member else available).append(summary)
+    return joined, available
+
+
+def course_listing(course_id, user_id):
+    """One course's sessions, from the shard the request is routed to."""
+    return load_summaries(summary_query(user_id).where(StudySession.course_id == course_id))
+
+
+# ---------------------------------------------------------------------------
+# Detail page
+# ---------------------------------------------------------------------------
+
+class SessionDetail:
+    """Everything the detail page shows about one session."""
+
+    __slots__ = (
+        'id', 'title', 'date', 'time', 'location', 'topic', 'capacity', 'creator_id',
+        'creator_name', 'created_at', 'is_recurring', 'recurrence_interval', 'parent_id',
+        'members', 'comments', 'participant_count', 'is_past', 'is_full',
+    )
+
+    def __init__(self, row, members, comments, today):
+        (self.id, self.title, self.date, self.time, self.location, self.topic, self.capacity,
+         self.creator_id, self.creator_name, self.created_at, self.is_recurring,
+         self.recurrence_interval, self.parent_id) = row
+        self.members = [Member(*m) for m in members]
+        self.comments = [CommentItem(*c) for c in comments]
+        self.participant_count = len(self.members)
+        self.is_past = self.date.date() < today
+        self.is_full = self.capacity is not None and self.participant_count >= self.capacity
+
+    def __repr__(self):
+        return f'<SessionDetail {self.id} {self.title!r}>'
+
+
+def detail_query(session_id):
+    return (
+        select(
+            StudySession.id, StudySession.title, StudySession.date, StudySession.time,
+            StudySession.location, StudySession.topic, StudySession.capacity,
+            StudySession.creator_id, User.username, StudySession.created_at,
+            StudySession.is_recurring, StudySession.recurrence_interval, StudySession.parent_id,
+        )
+        .outerjoin(User, User.id == StudySession.creator_id)
+        .where(StudySession.id == session_id)
+    )
+
+
+def members_query(session_id):
+    return (
+        select(User.id, User.username)
+        .join(session_members, session_members.c.user_id == User.id)
+        .where(session_members.c.session_id == session_id)
+        .order_by(User.username)
+    )
+
+
+def comments_query(session_id, after_id=None):
+    """A session's comments, oldest first; only those newer than after_id if given."""
+    stmt = (
+        select(SessionComment.id, User.username, SessionComment.content, SessionComment.timestamp)
+        .outerjoin(User, User.id == SessionComment.user_id)
+        .where(SessionComment.session_id == session_id)
+        .order_by(SessionComment.timestamp, SessionComment.id)
+    )
+    if after_id is not None:
+        stmt = stmt.where(SessionComment.id > after_id)
+    return stmt
+
+
+def load_comments(session_id, after_id=None):
+    return [CommentItem(*row) for row in db.session.execute(comments_query(session_id, after_id))]
+
+
+def load_detail(session_id, today=None):
+    """Return the SessionDetail for a live session, or None if there is none."""
+    row = db.session.execute(detail_query(session_id)).first()
+    if row is None:
+        return None
+    return SessionDetail(
+        row,
+        db.session.execute(members_query(session_id)).all(),
+        db.session.execute(comments_query(session_id)).all(),
+        today or datetime.utcnow().date(),
+    )
+
+
+def cached_detail(session_id):
+    """load_detail() through the cache. Write routes call invalidate_detail() after committing."""
+    def load():
+        # A replica may not have the write that invalidated the entry yet
+        routing.use_primary()
+        return load_detail(session_id)
+
+    detail = cache.get_or_set(f'session_detail:{session_id}', load, tag=f'session:{session_id}')
+    if detail is not None:
+        # The cached copy may have been loaded yesterday
+        detail.is_past = detail.date.date() < datetime.utcnow().date()
+    return detail
+
+
+def invalidate_detail(*session_ids):
+    cache.invalidate(*(f'session:{session_id}' for session_id in session_ids))
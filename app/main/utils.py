@@ -1,12 +1,9 @@
 # app/main/util.py
-from app.models import StudySession
 
-def suggest_location(session):
+def suggest_location(participant_count):
     """
     Suggests a location based on the number of participants.
     """
-    participant_count = session.get_participant_count()
-
     if participant_count <= 3:
         return "Library Group Study Room"
     elif participant_count <= 6:
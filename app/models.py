@@ -1,16 +1,31 @@
+import sqlite3
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from app.routing import RoutingSession
+
+# Main SQLAlchemy database instance (reads may be routed to replicas, see app/routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+@event.listens_for(Engine, 'connect')
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores FOREIGN KEY clauses (and their ON DELETE rules) unless
+    # every connection asks for them
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA foreign_keys=ON')
 
-# Main SQLAlchemy database instance
-db = SQLAlchemy()
 
 # Association table for many-to-many relationship between users and study sessions
+# (rows go away with either side, in the database)
 session_members = db.Table(
     'session_members',
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-    db.Column('session_id', db.Integer, db.ForeignKey('study_session.id'), primary_key=True)
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('session_id', db.Integer, db.ForeignKey('study_session.id', ondelete='CASCADE'), primary_key=True)
 )
 
 class User(UserMixin, db.Model):
@@ -22,12 +37,17 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     # Hashed password (never store raw passwords)
     password_hash = db.Column(db.String(128))
+    # Bumped whenever the user's schedule changes (used as the calendar feed ETag)
+    # (server_default: ALTER TABLE can only add a NOT NULL column that has one)
+    schedule_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     # Sessions this user has joined (many-to-many via session_members)
+    # (passive_deletes: the database removes session_members rows itself)
     joined_sessions = db.relationship(
         'StudySession',
         secondary=session_members, 
-        backref=db.backref('members', lazy='dynamic')
+        passive_deletes=True,
+        backref=db.backref('members', lazy='dynamic', passive_deletes=True)
     )
     # Sessions this user created (one-to-many)
     created_sessions = db.relationship(
@@ -48,7 +68,29 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+class Course(db.Model):
+    """
+    A course that study sessions belong to. Its sessions, their members and
+    comments live in the course's shard (see app/sharding.py).
+    """
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+    # Short unique code used in URLs (e.g., "CS101")
+    code = db.Column(db.String(20), unique=True, nullable=False)
+    # Full course name
+    name = db.Column(db.String(200), nullable=False)
+    # Shard holding the course's data (0 = the primary database)
+    shard = db.Column(db.Integer, default=0, nullable=False)
+    # When the course was added
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Course {self.code}>'
+
 class StudySession(db.Model):
+    # Never reuse ids: archived sessions keep theirs and stay reachable by URL
+    __table_args__ = {'sqlite_autoincrement': True}
+
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
     # Short title/description of the session
@@ -71,13 +113,22 @@ class StudySession(db.Model):
     is_recurring = db.Column(db.Boolean, default=False)
     # 'weekly', 'biweekly', 'monthly', etc.
     recurrence_interval = db.Column(db.String(20))
-    # Optional self-referential link to parent recurring session
-    parent_id = db.Column(db.Integer, db.ForeignKey('study_session.id'))
+    # Optional self-referential link to parent recurring session (cleared if the parent goes)
+    parent_id = db.Column(db.Integer, db.ForeignKey('study_session.id', ondelete='SET NULL'))
+    # Optional cap on members; extra joiners go to the waitlist (None = unlimited)
+    capacity = db.Column(db.Integer)
+    # Course the session belongs to (None = not tied to a course); decides its shard
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), index=True)
+    course = db.relationship('Course')
 
     def get_participant_count(self):
         """Return the number of users who joined this session."""
         return self.members.count()
     
+    def is_full(self):
+        """Check if the session has a capacity and every seat is taken."""
+        return self.capacity is not None and self.get_participant_count() >= self.capacity
+
     def is_past(self):
         """Check if the session date is before today's date (UTC-based)."""
         return self.date.date() < datetime.utcnow().date()
@@ -95,13 +146,164 @@ class SessionComment(db.Model):
     
     # Author of the comment
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    # Session this comment belongs to
-    session_id = db.Column(db.Integer, db.ForeignKey('study_session.id'), nullable=False)
+    # Session this comment belongs to (deleted with it)
+    session_id = db.Column(db.Integer, db.ForeignKey('study_session.id', ondelete='CASCADE'), nullable=False)
     
     # Relationship back to User (user.comments)
     user = db.relationship('User', backref='comments')
-    # Relationship back to StudySession (session.comments)
-    session = db.relationship('StudySession', backref='comments')
+    # Relationship back to StudySession (session.comments); the database deletes them with the session
+    session = db.relationship('StudySession', backref=db.backref('comments', passive_deletes=True))
     
     def __repr__(self):
         return f'<Comment by {self.user_id} on session {self.session_id}>'
+
+class SessionWaitlist(db.Model):
+    __tablename__ = 'session_waitlist'
+    __table_args__ = (db.UniqueConstraint('user_id', 'session_id'),)
+
+    # Primary key (also breaks ties between entries created in the same instant)
+    id = db.Column(db.Integer, primary_key=True)
+    # User waiting for a seat
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Full session the user is waiting on
+    session_id = db.Column(
+        db.Integer, db.ForeignKey('study_session.id', ondelete='CASCADE'), nullable=False, index=True)
+    # When the user joined the waitlist (first come, first served)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<Waitlist user {self.user_id} on session {self.session_id}>'
+
+class ScheduleEntry(db.Model):
+    # Precomputed copy of a session in a member's schedule, kept in sync by
+    # app/main/schedule.py so "my schedule" is a single indexed range scan
+    __tablename__ = 'schedule_entry'
+    __table_args__ = (db.Index('ix_schedule_entry_user_date', 'user_id', 'date'),)
+
+    # Member who sees this entry
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    # Session the entry mirrors
+    session_id = db.Column(
+        db.Integer, db.ForeignKey('study_session.id', ondelete='CASCADE'), primary_key=True, index=True)
+    # Denormalized session fields
+    title = db.Column(db.String(200), nullable=False)
+    date = db.Column(db.DateTime, nullable=False)
+    time = db.Column(db.String(20), nullable=False)
+    location = db.Column(db.String(200), nullable=False)
+    topic = db.Column(db.String(100))
+
+    def __repr__(self):
+        return f'<ScheduleEntry user {self.user_id} session {self.session_id}>'
+
+
+# Archive tables live in their own SQLite file (the 'archive' bind) so the live
+# tables and their indexes only hold recent sessions. User names are copied in
+# because the user table is not available in the archive database.
+
+class ArchivedSession(db.Model):
+    __bind_key__ = 'archive'
+    __tablename__ = 'archived_session'
+
+    # Same id the session had in the live table
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(200), nullable=False)
+    date = db.Column(db.DateTime, nullable=False, index=True)
+    time = db.Column(db.String(20), nullable=False)
+    location = db.Column(db.String(200), nullable=False)
+    topic = db.Column(db.String(100))
+    creator_id = db.Column(db.Integer, nullable=False)
+    creator_name = db.Column(db.String(80))
+    created_at = db.Column(db.DateTime)
+    is_recurring = db.Column(db.Boolean, default=False)
+    recurrence_interval = db.Column(db.String(20))
+    parent_id = db.Column(db.Integer)
+    capacity = db.Column(db.Integer)
+    # When the archival job moved this session
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def is_past(self):
+        """Archived sessions are always in the past."""
+        return True
+
+    def __repr__(self):
+        return f'<ArchivedSession {self.title}>'
+
+class ArchivedMember(db.Model):
+    __bind_key__ = 'archive'
+    __tablename__ = 'archived_session_member'
+
+    session_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80))
+
+class ArchivedComment(db.Model):
+    __bind_key__ = 'archive'
+    __tablename__ = 'archived_session_comment'
+
+    # Same id the comment had in the live table
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    session_id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    username = db.Column(db.String(80))
+    content = db.Column(db.Text, nullable=False)
+    timestamp = db.Column(db.DateTime)
+
+class Task(db.Model):
+    # Background task queue (app/tasks.py); lives in its own SQLite file so
+    # worker polling never contends with the main database's write lock
+    __bind_key__ = 'tasks'
+    __tablename__ = 'task_queue'
+    __table_args__ = (db.Index('ix_task_queue_status_run_at', 'status', 'run_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Registered task name and JSON-encoded [args, kwargs]
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='[[], {}]')
+    # Optional unique key so the same job is never queued twice
+    dedupe_key = db.Column(db.String(200), unique=True)
+    # 'pending', 'running', 'done' or 'failed'
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    # Earliest time the task may run
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Worker currently holding the task and since when
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Task {self.id} {self.name} {self.status}>'
+
+class ActivityEvent(db.Model):
+    # One row per thing that happened to a session; fanned out to members only
+    # when digests are built (app/notifications.py)
+    __tablename__ = 'activity_event'
+    # Never reuse ids: the digest cursor (DigestCursor) assumes new events get
+    # higher ids than every event already sent, even after the newest were deleted
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(
+        db.Integer, db.ForeignKey('study_session.id', ondelete='CASCADE'), nullable=False, index=True)
+    # User who caused the event (never notified about their own activity)
+    actor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # 'joined', 'left', 'edited' or 'commented'
+    kind = db.Column(db.String(20), nullable=False)
+    # Short extra detail, e.g. the start of a comment
+    detail = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<ActivityEvent {self.kind} by {self.actor_id} on session {self.session_id}>'
+
+class DigestCursor(db.Model):
+    # Highest activity_event id already included in a sent digest (one row per
+    # course shard, see app/notifications.py)
+    __tablename__ = 'digest_cursor'
+
+    name = db.Column(db.String(50), primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,235 @@
+# app/notifications.py
+"""
+Activity events and batched notification digests.
+
+Write paths call record_event() once per event; nothing is fanned out per
+member at write time. The periodic 'send_digests' task then reads every event
+since the last run in one query joined against session_members, groups the
+rows by recipient and hands one message per user to the configured sink. The
+cost of a run therefore grows with the number of users to notify, not with
+users x events.
+
+With course shards (app/sharding.py) each shard keeps its own events and id
+sequence, so there is one cursor per shard ('digest' for the primary,
+'digest:<n>' for shard n). A run reads every shard's new events and still
+sends one message per user.
+"""
+import os
+import socket
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import aliased
+
+from app import sharding
+from app.models import db, session_members, ActivityEvent, DigestCursor, StudySession, User
+from app.tasks import task
+
+_events = ActivityEvent.__table__
+
+# Kinds of events recorded by the write routes
+JOINED = 'joined'
+LEFT = 'left'
+EDITED = 'edited'
+COMMENTED = 'commented'
+
+Message = namedtuple('Message', ['to', 'subject', 'body'])
+
+# One row of a digest, as shown to a recipient
+DigestItem = namedtuple('DigestItem', ['session_id', 'session_title', 'actor', 'kind', 'detail', 'created_at'])
+
+
+def record_event(session_id, actor_id, kind, detail=None, executor=None):
+    """Append an event to the activity log. The caller is responsible for committing."""
+    executor = executor or db.session
+    if detail and len(detail) > 200:
+        detail = detail[:197] + '...'
+    executor.execute(insert(_events).values(
+        session_id=session_id,
+        actor_id=actor_id,
+        kind=kind,
+        detail=detail,
+        created_at=datetime.utcnow(),
+    ))
+
+
+def reserve_sent_event_ids():
+    """
+    Make new events get ids above the digest cursor. Only needed once, for
+    databases whose activity_event ids were reused before it had AUTOINCREMENT
+    (the newest events had been deleted); init_db() calls it.
+    """
+    cursor = db.session.get(DigestCursor, 'digest')
+    if cursor is None or not cursor.last_event_id:
+        return
+    db.session.execute(
+        text('UPDATE sqlite_sequence SET seq = max(seq, :seq) WHERE name = :name'),
+        {'seq': cursor.last_event_id, 'name': _events.name})
+    db.session.execute(
+        text('INSERT INTO sqlite_sequence (name, seq) SELECT :name, :seq '
+             'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)'),
+        {'seq': cursor.last_event_id, 'name': _events.name})
+    db.session.commit()
+
+
+# ---------------------------------------------------------------------------
+# Digest building
+# ---------------------------------------------------------------------------
+
+def build_digests(ranges):
+    """
+    Collect the events with after_id < id <= upto_id, for each shard's
+    (after_id, upto_id) in ranges, for every member of the affected sessions
+    (except the member who caused them).
+    Yields (recipient, [DigestItem, ...]) with recipient a (id, username, email) row.
+    """
+    def shard_rows():
+        if sharding.current_shard() not in ranges:
+            return []
+        return _event_rows(*ranges[sharding.current_shard()])
+
+    # A session's events all live in one shard, so (user, session) orders the merged rows
+    rows = sharding.merged(shard_rows, key=lambda row: (row.user_id, row.session_id))
+
+    for _, user_rows in groupby(rows, key=lambda row: row.user_id):
+        user_rows = list(user_rows)
+        first = user_rows[0]
+        items = [
+            DigestItem(r.session_id, r.session_title, r.actor, r.kind, r.detail, r.created_at)
+            for r in user_rows
+        ]
+        yield (first.user_id, first.username, first.email), items
+
+
+def _event_rows(after_id, upto_id):
+    recipient = aliased(User)
+    actor = aliased(User)
+    return db.session.execute(
+        select(
+            recipient.id.label('user_id'), recipient.username, recipient.email,
+            ActivityEvent.session_id, StudySession.title.label('session_title'),
+            actor.username.label('actor'), ActivityEvent.kind, ActivityEvent.detail,
+            ActivityEvent.created_at,
+        )
+        .select_from(ActivityEvent)
+        .join(session_members, session_members.c.session_id == ActivityEvent.session_id)
+        .join(recipient, recipient.id == session_members.c.user_id)
+        .join(actor, actor.id == ActivityEvent.actor_id)
+        .join(StudySession, StudySession.id == ActivityEvent.session_id)
+        .where(
+            ActivityEvent.id > after_id,
+            ActivityEvent.id <= upto_id,
+            session_members.c.user_id != ActivityEvent.actor_id,
+        )
+        .order_by(recipient.id, ActivityEvent.session_id, ActivityEvent.id)
+    )
+
+
+def render_digest(template, recipient, items):
+    """Render one user's digest into a Message."""
+    _, username, email = recipient
+    sessions = groupby(items, key=lambda item: (item.session_id, item.session_title))
+    body = template.render(username=username, sessions=[(key, list(group)) for key, group in sessions])
+    noun = 'update' if len(items) == 1 else 'updates'
+    return Message(to=email, subject=f'Study Sessions: {len(items)} new {noun}', body=body)
+
+
+@task('send_digests')
+def send_digests():
+    """Send one digest per user covering every event since the previous run."""
+    cursors, ranges = {}, {}
+    for shard in sharding.shard_numbers():
+        cursors[shard] = _cursor(shard)
+        with sharding.using_shard(shard):
+            upto_id = db.session.execute(select(func.max(ActivityEvent.id))).scalar() or 0
+        if upto_id > cursors[shard].last_event_id:
+            ranges[shard] = (cursors[shard].last_event_id, upto_id)
+    if not ranges:
+        return 0
+
+    template = current_app.jinja_env.get_template('notifications/digest.txt')
+    messages = (
+        render_digest(template, recipient, items)
+        for recipient, items in build_digests(ranges)
+    )
+    sent = get_sink().deliver(messages)
+
+    retention = timedelta(days=current_app.config['NOTIFICATION_EVENT_RETENTION_DAYS'])
+    for shard, (_, upto_id) in ranges.items():
+        cursors[shard].last_event_id = upto_id
+        cursors[shard].updated_at = datetime.utcnow()
+        with sharding.using_shard(shard):
+            db.session.execute(delete(_events).where(
+                _events.c.id <= upto_id, _events.c.created_at < datetime.utcnow() - retention))
+    db.session.commit()
+    return sent
+
+
+def _cursor(shard):
+    name = 'digest' if shard == 0 else f'digest:{shard}'
+    cursor = db.session.get(DigestCursor, name)
+    if cursor is None:
+        cursor = DigestCursor(name=name, last_event_id=0)
+        db.session.add(cursor)
+    return cursor
+
+
+# ---------------------------------------------------------------------------
+# Delivery sinks
+# ---------------------------------------------------------------------------
+
+class MaildirSink:
+    """Write each message as a file in a Maildir (tmp/ then renamed into new/)."""
+
+    def __init__(self, path):
+        self.path = path
+        for sub in ('tmp', 'new', 'cur'):
+            os.makedirs(os.path.join(path, sub), exist_ok=True)
+        self._counter = 0
+
+    def _unique_name(self):
+        self._counter += 1
+        return f'{time.time():.6f}.{os.getpid()}_{self._counter}.{socket.gethostname()}'
+
+    def deliver(self, messages):
+        sent = 0
+        for message in messages:
+            name = self._unique_name()
+            tmp_path = os.path.join(self.path, 'tmp', name)
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                fh.write(f'To: {message.to}\nSubject: {message.subject}\n\n{message.body}')
+            os.replace(tmp_path, os.path.join(self.path, 'new', name))
+            sent += 1
+        return sent
+
+
+class MemorySink:
+    """Keep messages in a list (tests and local debugging)."""
+
+    def __init__(self):
+        self.messages = []
+
+    def deliver(self, messages):
+        before = len(self.messages)
+        self.messages.extend(messages)
+        return len(self.messages) - before
+
+
+def get_sink():
+    """Return the app's sink, creating it from NOTIFICATION_SINK on first use."""
+    app = current_app._get_current_object()
+    sink = app.extensions.get('notification_sink')
+    if sink is None:
+        kind = app.config['NOTIFICATION_SINK']
+        if kind == 'memory':
+            sink = MemorySink()
+        elif kind == 'maildir':
+            sink = MaildirSink(app.config['NOTIFICATION_MAILDIR'] or os.path.join(app.instance_path, 'maildir'))
+        else:
+            raise ValueError(f'Unknown NOTIFICATION_SINK: {kind}')
+        app.extensions['notification_sink'] = sink
+    return sink
@@ -0,0 +1,153 @@
+# app/routing.py
+"""
+Read/write routing between the primary database and read replicas.
+
+Replica engines are built from SQLALCHEMY_REPLICAS and kept in
+app.extensions['replicas'] (they are not Flask-SQLAlchemy binds, so no tables
+are created on them). RoutingSession.get_bind() sends a statement to a
+replica only when all of these hold:
+
+- it is a SELECT for the primary database (the archive and task binds are not replicated)
+- it runs inside a GET/HEAD/OPTIONS request
+- the session has not written anything yet
+- the client has not written within the last REPLICA_STICKY_SECONDS
+
+Everything else (writes, CLI commands, background tasks, and requests from
+clients that just wrote) uses the primary, so users always read their own
+writes. Each request sticks to one randomly chosen replica. Statements on
+course data in a shard go to that shard instead (see app/sharding.py).
+
+Replicas are plain SQLite files refreshed from the primary with the SQLite
+backup API, by the periodic 'sync_replicas' task or `flask sync-replicas`.
+"""
+import os
+import random
+import sqlite3
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, make_url, orm
+
+SAFE_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+# Key in the client's (cookie) session holding the end of its primary-only window
+STICKY_KEY = '_db_primary_until'
+
+
+def replicas(app):
+    """The app's replica engines (empty when none are configured)."""
+    return app.extensions.get('replicas', [])
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that reads from a replica when it is safe to."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.bind is not None:
+            # Bound to connections of its own (the tests join each session to an
+            # outer transaction): SQLAlchemy's lookup through its bind and binds
+            return orm.Session.get_bind(self, mapper=mapper, clause=clause, **kwargs)
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None:
+            return engine
+
+        # Course data lives in the current shard (see app/sharding.py; imported
+        # here because app.models imports this module)
+        from app import sharding
+        shard = sharding.current_engine()
+        if shard is not None and sharding.is_sharded(mapper, clause):
+            return shard
+
+        if not has_request_context():
+            return engine
+
+        if engine is not self._db.engines.get(None):
+            return engine
+
+        if self._flushing or clause is None or not getattr(clause, 'is_select', False):
+            # A write: this request and the client's next few stay on the primary
+            mark_write()
+            return engine
+
+        return g.get('db_replica') or engine
+
+
+def _choose_replica():
+    """before_request hook: pick the replica for this request, if reads may use one."""
+    engines = replicas(current_app)
+    sticky = session.get(STICKY_KEY, 0) > time.time()
+    if engines and request.method in SAFE_METHODS and not sticky:
+        g.db_replica = random.choice(engines)
+    else:
+        g.db_replica = None
+
+
+def _remember_write(response):
+    """after_request hook: keep a client that just wrote on the primary for a while."""
+    if g.get('db_wrote'):
+        session[STICKY_KEY] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+
+def use_primary():
+    """Send the rest of this request's reads to the primary (e.g. before filling a shared cache)."""
+    if has_request_context():
+        g.db_replica = None
+
+
+def mark_write():
+    """
+    Record that this request wrote to the primary, for writes that don't go
+    through db.session (app/writes.py's batches): its reads and the client's
+    next few requests stay on the primary.
+    """
+    if has_request_context():
+        g.db_wrote = True
+        g.db_replica = None
+
+
+def sync_replicas():
+    """Copy the primary database into every replica file. Returns how many were refreshed."""
+    from app.models import db
+
+    engines = replicas(current_app)
+    source = sqlite3.connect(db.engines[None].url.database)
+    try:
+        for engine in engines:
+            target = sqlite3.connect(engine.url.database)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
+    return len(engines)
+
+
+def _make_engine(app, url):
+    # Relative SQLite paths are relative to the instance folder, as for the binds
+    url = make_url(url)
+    if url.database and url.database != ':memory:' and not os.path.isabs(url.database):
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return create_engine(url)
+
+
+def init_app(app):
+    """Create the replica engines and register the request hooks and sync task."""
+    urls = app.config['SQLALCHEMY_REPLICAS']
+    if not urls:
+        return
+
+    app.extensions['replicas'] = [_make_engine(app, url) for url in urls]
+
+    app.before_request(_choose_replica)
+    app.after_request(_remember_write)
+
+    from app.tasks import task
+
+    task('sync_replicas')(sync_replicas)
+    app.config['TASK_SCHEDULE'] = {
+        **app.config['TASK_SCHEDULE'],
+        'sync_replicas': app.config['REPLICA_SYNC_INTERVAL'],
+    }
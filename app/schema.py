@@ -0,0 +1,126 @@
+# app/schema.py
+"""
+Upgrades for tables that an older version of the models created.
+
+db.create_all() only adds missing tables. Columns added to a model since are
+added with ALTER TABLE ... ADD COLUMN (add_missing_columns). SQLite can't
+change a foreign key or AUTOINCREMENT in place: tables whose foreign keys
+lack the ON DELETE rule the models now declare, or whose AUTOINCREMENT
+differs from the model's, are rebuilt the way the SQLite manual describes: with foreign
+keys off and inside one transaction, create the new table under a temporary
+name, copy the rows, drop the old table, rename the new one and recreate its
+indexes. Run by init_db() (`flask init-db`) after create_all().
+"""
+import re
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+
+
+def add_missing_columns(engine, metadata):
+    """
+    Add the metadata's columns that existing tables lack, with their indexes
+    and server defaults. Returns the added columns as 'table.column'. SQLite
+    can only add a NOT NULL column that has a server default, and no
+    primary key or UNIQUE column.
+    """
+    inspector = inspect(engine)
+    added = []
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        missing = [column for column in table.columns if column.name not in existing]
+        if not missing:
+            continue
+        for column in missing:
+            if not column.nullable and column.server_default is None:
+                raise RuntimeError(f'Cannot add NOT NULL column {table.name}.{column.name} '
+                                   'without a server_default')
+        with engine.begin() as connection:
+            for column in missing:
+                ddl = str(CreateColumn(column).compile(dialect=engine.dialect))
+                connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {ddl}')
+                added.append(f'{table.name}.{column.name}')
+            for index in table.indexes:
+                if any(column in missing for column in index.columns):
+                    connection.execute(CreateIndex(index))
+    return added
+
+
+def _foreign_keys(cursor, name):
+    # (column, on_delete) pairs as SQLite reports them
+    return {(row[3], row[6].upper()) for row in cursor.execute(f'PRAGMA foreign_key_list("{name}")')}
+
+
+def _autoincrement(sql):
+    return re.search(r'\bAUTOINCREMENT\b', sql, re.IGNORECASE) is not None
+
+
+def outdated_tables(cursor, metadata):
+    """Existing tables whose foreign keys' ON DELETE rules or AUTOINCREMENT differ from the metadata."""
+    existing = dict(cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table'").fetchall())
+    return [
+        table for table in metadata.sorted_tables
+        if table.name in existing and (
+            _foreign_keys(cursor, table.name) != {
+                (fk.parent.name, (fk.ondelete or 'NO ACTION').upper()) for fk in table.foreign_keys}
+            or _autoincrement(existing[table.name]) != bool(table.dialect_options['sqlite']['autoincrement'])
+        )
+    ]
+
+
+def _rebuild(cursor, table, dialect):
+    name, temp = table.name, f'_new_{table.name}'
+    quote = dialect.identifier_preparer.quote
+    ddl = str(CreateTable(table).compile(dialect=dialect))
+    ddl = re.sub(rf'CREATE TABLE {re.escape(quote(name))} ', f'CREATE TABLE {quote(temp)} ', ddl, count=1)
+
+    old_columns = {row[1] for row in cursor.execute(f'PRAGMA table_info("{name}")')}
+    columns = ', '.join(quote(column.name) for column in table.columns if column.name in old_columns)
+    sequence = None
+    if table.dialect_options['sqlite']['autoincrement']:
+        # Ids are never reused; keep the high-water mark across the rebuild
+        sequence = cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (name,)).fetchone()
+
+    cursor.execute(ddl)
+    cursor.execute(f'INSERT INTO {quote(temp)} ({columns}) SELECT {columns} FROM {quote(name)}')
+    cursor.execute(f'DROP TABLE {quote(name)}')
+    cursor.execute(f'ALTER TABLE {quote(temp)} RENAME TO {quote(name)}')
+    for index in table.indexes:
+        cursor.execute(str(CreateIndex(index).compile(dialect=dialect)))
+    if sequence is not None:
+        cursor.execute('UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?', (sequence[0], name))
+
+
+def upgrade_foreign_keys(engine, metadata):
+    """Rebuild the outdated tables of one SQLite database. Returns the names of the tables rebuilt."""
+    if engine.dialect.name != 'sqlite':
+        return []
+    raw = engine.raw_connection()
+    connection = raw.driver_connection
+    isolation_level = connection.isolation_level
+    try:
+        cursor = connection.cursor()
+        outdated = outdated_tables(cursor, metadata)
+        if not outdated:
+            return []
+        if connection.in_transaction:
+            # PRAGMA foreign_keys is ignored inside a transaction, and DROP TABLE would then cascade
+            raise RuntimeError('Tables with outdated foreign keys must be rebuilt outside a transaction')
+        connection.isolation_level = None      # we issue BEGIN/COMMIT ourselves
+        cursor.execute('PRAGMA foreign_keys=OFF')
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            for table in outdated:
+                _rebuild(cursor, table, engine.dialect)
+            cursor.execute('COMMIT')
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+        finally:
+            cursor.execute('PRAGMA foreign_keys=ON')
+        return [table.name for table in outdated]
+    finally:
+        connection.isolation_level = isolation_level
+        raw.close()
@@ -0,0 +1,232 @@
+# app/sharding.py
+"""
+Per-course data shards.
+
+COURSE_SHARDS lists extra SQLite databases. Shard 0 is the primary database;
+shard n is COURSE_SHARDS[n - 1] (append to the list, never reorder it). A new
+course goes to the shard holding the fewest courses and stays there. Its
+sessions and everything hanging off them (SHARDED_TABLES: members, comments,
+waitlist, schedule entries, activity events) are stored in that shard, so
+write and read load spreads over files as courses are added. Sessions
+without a course stay in the primary.
+
+Users, courses and every other table live only in the primary. Each shard
+connection ATTACHes the primary, so a statement such as the session summary
+query (which joins user) runs unchanged inside a shard. Foreign keys from
+shard tables to user and course can't cross files and are not declared there.
+
+Routing: RoutingSession.get_bind() (app/routing.py) sends any statement on a
+sharded table to the current shard, g.db_shard. A request chooses it from
+its URL: a session id (each shard allocates session ids from its own range
+of SHARD_ID_SPAN, so the id says where the session lives) or a course code.
+Code that works on one course outside a request (tasks, CLI) wraps it in
+using_shard(). Views across courses, like a user's joined sessions, run the
+same query on every shard with fan_out() and merge the results.
+
+Without COURSE_SHARDS there is only shard 0 and nothing changes.
+"""
+import heapq
+import itertools
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import MetaData, event, func, select, text
+from sqlalchemy.sql.util import find_tables
+
+from app.models import db, Course
+from app.routing import _make_engine
+
+SHARDED_TABLES = frozenset([
+    'study_session', 'session_members', 'session_comment', 'session_waitlist',
+    'schedule_entry', 'activity_event',
+])
+# Ids (of sessions, comments, ...) allocated in shard n start above n * SHARD_ID_SPAN
+SHARD_ID_SPAN = 10 ** 9
+# Name of the attached primary database inside shard connections
+DIRECTORY = 'directory'
+
+
+def shards(app=None):
+    """The shard engines by number (1, 2, ...); empty when COURSE_SHARDS is not set."""
+    app = app or current_app._get_current_object()
+    return app.extensions.get('shards', {})
+
+
+def shard_numbers(app=None):
+    return [0, *shards(app)]
+
+
+def shard_of_session(session_id):
+    """The shard a session id was allocated in."""
+    number = session_id // SHARD_ID_SPAN
+    return number if number in shards() else 0
+
+
+def assign_shard():
+    """Shard for a new course: the one holding the fewest courses (the primary only without shards)."""
+    numbers = list(shards())
+    if not numbers:
+        return 0
+    counts = dict(db.session.execute(
+        select(Course.shard, func.count()).where(Course.shard.in_(numbers)).group_by(Course.shard)).all())
+    return min(numbers, key=lambda number: (counts.get(number, 0), number))
+
+
+def is_sharded(mapper=None, clause=None):
+    """True if the statement (or mapped class) touches a sharded table."""
+    if clause is not None:
+        if any(getattr(table, 'name', None) in SHARDED_TABLES for table in find_tables(clause, include_crud=True)):
+            return True
+    if mapper is not None:
+        return getattr(mapper, 'local_table', None) is not None and mapper.local_table.name in SHARDED_TABLES
+    return False
+
+
+def current_shard():
+    """Number of the shard sharded statements currently go to (0 = the primary)."""
+    return g.get('db_shard', 0) if has_app_context() else 0
+
+
+def current_engine():
+    """The engine of the current shard, or None for the primary."""
+    number = current_shard()
+    return shards().get(number) if number else None
+
+
+@contextmanager
+def using_shard(number):
+    """Run the block's sharded statements in the given shard."""
+    previous = g.get('db_shard', 0)
+    g.db_shard = number
+    try:
+        yield
+    finally:
+        g.db_shard = previous
+
+
+def use_shard(number):
+    """Send the rest of this request's course-data statements to a shard (like routing.use_primary())."""
+    g.db_shard = number
+
+
+def for_session(session_id):
+    """using_shard() for the shard holding a session."""
+    return using_shard(shard_of_session(session_id))
+
+
+def fan_out(func, *args, **kwargs):
+    """Call func(*args, **kwargs) once per shard; returns the results in shard order."""
+    results = []
+    for number in shard_numbers():
+        with using_shard(number):
+            results.append(func(*args, **kwargs))
+    return results
+
+
+def merged(query_factory, key=None):
+    """
+    Iterate over the rows of query_factory() (a query or result) from every
+    shard. With key, the shards' rows (each already sorted by key) are merged
+    into one sorted stream; without, they follow each other in shard order,
+    which is id order for ids allocated in the shards.
+    """
+    if not shards():
+        return iter(query_factory())
+    results = fan_out(lambda: _started(query_factory()))
+    return heapq.merge(*results, key=key) if key is not None else itertools.chain(*results)
+
+
+def _started(rows):
+    # Fetch the first row now, so the query runs while its shard is selected
+    # (a Query only executes when iteration starts)
+    rows = iter(rows)
+    first = next(rows, None)
+    return rows if first is None else itertools.chain([first], rows)
+
+
+def _choose_shard():
+    """before_request hook: route the request to the shard its session or course lives in."""
+    args = request.view_args or {}
+    if 'session_id' in args:
+        g.db_shard = shard_of_session(args['session_id'])
+    elif 'course_code' in args:
+        course = Course.query.filter_by(code=args['course_code']).first()
+        g.db_shard = course.shard if course is not None else 0
+    else:
+        g.db_shard = 0
+
+
+# ---------------------------------------------------------------------------
+# Shard databases
+# ---------------------------------------------------------------------------
+
+def shard_metadata():
+    """
+    The sharded tables as created in a shard: without the foreign keys that
+    would point outside it, and with AUTOINCREMENT ids so each shard can hand
+    out ids from its own range.
+    """
+    metadata = MetaData()
+    for table in db.metadata.sorted_tables:
+        if table.name not in SHARDED_TABLES:
+            continue
+        copy = table.to_metadata(metadata)
+        for constraint in list(copy.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.split('.')[0] not in SHARDED_TABLES:
+                copy.constraints.discard(constraint)
+                for element in constraint.elements:
+                    copy.foreign_keys.discard(element)
+                    element.parent.foreign_keys.discard(element)
+        if _id_column(copy) is not None:
+            copy.dialect_options['sqlite']['autoincrement'] = True
+    return metadata
+
+
+def _id_column(table):
+    columns = list(table.primary_key.columns)
+    return columns[0] if len(columns) == 1 and columns[0].name == 'id' else None
+
+
+def create_shards(app):
+    """Create the tables of every shard and start its ids in the shard's own range."""
+    from app.schema import add_missing_columns, upgrade_foreign_keys
+
+    if not shards(app):
+        return
+    metadata = shard_metadata()
+    for number, engine in shards(app).items():
+        metadata.create_all(engine)
+        add_missing_columns(engine, metadata)
+        upgrade_foreign_keys(engine, metadata)
+        with engine.begin() as connection:
+            for table in metadata.sorted_tables:
+                if _id_column(table) is None:
+                    continue
+                connection.execute(
+                    text("INSERT INTO sqlite_sequence (name, seq) SELECT :name, :start "
+                         "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"),
+                    {'name': table.name, 'start': number * SHARD_ID_SPAN})
+
+
+def _attach_primary(engine, path):
+    @event.listens_for(engine, 'connect')
+    def _attach(dbapi_connection, connection_record):
+        dbapi_connection.execute(f'ATTACH DATABASE ? AS {DIRECTORY}', (path,))
+
+
+def init_app(app):
+    """Create the shard engines and register the request hook."""
+    urls = app.config['COURSE_SHARDS']
+    if not urls:
+        return
+
+    primary = _make_engine(app, app.config['SQLALCHEMY_DATABASE_URI'])
+    path = primary.url.database
+    primary.dispose()
+    engines = {}
+    for number, url in enumerate(urls, start=1):
+        engines[number] = _make_engine(app, url)
+        _attach_primary(engines[number], path)
+    app.extensions['shards'] = engines
+
+    app.before_request(_choose_shard)
@@ -0,0 +1,282 @@
+# app/tasks.py
+"""
+Lightweight background task queue backed by a local SQLite table.
+
+Register a function with @task('name') and queue it with
+enqueue('name', *args, **kwargs). Arguments must be JSON-serializable (pass ids,
+not ORM objects). How queued work runs depends on TASK_QUEUE_MODE:
+
+- 'thread':   each web process starts TASK_WORKER_CONCURRENCY worker threads
+              on its first request
+- 'external': tasks only run in `flask run-worker` processes
+- 'eager':    the task runs inline inside enqueue() (used by the tests)
+
+Any number of threads and processes can work the same queue: a task is
+claimed with a single UPDATE ... RETURNING, so exactly one worker gets it.
+Failed tasks are retried with exponential backoff up to their max_attempts.
+"""
+import importlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+
+from app.models import db, Task
+
+logger = logging.getLogger(__name__)
+
+_tasks = Task.__table__
+
+# Registered task functions by name
+_registry = {}
+
+# Modules defining tasks, imported the first time a worker or enqueue() needs the
+# registry. The routes already import notifications and purge; archive is only
+# loaded from here, and listing all three keeps the registry complete on its own
+TASK_MODULES = ('app.notifications', 'app.main.archive', 'app.main.purge')
+
+
+def task(name, max_attempts=None):
+    """Register a function as a background task under the given name."""
+    def decorator(func):
+        func.task_name = name
+        func.max_attempts = max_attempts
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def load_task_modules():
+    for module in TASK_MODULES:
+        importlib.import_module(module)
+
+
+def _lookup(name):
+    if name not in _registry:
+        load_task_modules()
+    return _registry[name]
+
+
+def _engine():
+    return db.engines['tasks']
+
+
+def enqueue(name, *args, delay=None, run_at=None, dedupe_key=None, max_attempts=None, **kwargs):
+    """
+    Queue a registered task. Returns the task id, or None if the task ran
+    eagerly or a task with the same dedupe_key is already queued.
+    """
+    func = _lookup(name)
+    config = current_app.config
+
+    if config['TASK_QUEUE_MODE'] == 'eager':
+        func(*args, **kwargs)
+        return None
+
+    if run_at is None:
+        run_at = datetime.utcnow() + timedelta(seconds=delay or 0)
+    values = dict(
+        name=name,
+        payload=json.dumps([args, kwargs]),
+        dedupe_key=dedupe_key,
+        status='pending',
+        attempts=0,
+        max_attempts=max_attempts or func.max_attempts or config['TASK_MAX_ATTEMPTS'],
+        run_at=run_at,
+        created_at=datetime.utcnow(),
+    )
+    # Written on its own connection so it never joins the caller's transaction
+    with _engine().begin() as conn:
+        result = conn.execute(insert(_tasks).values(**values).on_conflict_do_nothing())
+        task_id = result.inserted_primary_key[0] if result.rowcount else None
+
+    if config['TASK_QUEUE_MODE'] == 'thread':
+        start_worker(current_app._get_current_object())
+    return task_id
+
+
+def enqueue_periodic(name, interval, now=None):
+    """
+    Queue a periodic task for the current interval slot. The slot is part of
+    the dedupe key, so however many workers call this only one task is queued.
+    """
+    now = now or datetime.utcnow()
+    slot = int(now.timestamp() // interval)
+    return enqueue(name, run_at=now, dedupe_key=f'{name}@{slot}')
+
+
+@task('purge_finished_tasks')
+def purge_finished(older_than=None):
+    """Delete done/failed tasks that finished before the cutoff (default: TASK_RETENTION_DAYS ago)."""
+    if older_than is None:
+        older_than = timedelta(days=current_app.config['TASK_RETENTION_DAYS'])
+    cutoff = datetime.utcnow() - older_than
+    with _engine().begin() as conn:
+        return conn.execute(
+            delete(_tasks).where(_tasks.c.status.in_(('done', 'failed')), _tasks.c.finished_at < cutoff)
+        ).rowcount
+
+
+class Worker:
+    """
+    Runs queued tasks on a pool of threads. Use run_until_empty() for a
+    one-shot drain, or start() to keep polling in daemon threads.
+    """
+
+    def __init__(self, app, concurrency=None, poll_interval=None):
+        self.app = app
+        self.concurrency = concurrency or app.config['TASK_WORKER_CONCURRENCY']
+        self.poll_interval = poll_interval or app.config['TASK_POLL_INTERVAL']
+        self.name = f'{socket.gethostname()}:{os.getpid()}:{id(self):x}'
+        self._stop = threading.Event()
+        self._threads = []
+        self._periodic_slots = {}
+        load_task_modules()
+
+    # -- claiming and running -------------------------------------------------
+
+    def claim(self, now=None):
+        """Atomically take the next due task (or a crashed worker's task)."""
+        now = now or datetime.utcnow()
+        stale = now - timedelta(seconds=self.app.config['TASK_LOCK_TIMEOUT'])
+        next_id = (
+            select(_tasks.c.id)
+            .where(
+                _tasks.c.run_at <= now,
+                or_(
+                    _tasks.c.status == 'pending',
+                    and_(_tasks.c.status == 'running', _tasks.c.locked_at < stale),
+                ),
+            )
+            .order_by(_tasks.c.run_at, _tasks.c.id)
+            .limit(1)
+            .scalar_subquery()
+        )
+        with self.app.app_context(), _engine().begin() as conn:
+            return conn.execute(
+                update(_tasks)
+                .where(_tasks.c.id == next_id)
+                .values(
+                    status='running',
+                    locked_by=self.name,
+                    locked_at=now,
+                    attempts=_tasks.c.attempts + 1,
+                )
+                .returning(_tasks)
+            ).first()
+
+    def execute(self, row):
+        """Run a claimed task and record the outcome."""
+        values = {'locked_by': None, 'locked_at': None}
+        try:
+            func = _lookup(row.name)
+            args, kwargs = json.loads(row.payload)
+            with self.app.app_context():
+                func(*args, **kwargs)
+        except Exception:
+            error = traceback.format_exc()
+            logger.warning('Task %s (%s) failed on attempt %s', row.id, row.name, row.attempts)
+            values['last_error'] = error
+            if row.attempts < row.max_attempts:
+                backoff = self.app.config['TASK_RETRY_BACKOFF'] * 2 ** (row.attempts - 1)
+                values.update(status='pending', run_at=datetime.utcnow() + timedelta(seconds=backoff))
+            else:
+                values.update(status='failed', finished_at=datetime.utcnow())
+        else:
+            values.update(status='done', finished_at=datetime.utcnow())
+
+        with self.app.app_context(), _engine().begin() as conn:
+            conn.execute(update(_tasks).where(_tasks.c.id == row.id).values(**values))
+        return values['status']
+
+    def run_once(self):
+        """Claim and run one task. Returns False if nothing was due."""
+        row = self.claim()
+        if row is None:
+            return False
+        self.execute(row)
+        return True
+
+    def run_until_empty(self):
+        """Run due tasks until the queue is drained. Returns how many ran."""
+        ran = 0
+        while self.run_once():
+            ran += 1
+        return ran
+
+    # -- periodic tasks and thread pool ---------------------------------------
+
+    def schedule_periodic(self, now=None):
+        """Queue any periodic tasks from TASK_SCHEDULE whose slot has started."""
+        now = now or datetime.utcnow()
+        with self.app.app_context():
+            for name, interval in self.app.config['TASK_SCHEDULE'].items():
+                slot = int(now.timestamp() // interval)
+                if name in _registry and self._periodic_slots.get(name) != slot:
+                    enqueue_periodic(name, interval, now)
+                    self._periodic_slots[name] = slot
+
+    def _loop(self, schedules):
+        while not self._stop.is_set():
+            try:
+                if schedules:
+                    self.schedule_periodic()
+                if not self.run_once():
+                    self._stop.wait(self.poll_interval)
+            except Exception:
+                logger.exception('Task worker %s hit an error', self.name)
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """Start the worker threads (daemonized, so they never block shutdown)."""
+        for i in range(self.concurrency):
+            # Only one thread per worker needs to look after periodic tasks
+            thread = threading.Thread(
+                target=self._loop, args=(i == 0,), name=f'task-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_forever(self):
+        """Block the calling thread while the workers run (used by the CLI)."""
+        self.start()
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            self.stop()
+
+
+# One in-process worker per (app, process); recreated after a fork
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def start_worker(app):
+    """Start the in-process worker for this app if it isn't running yet."""
+    key = (id(app), os.getpid())
+    with _workers_lock:
+        if key not in _workers:
+            _workers[key] = Worker(app).start()
+        return _workers[key]
+
+
+def init_app(app):
+    """In 'thread' mode, make sure every web process runs its worker threads."""
+    @app.before_request
+    def _ensure_worker():
+        if app.config['TASK_QUEUE_MODE'] == 'thread':
+            start_worker(app)
@@ -0,0 +1,169 @@
+# app/writes.py
+"""
+Group commit for small, frequent writes (joining a session, posting a comment).
+
+At the start of a class period hundreds of these arrive at once. Committed one
+by one, each pays for its own transaction, fsync and turn at SQLite's single
+writer lock. With WRITE_BATCHING on, a request hands its write to the
+process's writer thread instead and waits for the result. The writer collects
+whatever arrives within WRITE_BATCH_WINDOW seconds of the first write (at most
+WRITE_BATCH_MAX of them) and runs them in one transaction with one commit.
+
+- Writes run in the order they were submitted, so one user's writes are
+  applied in the order that user made them.
+- Each write runs in its own SAVEPOINT. If it raises, only that write is
+  rolled back, and its request gets the exception as if it had run the write
+  itself.
+- A request only returns after the batch holding its write has committed. If
+  the commit fails, every request in the batch gets the error. Nothing is
+  acknowledged that isn't durable.
+
+A write is a function taking an `executor` keyword (see app/main/membership.py)
+and is run with run(func, *args). With WRITE_BATCHING off (the default), run()
+calls it with db.session and commits, exactly as the views used to. Writes
+to a course shard (see app/sharding.py) are never batched.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+from sqlalchemy import create_engine, event
+
+from app import routing, sharding
+from app.models import db
+
+_STOP = object()
+
+
+class Batcher:
+    """The writer thread of one process and the queue feeding it."""
+
+    def __init__(self, app, window=0.005, max_batch=200):
+        self.app = app
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._engine = None
+
+    def _writer_engine(self):
+        # A private engine whose transactions start with BEGIN IMMEDIATE, so
+        # SAVEPOINTs nest inside them (pysqlite would otherwise commit at the
+        # first RELEASE) and the write lock is taken up front
+        with self.app.app_context():
+            url = db.engine.url
+        engine = create_engine(url)
+
+        @event.listens_for(engine, 'connect')
+        def _connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, 'begin')
+        def _begin(connection):
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+        return engine
+
+    def _ensure_started(self):
+        # One writer per process, restarted in forked workers
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._engine = self._writer_engine()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='write-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        """Queue func(*args, executor=<connection>, **kwargs); return its result once committed."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((func, args, kwargs, future))
+        return future.result()
+
+    def stop(self):
+        """Finish the queued writes and stop the writer thread."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._engine.dispose()
+        self._thread = None
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                first = self._queue.get()
+                if first is _STOP:
+                    return
+                batch = [first]
+                deadline = time.monotonic() + self.window
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        self._queue.put(_STOP)   # stop after this batch
+                        break
+                    batch.append(item)
+                self._commit(batch)
+
+    def _commit(self, batch):
+        outcomes = []
+        try:
+            with self._engine.begin() as connection:
+                for func, args, kwargs, future in batch:
+                    try:
+                        with connection.begin_nested():
+                            outcomes.append((future, func(*args, executor=connection, **kwargs), None))
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+        except BaseException as exc:
+            # The commit itself failed: none of the batch was written
+            for _, _, _, future in batch:
+                future.set_exception(exc)
+            return
+        self.batches += 1
+        self.writes += len(batch)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+def get_batcher(app=None):
+    """The app's Batcher, created on first use."""
+    app = app or current_app._get_current_object()
+    batcher = app.extensions.get('write_batcher')
+    if batcher is None:
+        batcher = app.extensions.setdefault('write_batcher', Batcher(
+            app, window=app.config['WRITE_BATCH_WINDOW'], max_batch=app.config['WRITE_BATCH_MAX']))
+    return batcher
+
+
+def run(func, *args, **kwargs):
+    """
+    Run a write and commit it: func(*args, executor=..., **kwargs).
+    Batched with other requests' writes when WRITE_BATCHING is on.
+    """
+    app = current_app._get_current_object()
+    # The writer thread writes to the primary; a course shard's writes commit directly
+    if not app.config['WRITE_BATCHING'] or sharding.current_engine() is not None:
+        result = func(*args, executor=db.session, **kwargs)
+        db.session.commit()
+        return result
+    # End this request's own transaction so it holds no lock while it waits
+    db.session.commit()
+    # The writer's engine bypasses RoutingSession, so keep the client on the primary here
+    routing.mark_write()
+    return get_batcher(app).submit(func, *args, **kwargs)
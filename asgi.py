@@ -0,0 +1,4 @@
+# ASGI entry point: uvicorn asgi:app (see app/asgi.py)
+from app.asgi import create_asgi_app
+
+app = create_asgi_app()
@@ -0,0 +1,118 @@
+"""
+Analytics benchmark: per-topic stats through the ORM vs the columnar report.
+
+    python benchmarks/analytics.py [--sessions 5000] [--members 8] [--comments 3]
+
+Builds a throwaway database with --sessions sessions (spread over a semester,
+8 topics and 12 locations), --members members and --comments comments each,
+then computes per-topic session, participant and comment counts:
+
+- orm      - loading every StudySession and calling get_participant_count()
+             and len(session.comments) on it, as a view would
+- columnar - app.main.analytics: bulk column loads and NumPy group-bys
+             (first a full load, then an incremental refresh after one new session)
+
+Needs the packages in requirements-analytics.txt.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy  # noqa: E402
+
+from app import create_app, init_db  # noqa: E402
+from app.main import analytics  # noqa: E402
+from app.models import db, session_members, SessionComment, StudySession, User  # noqa: E402
+
+TOPICS = ['Calculus', 'Physics', 'Chemistry', 'Biology', 'History', 'Economics', 'Statistics', 'Algorithms']
+
+
+def populate(sessions, members, comments):
+    rng = random.Random(42)
+    users = [{'id': i + 1, 'username': f'user{i}', 'email': f'user{i}@example.com', 'schedule_version': 0}
+             for i in range(max(members * 4, 50))]
+    db.session.execute(User.__table__.insert(), users)
+    start = datetime(2026, 9, 1, 10, 0)
+    rows, member_rows, comment_rows = [], [], []
+    for i in range(1, sessions + 1):
+        rows.append({
+            'id': i, 'title': f'Session {i}', 'date': start + timedelta(days=rng.randrange(120)),
+            'time': '3:00 PM', 'location': f'Room {rng.randrange(12)}', 'topic': rng.choice(TOPICS),
+            'creator_id': rng.randrange(len(users)) + 1, 'created_at': start, 'is_recurring': False,
+            'capacity': rng.choice([None, 10, 20]),
+        })
+        for user_id in rng.sample(range(1, len(users) + 1), rng.randrange(members * 2 + 1)):
+            member_rows.append({'session_id': i, 'user_id': user_id})
+        for _ in range(rng.randrange(comments * 2 + 1)):
+            comment_rows.append({'session_id': i, 'user_id': 1, 'content': 'note', 'timestamp': start})
+    db.session.execute(StudySession.__table__.insert(), rows)
+    db.session.execute(session_members.insert(), member_rows)
+    db.session.execute(SessionComment.__table__.insert(), comment_rows)
+    db.session.commit()
+    return len(member_rows), len(comment_rows)
+
+
+def orm_stats():
+    stats = defaultdict(lambda: [0, 0, 0])
+    for session in StudySession.query.all():
+        row = stats[session.topic]
+        row[0] += 1
+        row[1] += session.get_participant_count()
+        row[2] += len(session.comments)
+    return dict(stats)
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=5000)
+    parser.add_argument('--members', type=int, default=8)
+    parser.add_argument('--comments', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/main.db',
+            'SQLALCHEMY_BINDS': {'archive': f'sqlite:///{tmp}/archive.db', 'tasks': f'sqlite:///{tmp}/tasks.db'},
+            'TEMPLATE_CACHE_DIR': os.path.join(tmp, 'jinja_cache'),
+            'CACHE_L2_PATH': os.path.join(tmp, 'cache.sqlite3'),
+            'IDEMPOTENCY_STORE_PATH': os.path.join(tmp, 'idempotency.sqlite3'),
+        })
+        init_db(app)
+        with app.app_context():
+            memberships, comments = populate(args.sessions, args.members, args.comments)
+            print(f'{args.sessions} sessions, {memberships} memberships, {comments} comments')
+
+            expected, seconds = timed(orm_stats)
+            print(f'  orm          {seconds * 1000:9.1f} ms')
+            db.session.remove()
+
+            dataset = analytics.Dataset(numpy)
+            report, seconds = timed(lambda: (dataset.refresh(3600), analytics.compute_report(dataset))[1])
+            print(f'  columnar     {seconds * 1000:9.1f} ms  (full load)')
+            got = {row['name']: [row['sessions'], row['participants'], row['comments']]
+                   for row in report['by_topic']}
+            assert got == expected, 'columnar report disagrees with the ORM'
+
+            db.session.add(StudySession(title='One more', date=datetime(2026, 12, 1), time='1:00 PM',
+                                        location='Room 1', topic='Calculus', creator_id=1))
+            db.session.commit()
+            _, seconds = timed(lambda: (dataset.refresh(3600), analytics.compute_report(dataset)))
+            print(f'  columnar     {seconds * 1000:9.1f} ms  (incremental refresh)')
+
+
+if __name__ == '__main__':
+    main()
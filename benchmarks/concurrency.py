@@ -0,0 +1,114 @@
+"""
+Concurrency benchmark: long-polling the comment fragment on WSGI threads vs the ASGI mode.
+
+    python benchmarks/concurrency.py [--clients 200] [--wait 1.0] [--threads 16]
+
+Builds a throwaway database with one session and sends --clients concurrent
+GET /session/<id>/comments/fragment?wait=<--wait> requests. Nobody posts a
+comment, so every request waits the full --wait seconds, like a page left
+open. The requests run in-process through:
+
+- wsgi   - the Flask view behind asgiref's WsgiToAsgi, with --threads worker
+           threads (a threaded WSGI server: each waiting request holds a thread)
+- asgi   - the native coroutine in app/asgi.py (a waiting request holds no thread)
+
+For each it reports the wall time, the requests per second and the slowest
+response. Needs the packages in requirements-asgi.txt.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import create_app, init_db  # noqa: E402
+from app.asgi import AsgiApp  # noqa: E402
+from app.models import db, StudySession, User  # noqa: E402
+
+
+def populate():
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    session = StudySession(title='Benchmark', date=datetime.utcnow() + timedelta(days=1),
+                           time='3:00 PM', location='Library', creator_id=user.id)
+    db.session.add(session)
+    db.session.commit()
+    return session.id
+
+
+async def request(app, path, query, cookie):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'root_path': '', 'query_string': query.encode(),
+        'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 1234),
+    }
+    status = None
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    return status, time.perf_counter() - started
+
+
+async def run(app, clients, path, query, cookie, threads):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(threads))
+    started = time.perf_counter()
+    results = await asyncio.gather(*(request(app, path, query, cookie) for _ in range(clients)))
+    return time.perf_counter() - started, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--wait', type=float, default=1.0)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        flask_app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/main.db',
+            'SQLALCHEMY_BINDS': {'archive': f'sqlite:///{tmp}/archive.db', 'tasks': f'sqlite:///{tmp}/tasks.db'},
+            'TEMPLATE_CACHE_DIR': os.path.join(tmp, 'jinja_cache'),
+            'CACHE_L2_PATH': os.path.join(tmp, 'cache.sqlite3'),
+            'IDEMPOTENCY_STORE_PATH': os.path.join(tmp, 'idempotency.sqlite3'),
+            'WTF_CSRF_ENABLED': False,
+            'COMMENT_POLL_INTERVAL': 0.1,
+            'COMMENT_POLL_WSGI_MAX_WAIT': args.wait,   # long polls are off in the Flask view by default
+        })
+        init_db(flask_app)
+        with flask_app.app_context():
+            session_id = populate()
+        client = flask_app.test_client()
+        client.post('/auth/login', data={'email': 'bench@example.com', 'password': 'password'})
+        cookie = f"session={client.get_cookie('session').value}"
+
+        asgi_app = AsgiApp(flask_app)
+        path, query = f'/session/{session_id}/comments/fragment', f'wait={args.wait}'
+        print(f'{args.clients} concurrent long polls, wait={args.wait}s, {args.threads} WSGI threads')
+        for label, app in (('wsgi', asgi_app.wsgi), ('asgi', asgi_app)):
+            seconds, results = asyncio.run(run(app, args.clients, path, query, cookie, args.threads))
+            statuses = {status for status, _ in results}
+            slowest = max(elapsed for _, elapsed in results)
+            print(f'  {label:<5} {seconds:7.2f} s  {args.clients / seconds:8.1f} req/s  '
+                  f'slowest {slowest:6.2f} s  status {sorted(statuses)}')
+        asyncio.run(asgi_app.dispose())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Listing benchmark: ORM StudySession instances vs SessionSummary read models.
+
+    python benchmarks/listing.py [--rows 10000] [--repeat 3]
+
+Builds a throwaway database with --rows sessions (three members each) and
+loads the whole listing three ways:
+
+- orm + card fields  - StudySession objects plus what the old template read per card
+                       (creator.username, get_participant_count(), is_past(), is_full())
+- orm objects only   - just hydrating StudySession instances
+- summaries          - summaries.load_summaries(), one column-only query
+
+For each it reports the best time and the memory allocated while loading (tracemalloc).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import create_app, init_db  # noqa: E402
+from app.main import summaries  # noqa: E402
+from app.models import db, session_members, StudySession, User  # noqa: E402
+
+
+def populate(rows):
+    users = [{'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x'} for i in range(200)]
+    db.session.execute(insert(User), users)
+    start = datetime.utcnow() - timedelta(days=rows // 100)
+    db.session.execute(insert(StudySession), [
+        {'title': f'Session {i}', 'date': start + timedelta(hours=i), 'time': '3:00 PM',
+         'location': 'Library', 'topic': 'Algebra', 'creator_id': i % 200 + 1,
+         'capacity': 5 if i % 3 == 0 else None, 'created_at': start}
+        for i in range(rows)
+    ])
+    db.session.execute(insert(session_members), [
+        {'user_id': (i + k) % 200 + 1, 'session_id': i + 1}
+        for i in range(rows) for k in range(3)
+    ])
+    db.session.commit()
+
+
+def orm_with_card_fields():
+    sessions = StudySession.query.all()
+    for s in sessions:
+        s.creator.username, s.get_participant_count(), s.is_past(), s.is_full()
+    return sessions
+
+
+def orm_objects_only():
+    return StudySession.query.all()
+
+
+def summary_objects():
+    return summaries.load_summaries(summaries.summary_query(user_id=1))
+
+
+def measure(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/main.db',
+            'SQLALCHEMY_BINDS': {'archive': f'sqlite:///{tmp}/archive.db', 'tasks': f'sqlite:///{tmp}/tasks.db'},
+            'TEMPLATE_CACHE_DIR': os.path.join(tmp, 'jinja_cache'),
+            'CACHE_L2_PATH': os.path.join(tmp, 'cache.sqlite3'),
+            'IDEMPOTENCY_STORE_PATH': os.path.join(tmp, 'idempotency.sqlite3'),
+        })
+        init_db(app)
+        with app.app_context():
+            populate(args.rows)
+            print(f'{args.rows} sessions')
+            for label, func, repeat in (
+                ('orm + card fields', orm_with_card_fields, 1),
+                ('orm objects only', orm_objects_only, args.repeat),
+                ('summaries', summary_objects, args.repeat),
+            ):
+                seconds, peak = measure(func, repeat)
+                print(f'  {label:<18} {seconds * 1000:9.1f} ms  {peak / 1024 / 1024:7.1f} MiB '
+                      f'({peak / args.rows:6.0f} B/row)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Startup benchmark: time from process start to the first served request.
+
+    python benchmarks/startup.py               # both, and how much faster a forked worker is
+    python benchmarks/startup.py --cold        # cold processes only (python run.py / flask run)
+    python benchmarks/startup.py --preload     # workers forked from a preloaded parent only (gunicorn --preload)
+    python benchmarks/startup.py --profile     # import-time report (python -X importtime)
+
+A cold process spends most of its startup importing Flask and SQLAlchemy,
+which no change to the app can avoid; only forking from a preloaded parent
+makes a worker start several times faster.
+
+Each run uses throwaway databases and template cache in a temp directory,
+so it never touches instance/.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter; prints its own phase timings as JSON
+CHILD = """
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+status = app.test_client().get(%(path)r).status_code
+served = time.perf_counter()
+print(json.dumps({'import': imported - start, 'create_app': created - imported,
+                  'first_request': served - created, 'status': status}))
+"""
+
+
+def _environment(tmp):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': f'sqlite:///{tmp}/main.db',
+        'ARCHIVE_DATABASE_URL': f'sqlite:///{tmp}/archive.db',
+        'TASKS_DATABASE_URL': f'sqlite:///{tmp}/tasks.db',
+        'TEMPLATE_CACHE_DIR': os.path.join(tmp, 'jinja_cache'),
+        'CACHE_L2_PATH': os.path.join(tmp, 'cache.sqlite3'),
+        'IDEMPOTENCY_STORE_PATH': os.path.join(tmp, 'idempotency.sqlite3'),
+        'TASK_QUEUE_MODE': 'external',
+        'PYTHONPATH': ROOT,
+    })
+    return env
+
+
+def _prepare(env):
+    """Create the schema and warm the template cache, as a deploy would."""
+    subprocess.run(
+        [sys.executable, '-m', 'flask', '--app', 'run.py', 'init-db'],
+        cwd=ROOT, env=env, check=True, capture_output=True)
+    subprocess.run(
+        [sys.executable, '-m', 'flask', '--app', 'run.py', 'compile-templates'],
+        cwd=ROOT, env=env, check=True, capture_output=True)
+
+
+def cold(env, runs, path):
+    totals, phases = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, '-c', CHILD % {'path': path}],
+            cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+        totals.append(time.perf_counter() - started)
+        phases.append(json.loads(out.strip().splitlines()[-1]))
+    return totals, phases
+
+
+def preload(env, runs, path):
+    """Import and build the app once, then time forked workers serving their first request."""
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    from app import create_app
+
+    app = create_app()
+    totals = []
+    for _ in range(runs):
+        read_fd, write_fd = os.pipe()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            status = app.test_client().get(path).status_code
+            os.write(write_fd, str(status).encode())
+            os._exit(0)
+        os.close(write_fd)
+        os.read(read_fd, 16)
+        totals.append(time.perf_counter() - started)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+    return totals
+
+
+def profile(env, limit):
+    """Print the slowest imports, by self time and for the app's own modules."""
+    err = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(own), int(cumulative), name.strip()))
+
+    print(f'{"self ms":>8} {"total ms":>9}  module')
+    for own, cumulative, name in sorted(rows, reverse=True)[:limit]:
+        print(f'{own / 1000:8.1f} {cumulative / 1000:9.1f}  {name}')
+    print('\napp modules:')
+    for own, cumulative, name in rows:
+        if name == 'app' or name.startswith('app.'):
+            print(f'{own / 1000:8.1f} {cumulative / 1000:9.1f}  {name}')
+
+
+def _ms(values):
+    return f'median {statistics.median(values) * 1000:7.1f} ms   min {min(values) * 1000:7.1f} ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/', help='URL of the first request')
+    parser.add_argument('--cold', action='store_true', help='time cold processes only')
+    parser.add_argument('--preload', action='store_true', help='time forked workers only')
+    parser.add_argument('--profile', action='store_true', help='print an import-time report')
+    parser.add_argument('--top', type=int, default=15, help='rows in the import-time report')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = _environment(tmp)
+        _prepare(env)
+
+        if args.profile:
+            profile(env, args.top)
+            return
+        if not args.preload:
+            totals, phases = cold(env, args.runs, args.path)
+            print(f'process start -> first response   {_ms(totals)}')
+            for phase in ('import', 'create_app', 'first_request'):
+                print(f'  {phase:<31} {_ms([p[phase] for p in phases])}')
+        if not args.cold:
+            forked = preload(env, args.runs, args.path)
+            print(f'forked worker -> first response   {_ms(forked)}')
+            if not args.preload:
+                print(f'  forked / cold                   {statistics.median(totals) / statistics.median(forked):7.1f}x faster')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Write benchmark: commit per request vs group commit (WRITE_BATCHING).
+
+    python benchmarks/writes.py [--users 400] [--threads 64] [--comments 2]
+
+Builds a throwaway database with --users students and a few sessions, then
+simulates the start of a class period: every student joins a session and
+posts --comments comments, from --threads concurrent request threads. Each
+write goes through app.writes.run(), as the join and comment views do:
+
+- commit   - WRITE_BATCHING off: every write is its own transaction and commit
+- batched  - WRITE_BATCHING on: writes are grouped into shared commits
+
+For each it reports the wall time, writes per second, the slowest write,
+failed writes (e.g. "database is locked") and, when batched, the number of
+commits.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import create_app, init_db, writes  # noqa: E402
+from app.main import commenting, membership  # noqa: E402
+from app.models import db, StudySession, User  # noqa: E402
+
+
+def populate(users, sessions=8):
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'student{i}', 'email': f'student{i}@example.com', 'schedule_version': 0}
+        for i in range(1, users + 1)
+    ])
+    db.session.execute(StudySession.__table__.insert(), [
+        {'id': i, 'title': f'Lecture {i}', 'date': datetime.utcnow() + timedelta(days=1), 'time': '9:00 AM',
+         'location': 'Hall A', 'creator_id': 1, 'created_at': datetime.utcnow(), 'is_recurring': False}
+        for i in range(1, sessions + 1)
+    ])
+    db.session.commit()
+    return sessions
+
+
+def student(app, user_id, session_id, comments):
+    latencies, failures = [], 0
+    calls = [(membership.join_session, (session_id, user_id))]
+    calls += [(commenting.add_comment, (session_id, user_id, f'question {i}')) for i in range(comments)]
+    with app.app_context():
+        for func, args in calls:
+            started = time.perf_counter()
+            try:
+                writes.run(func, *args)
+            except Exception:
+                failures += 1
+                db.session.rollback()
+            latencies.append(time.perf_counter() - started)
+        db.session.remove()
+    return latencies, failures
+
+
+def run(app, users, sessions, threads, comments):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(
+            lambda uid: student(app, uid, uid % sessions + 1, comments), range(1, users + 1)))
+    seconds = time.perf_counter() - started
+    latencies = [latency for result in results for latency in result[0]]
+    return seconds, len(latencies), max(latencies), sum(result[1] for result in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--comments', type=int, default=2)
+    args = parser.parse_args()
+
+    print(f'{args.users} students x {1 + args.comments} writes, {args.threads} request threads')
+    for label, batching in (('commit', False), ('batched', True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({
+                'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/main.db',
+                'SQLALCHEMY_BINDS': {'archive': f'sqlite:///{tmp}/archive.db', 'tasks': f'sqlite:///{tmp}/tasks.db'},
+                'TEMPLATE_CACHE_DIR': os.path.join(tmp, 'jinja_cache'),
+                'CACHE_L2_PATH': os.path.join(tmp, 'cache.sqlite3'),
+                'IDEMPOTENCY_STORE_PATH': os.path.join(tmp, 'idempotency.sqlite3'),
+                'WRITE_BATCHING': batching,
+            })
+            init_db(app)
+            with app.app_context():
+                sessions = populate(args.users)
+            seconds, count, slowest, failed = run(app, args.users, sessions, args.threads, args.comments)
+            commits = ''
+            if batching:
+                batcher = writes.get_batcher(app)
+                commits = f'  {batcher.batches} commits'
+                batcher.stop()
+            print(f'  {label:<8} {seconds:7.2f} s  {count / seconds:8.1f} writes/s  '
+                  f'slowest {slowest * 1000:7.1f} ms  failed {failed}{commits}')
+            with app.app_context():
+                for engine in db.engines.values():
+                    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
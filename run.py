@@ -1,7 +1,7 @@
-from app import create_app
+from app import create_app, init_db
 
 app = create_app()
 
 if __name__ == '__main__':
+    init_db(app)
     app.run(debug=True)
- 
\ No newline at end of file
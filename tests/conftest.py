@@ -1,35 +1,111 @@
 # tests/conftest.py
 import os
+import shutil
 from datetime import datetime, timedelta
 
 import pytest
+from sqlalchemy import event
 
-from app import create_app
+from app import create_app, init_db
 from app.models import db as _db, User, StudySession
 
+DATABASES = {None: "main.db", "archive": "archive.db", "tasks": "tasks.db"}
 
-@pytest.fixture
-def app(tmp_path):
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "live_db: run against a private copy of the database that really commits "
+        "(for tests that use threads or the task queue tables)",
+    )
+
+
+def _test_config(db_dir, cache_dir, state_dir):
+    uris = {key: f"sqlite:///{db_dir / name}" for key, name in DATABASES.items()}
+    return {
+        "TESTING": True,
+        "WTF_CSRF_ENABLED": False,  # so form tests are simple
+        "TASK_QUEUE_MODE": "eager",
+        "SQLALCHEMY_DATABASE_URI": uris.pop(None),
+        "SQLALCHEMY_BINDS": uris,
+        "TEMPLATE_CACHE_DIR": str(cache_dir),
+        "NOTIFICATION_MAILDIR": str(db_dir / "maildir"),
+        # Rolled-back tests reuse ids, so each test gets its own cache and idempotency store
+        "CACHE_L2_PATH": str(state_dir / "cache.sqlite3"),
+        "IDEMPOTENCY_STORE_PATH": str(state_dir / "idempotency.sqlite3"),
+    }
+
+
+@pytest.fixture(scope="session")
+def template_db(tmp_path_factory):
     """
-    Create a new app instance for each test with:
-    - TESTING mode on
-    - CSRF disabled (so form tests are simple)
-    - SQLite test DB in a temp folder
+    Build the schema once per test run. Under pytest-xdist every worker has
+    its own temp directory, so each worker gets its own database files.
     """
-    test_db_path = tmp_path / "test.db"
-    os.environ["DATABASE_URL"] = f"sqlite:///{test_db_path}"
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "main")
+    root = tmp_path_factory.mktemp(f"db-{worker}")
+    db_dir = root / "template"
+    db_dir.mkdir()
+    init_db(create_app(_test_config(db_dir, root / "jinja_cache", root)))
+    return root
 
-    app = create_app()
-    app.config.update(
-        TESTING=True,
-        WTF_CSRF_ENABLED=False,
-    )
 
+def _use_savepoints(engine):
+    # pysqlite only starts transactions before DML on its own; take over so
+    # SAVEPOINT and DDL behave (see the SQLAlchemy pysqlite dialect docs)
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+
+@pytest.fixture
+def app(request, template_db, tmp_path):
+    """
+    A new app instance for each test, with TESTING on and CSRF disabled.
+
+    By default the test shares the template database: db.session is joined
+    to one transaction per database that is rolled back afterwards, and its
+    commits only release savepoints. Code that uses the engines directly
+    (DDL, the task queue tables) would write to the shared files; tests of it
+    are marked `live_db`, which gives them a private copy of the template
+    files that commits for real.
+    """
+    if request.node.get_closest_marker("live_db"):
+        db_dir = tmp_path / "db"
+        shutil.copytree(template_db / "template", db_dir)
+        app = create_app(_test_config(db_dir, template_db / "jinja_cache", tmp_path))
+        with app.app_context():
+            yield app
+            _db.session.remove()
+        return
+
+    app = create_app(_test_config(template_db / "template", template_db / "jinja_cache", tmp_path))
     with app.app_context():
-        _db.create_all()
-        yield app
-        _db.session.remove()
-        _db.drop_all()
+        connections, transactions = {}, []
+        for key, engine in _db.engines.items():
+            _use_savepoints(engine)
+            connections[key] = engine.connect()
+            transactions.append(connections[key].begin())
+        # SQLAlchemy's "join a session into an external transaction" recipe, with
+        # one connection per bind: the session's commits only release savepoints
+        binds = {table: connections[key] for key, metadata in _db.metadatas.items() if key is not None
+                 for table in metadata.tables.values()}
+        _db.session.configure(bind=connections[None], binds=binds, join_transaction_mode="create_savepoint")
+        try:
+            yield app
+        finally:
+            _db.session.remove()
+            _db.session.configure(bind=None, binds=None, join_transaction_mode="conditional_savepoint")
+            for transaction in transactions:
+                transaction.rollback()
+            for connection in connections.values():
+                connection.close()
+            for engine in _db.engines.values():
+                engine.dispose()
 
 
 @pytest.fixture
@@ -83,3 +159,49 @@ def future_session(app, user):
     _db.session.add(session)
     _db.session.commit()
     return session
+
+
+@pytest.fixture
+def make_users(app):
+    """
+    Factory for more users: make_users("bob", "ann") adds and commits users
+    named bob and ann (emails bob@example.com, ...) in one commit and returns
+    them. Extra keyword arguments become columns of every user.
+    """
+    def make(*names, **fields):
+        users = [User(username=name, email=f"{name}@example.com", **fields) for name in names]
+        _db.session.add_all(users)
+        _db.session.commit()
+        return users
+    return make
+
+
+@pytest.fixture
+def make_user(make_users):
+    """Factory for one more user: make_user("bob") is make_users("bob")[0]."""
+    return lambda name, **fields: make_users(name, **fields)[0]
+
+
+@pytest.fixture
+def make_session(app):
+    """
+    Factory for sessions: make_session(creator_id, title, days=1, members=(), **fields)
+    adds and commits a StudySession `days` from now (negative for past ones)
+    in the Library at 3:00 PM, then joins each user id in `members`. Extra
+    keyword arguments (time, location, topic, capacity, ...) become columns.
+    """
+    from app.main import membership
+
+    def make(creator_id, title="Study Session", days=1, members=(), **fields):
+        fields.setdefault("time", "3:00 PM")
+        fields.setdefault("location", "Library")
+        session = StudySession(
+            title=title, date=datetime.utcnow() + timedelta(days=days), creator_id=creator_id, **fields)
+        _db.session.add(session)
+        _db.session.commit()
+        for user_id in members:
+            membership.join_session(session.id, user_id)
+        if members:
+            _db.session.commit()
+        return session
+    return make
@@ -0,0 +1,134 @@
+# tests/test_analytics.py
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.main import analytics, membership  # noqa: E402
+from app.models import db, SessionComment, StudySession  # noqa: E402
+
+MONDAY = datetime(2026, 10, 12, 15, 0)   # a Monday; "today" in these tests is the Sunday after
+
+
+@pytest.fixture
+def people(make_users):
+    return make_users(*(f"student{i}" for i in range(6)))
+
+
+def add_session(creator, day, topic, location, members=(), capacity=None, comments=0):
+    session = StudySession(
+        title=f"{topic} review", date=MONDAY + timedelta(days=day), time="3:00 PM",
+        location=location, topic=topic, creator_id=creator.id, capacity=capacity)
+    db.session.add(session)
+    db.session.commit()
+    for member in members:
+        membership.join_session(session.id, member.id)
+    for i in range(comments):
+        db.session.add(SessionComment(content=f"note {i}", user_id=creator.id, session_id=session.id,
+                                      timestamp=MONDAY + timedelta(days=day)))
+    db.session.commit()
+    return session
+
+
+@pytest.fixture
+def semester(people):
+    a, b, c, d, e, f = people
+    return [
+        add_session(a, 0, "Calculus", "Library", [a, b, c, d], capacity=4, comments=3),   # Monday, full
+        add_session(b, 0, "Calculus", "Room 101", [b, c], capacity=4, comments=1),        # Monday
+        add_session(c, 2, "Physics", "Library", [c], comments=0),                          # Wednesday
+        add_session(d, -7, None, "Library", [], comments=2),                               # the week before
+    ]
+
+
+def _report():
+    dataset = analytics.Dataset(np)
+    dataset.refresh(rebuild_interval=3600)
+    return analytics.compute_report(dataset, trend_weeks=2, today=MONDAY + timedelta(days=6)), dataset
+
+
+def _by_name(rows):
+    return {row["name"]: row for row in rows}
+
+
+def test_report_matches_the_orm_counts(app, semester):
+    report, _ = _report()
+
+    totals = report["totals"]
+    assert totals["sessions"] == 4
+    assert totals["participants"] == sum(s.get_participant_count() for s in semester) == 7
+    assert totals["comments"] == 6
+    assert totals["median_participants"] == 1.5
+    assert totals["utilization"] == 0.75 and totals["full_sessions"] == 1
+
+    topics = _by_name(report["by_topic"])
+    assert report["by_topic"][0]["name"] == "Calculus"   # biggest group first
+    assert topics["Calculus"]["sessions"] == 2
+    assert topics["Calculus"]["participants"] == 6
+    assert topics["Calculus"]["avg_participants"] == 3.0
+    assert topics["Calculus"]["comments_per_session"] == 2.0
+    assert topics["Physics"]["utilization"] is None
+    assert topics[analytics.NO_TOPIC]["comments"] == 2
+
+    locations = _by_name(report["by_location"])
+    assert locations["Library"]["sessions"] == 3 and locations["Library"]["participants"] == 5
+
+    weekdays = [row["name"] for row in report["by_weekday"]]
+    assert weekdays == list(analytics.WEEKDAYS)
+    assert _by_name(report["by_weekday"])["Monday"]["sessions"] == 3
+    assert _by_name(report["by_weekday"])["Wednesday"]["sessions"] == 1
+
+
+def test_histogram_and_weekly_trend(app, semester):
+    report, _ = _report()
+    histogram = {bucket["participants"]: bucket["sessions"] for bucket in report["participant_histogram"]}
+    assert histogram == {"0": 1, "1": 1, "2": 1, "3-4": 1, "5-9": 0, "10-19": 0, "20+": 0}
+    assert report["weekly"] == [
+        {"week_start": "2026-10-05", "sessions": 1, "participants": 0, "comments": 2},
+        {"week_start": "2026-10-12", "sessions": 3, "participants": 7, "comments": 4},
+    ]
+
+
+def test_refresh_appends_new_rows_and_reloads_after_deletes(app, people, semester):
+    _, dataset = _report()
+    assert dataset.loads == 1
+
+    new = add_session(people[0], 1, "Chemistry", "Lab", people[:3], comments=1)
+    dataset.refresh(rebuild_interval=3600)
+    assert dataset.loads == 1                      # appended, not reloaded
+    assert list(dataset.session_id[-1:]) == [new.id]
+    assert int(dataset.participants[-1]) == 3
+    assert len(dataset.comment_session) == 7
+
+    db.session.delete(semester[0])
+    db.session.commit()
+    dataset.refresh(rebuild_interval=3600)
+    assert dataset.loads == 2
+    assert semester[1].id in dataset.session_id and len(dataset.session_id) == 4
+    assert len(dataset.comment_session) == 4
+
+
+def test_report_page_and_json(auth_client, semester):
+    data = auth_client.get("/api/analytics").get_json()
+    assert data["totals"]["sessions"] == 4
+    page = auth_client.get("/analytics")
+    assert page.status_code == 200
+    assert b"Calculus" in page.data and b"Weekly Trend" in page.data
+
+
+def test_reports_are_cached(app, auth_client, semester, monkeypatch):
+    auth_client.get("/api/analytics")
+    monkeypatch.setattr(analytics.Analytics, "report", lambda self, app: pytest.fail("not cached"))
+    assert auth_client.get("/api/analytics").get_json()["totals"]["sessions"] == 4
+
+
+def test_without_numpy_the_endpoints_say_so(auth_client, monkeypatch):
+    def missing():
+        raise analytics.AnalyticsUnavailable("Analytics need NumPy")
+    monkeypatch.setattr(analytics, "_numpy", missing)
+
+    response = auth_client.get("/api/analytics")
+    assert response.status_code == 503
+    assert "NumPy" in response.get_json()["error"]
+    assert auth_client.get("/analytics").status_code == 503
@@ -0,0 +1,51 @@
+# tests/test_archive.py
+from app.main import archive, membership
+from app.models import (
+    db, ArchivedComment, ArchivedMember, ArchivedSession, ScheduleEntry,
+    SessionComment, StudySession,
+)
+
+
+def test_archive_moves_old_sessions_with_members_and_comments(app, user, make_session):
+    old_id = make_session(user.id, "Ancient Review", days=-200).id
+    recent_id = make_session(user.id, "Last Week", days=-5).id
+    child = make_session(user.id, "Ancient Review", days=3, parent_id=old_id)
+    membership.join_session(old_id, user.id)
+    db.session.add(SessionComment(content="See you there", user_id=user.id, session_id=old_id))
+    db.session.commit()
+
+    assert archive.archive_sessions(horizon_days=90) == 1
+
+    assert db.session.get(StudySession, old_id) is None
+    assert db.session.get(StudySession, recent_id) is not None
+    assert db.session.get(StudySession, child.id).parent_id is None
+    assert SessionComment.query.filter_by(session_id=old_id).count() == 0
+    assert ScheduleEntry.query.filter_by(session_id=old_id).count() == 0
+
+    archived = db.session.get(ArchivedSession, old_id)
+    assert archived.creator_name == user.username
+    assert [m.username for m in ArchivedMember.query.filter_by(session_id=old_id)] == [user.username]
+    assert ArchivedComment.query.filter_by(session_id=old_id).one().content == "See you there"
+
+    # Running again is a no-op
+    assert archive.archive_sessions(horizon_days=90) == 0
+
+
+def test_archived_session_detail_is_read_only(auth_client, app, user, make_session):
+    old_id = make_session(user.id, "Ancient Review", days=-200).id
+    archive.archive_sessions(horizon_days=90)
+
+    response = auth_client.get(f"/session/{old_id}")
+    assert response.status_code == 200
+    assert b"Ancient Review" in response.data
+    assert b"has been archived" in response.data
+    assert b"join_session" not in response.data
+
+    # Write routes only see live sessions
+    assert auth_client.post(f"/join_session/{old_id}").status_code == 404
+
+
+def test_session_ids_are_not_reused_after_archival(app, user, make_session):
+    old_id = make_session(user.id, "Newest But Old", days=-200).id
+    archive.archive_sessions(horizon_days=90)
+    assert make_session(user.id, "Fresh").id > old_id
@@ -0,0 +1,179 @@
+# tests/test_asgi.py
+import asyncio
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import pytest
+
+pytest.importorskip("asgiref")
+pytest.importorskip("aiosqlite")
+
+from app import create_app, init_db  # noqa: E402
+from app.asgi import AsgiApp  # noqa: E402
+from app.models import db, SessionComment, StudySession, User  # noqa: E402
+
+
+@pytest.fixture
+def asgi_app(tmp_path):
+    """An AsgiApp over file databases in tmp_path, with one user and one session."""
+    app = create_app({
+        "TESTING": True,
+        "WTF_CSRF_ENABLED": False,
+        "TASK_QUEUE_MODE": "eager",
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'main.db'}",
+        "SQLALCHEMY_BINDS": {
+            "archive": f"sqlite:///{tmp_path / 'archive.db'}",
+            "tasks": f"sqlite:///{tmp_path / 'tasks.db'}",
+        },
+        "TEMPLATE_CACHE_DIR": str(tmp_path / "jinja_cache"),
+        "CACHE_L2_PATH": str(tmp_path / "cache.sqlite3"),
+        "NOTIFICATION_MAILDIR": str(tmp_path / "maildir"),
+        "COMMENT_POLL_INTERVAL": 0.05,
+    })
+    init_db(app)
+    with app.app_context():
+        user = User(username="asyncuser", email="async@example.com")
+        user.set_password("password123")
+        db.session.add(user)
+        db.session.flush()
+        session = StudySession(
+            title="Async Algebra", date=datetime.utcnow() + timedelta(days=1), time="3:00 PM",
+            location="Library", topic="Algebra", creator_id=user.id)
+        session.members.append(user)
+        db.session.add(session)
+        db.session.commit()
+        app.config["test_session_id"] = session.id
+    return AsgiApp(app)
+
+
+def _login_cookie(asgi_app):
+    client = asgi_app.flask_app.test_client()
+    client.post("/auth/login", data={"email": "async@example.com", "password": "password123"})
+    return f"session={client.get_cookie('session').value}"
+
+
+async def _call(asgi_app, path, method="GET", cookie=None, query=None, form=None):
+    """Send one HTTP request through the ASGI app; returns (status, headers, body)."""
+    body = urlencode(form).encode() if form else b""
+    headers = [(b"host", b"localhost")]
+    if cookie:
+        headers.append((b"cookie", cookie.encode()))
+    if form:
+        headers.append((b"content-type", b"application/x-www-form-urlencoded"))
+        headers.append((b"content-length", str(len(body)).encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "root_path": "",
+        "query_string": urlencode(query or {}).encode(), "headers": headers,
+        "server": ("localhost", 80), "client": ("127.0.0.1", 1234),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app(scope, receive, send)
+    start = messages[0]
+    return (start["status"], {k.decode(): v.decode() for k, v in start["headers"]},
+            b"".join(m.get("body", b"") for m in messages[1:]))
+
+
+def _run(asgi_app, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await asgi_app.dispose()
+    return asyncio.run(main())
+
+
+def test_listing_and_detail_are_served_natively(asgi_app):
+    cookie = _login_cookie(asgi_app)
+    session_id = asgi_app.flask_app.config["test_session_id"]
+    # A native route must never need the WSGI app
+    asgi_app.wsgi = None
+
+    async def requests():
+        return (await _call(asgi_app, "/sessions", cookie=cookie),
+                await _call(asgi_app, f"/session/{session_id}", cookie=cookie))
+
+    (status, headers, listing), (detail_status, _, detail) = _run(asgi_app, requests())
+    assert status == 200
+    assert headers["content-type"].startswith("text/html")
+    assert b"Async Algebra" in listing
+    assert detail_status == 200
+    assert b"Library" in detail
+    assert b"no-comments" in detail
+    assert b"var wait = 25," in detail              # long polls are only asked of the ASGI mode
+
+
+def test_anonymous_and_write_requests_fall_back_to_flask(asgi_app):
+    cookie = _login_cookie(asgi_app)
+    session_id = asgi_app.flask_app.config["test_session_id"]
+
+    async def requests():
+        anonymous = await _call(asgi_app, "/sessions")
+        posted = await _call(asgi_app, f"/session/{session_id}/comment", method="POST",
+                             cookie=cookie, form={"content": "Posted through WSGI"})
+        missing = await _call(asgi_app, "/session/9999", cookie=cookie)
+        return anonymous, posted, missing
+
+    anonymous, posted, missing = _run(asgi_app, requests())
+    assert anonymous[0] == 302 and "/auth/login" in anonymous[1]["location"]
+    assert posted[0] == 302
+    assert missing[0] == 404
+    with asgi_app.flask_app.app_context():
+        assert SessionComment.query.filter_by(content="Posted through WSGI").count() == 1
+
+
+def test_a_before_request_response_is_returned(asgi_app):
+    @asgi_app.flask_app.before_request
+    def maintenance():
+        if asgi_app.flask_app.config.get("MAINTENANCE"):
+            return "Down for maintenance", 503
+
+    cookie = _login_cookie(asgi_app)
+    asgi_app.flask_app.config["MAINTENANCE"] = True
+    status, _, body = _run(asgi_app, _call(asgi_app, "/sessions", cookie=cookie))
+    assert status == 503 and body == b"Down for maintenance"
+
+
+def test_long_poll_returns_a_comment_posted_while_waiting(asgi_app):
+    cookie = _login_cookie(asgi_app)
+    session_id = asgi_app.flask_app.config["test_session_id"]
+    path = f"/session/{session_id}/comments/fragment"
+
+    async def requests():
+        empty = await _call(asgi_app, path, cookie=cookie)
+        poll = asyncio.create_task(_call(asgi_app, path, cookie=cookie, query={"wait": 5}))
+        await asyncio.sleep(0.2)
+        await _call(asgi_app, f"/session/{session_id}/comment", method="POST",
+                    cookie=cookie, form={"content": "Fresh news"})
+        return empty, await poll
+
+    started = time.monotonic()
+    empty, (status, _, body) = _run(asgi_app, requests())
+    assert empty[0] == 204
+    assert status == 200
+    assert b"Fresh news" in body
+    assert time.monotonic() - started < 4
+
+
+def test_concurrent_long_polls_do_not_need_a_thread_each(asgi_app):
+    cookie = _login_cookie(asgi_app)
+    session_id = asgi_app.flask_app.config["test_session_id"]
+    path = f"/session/{session_id}/comments/fragment"
+
+    async def requests():
+        return await asyncio.gather(*(
+            _call(asgi_app, path, cookie=cookie, query={"wait": 0.5}) for _ in range(50)))
+
+    started = time.monotonic()
+    responses = _run(asgi_app, requests())
+    # 50 half-second polls one after another would take 25s
+    assert time.monotonic() - started < 5
+    assert [status for status, _, _ in responses] == [204] * 50
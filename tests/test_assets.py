@@ -0,0 +1,56 @@
+# tests/test_assets.py
+import gzip
+
+import pytest
+
+from app import assets
+
+
+@pytest.fixture
+def built(app, tmp_path):
+    app.config["ASSETS_DIST_FOLDER"] = str(tmp_path / "dist")
+    app.extensions.pop("asset_manifest", None)
+    return assets.build_assets(app.static_folder, app.config["ASSETS_DIST_FOLDER"])
+
+
+def test_asset_url_falls_back_to_static_without_build(app, tmp_path):
+    app.config["ASSETS_DIST_FOLDER"] = str(tmp_path / "missing")
+    app.extensions.pop("asset_manifest", None)
+    with app.test_request_context():
+        assert assets.asset_url("styles.css") == "/static/styles.css"
+
+
+def test_fingerprinted_asset_is_immutable_and_precompressed(app, client, built):
+    hashed = built["styles.css"]
+    assert hashed.startswith("styles.") and hashed.endswith(".css") and hashed != "styles.css"
+
+    assert f"/assets/{hashed}".encode() in client.get("/").data
+
+    response = client.get(f"/assets/{hashed}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.mimetype == "text/css"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert "max-age=31536000" in response.headers["Cache-Control"]
+    with open(f"{app.static_folder}/styles.css", "rb") as fh:
+        assert gzip.decompress(response.data) == fh.read()
+
+    plain = client.get(f"/assets/{hashed}", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+
+    assert client.get("/assets/styles.css").status_code == 404
+
+
+def test_dynamic_html_is_gzipped_when_accepted(app, client):
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert b"<html" in gzip.decompress(response.data).lower()
+
+    assert "Content-Encoding" not in client.get("/").headers
+
+
+def test_small_responses_are_not_compressed(app, client):
+    app.config["COMPRESS_MIN_SIZE"] = 10 ** 9
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
@@ -0,0 +1,75 @@
+# tests/test_bulk.py
+import io
+import json
+from datetime import datetime, timedelta
+
+from app.main import bulk
+from app.models import ScheduleEntry, StudySession
+
+FUTURE = (datetime.utcnow() + timedelta(days=7)).strftime("%Y-%m-%d")
+
+
+def rows(text, fmt="csv"):
+    return bulk.read_rows(io.StringIO(text), fmt)
+
+
+def test_import_sessions_reports_bad_rows_and_chunks(app, user, make_user):
+    make_user("bob")
+    csv_text = (
+        "title,date,time,location,topic,capacity,members\n"
+        f"Week 1,{FUTURE},3:00 PM,Room 1,Intro,,bob@example.com\n"
+        "Week 2,not-a-date,3:00 PM,Room 1,,,\n"
+        f",{FUTURE},3:00 PM,Room 1,,,\n"
+        f"Week 4,{FUTURE},3:00 PM,Room 2,,10,bob;ghost\n"
+    )
+    result = bulk.import_sessions(rows(csv_text), user.id, chunk_size=2)
+
+    assert len(result.imported) == 2
+    assert [(e.line, e.message) for e in result.errors] == [
+        (3, "date must be YYYY-MM-DD"),
+        (4, "title is required"),
+        (5, "unknown member 'ghost' was not added"),
+    ]
+    week1 = StudySession.query.filter_by(title="Week 1").one()
+    assert week1.get_participant_count() == 2
+    assert ScheduleEntry.query.filter_by(session_id=week1.id).count() == 2
+
+
+def test_import_memberships_from_json(app, user, make_user):
+    bob = make_user("bob")
+    result = bulk.import_sessions(rows(json.dumps([
+        {"title": "Lab", "date": FUTURE, "time": "1 PM", "location": "Lab 3"}]), "json"), user.id)
+    session_id = result.imported[0]
+
+    members = json.dumps([
+        {"session_id": session_id, "member": "bob"},
+        {"session_id": 9999, "member": "bob"},
+    ])
+    result = bulk.import_memberships(rows(members, "json"))
+    assert result.imported == [(session_id, bob.id)]
+    assert result.errors == [bulk.RowError(2, "unknown session '9999'")]
+
+
+def test_streamed_exports(auth_client, app, user):
+    bulk.import_sessions(rows(
+        "title,date,time,location\n"
+        f"Export Me,{FUTURE},3:00 PM,Room 9\n"), user.id)
+
+    response = auth_client.get("/export/sessions.csv")
+    assert response.is_streamed
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith("id,title,date")
+    assert "Export Me" in lines[1] and lines[1].endswith(",testuser,1,")
+
+    data = json.loads(auth_client.get("/export/rosters.json").get_data(as_text=True))
+    assert data[0]["email"] == user.email
+
+
+def test_import_page_upload(auth_client, user):
+    data = {
+        "kind": "sessions",
+        "file": (io.BytesIO(f"title,date,time,location\nUploaded,{FUTURE},9 AM,Hall\n".encode()), "s.csv"),
+    }
+    response = auth_client.post("/import", data=data, content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert b"Imported 1 sessions" in response.data
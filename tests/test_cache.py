@@ -0,0 +1,134 @@
+# tests/test_cache.py
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.cache import Cache, L2Store, get_cache
+
+
+@pytest.fixture
+def l2_path(tmp_path):
+    return str(tmp_path / "cache.sqlite3")
+
+
+def test_values_come_from_l1_then_l2_and_are_shared_between_processes(l2_path):
+    first, second = Cache(L2Store(l2_path)), Cache(L2Store(l2_path))
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {"answer": 42}
+
+    assert first.get_or_set("key", loader) == {"answer": 42}
+    assert first.get_or_set("key", loader) == {"answer": 42}
+    # A second process finds the value in the shared L2 file
+    assert second.get_or_set("key", loader) == {"answer": 42}
+    assert len(calls) == 1
+    assert first.stats()["misses"] == 1 and first.stats()["l1_hits"] == 1
+    assert second.stats()["l2_hits"] == 1
+
+
+def test_invalidating_a_tag_reaches_other_processes_after_l1_ttl(l2_path):
+    writer = Cache(L2Store(l2_path), l1_ttl=0)
+    reader = Cache(L2Store(l2_path), l1_ttl=0)
+    value = {"version": 1}
+    assert reader.get_or_set("detail:1", lambda: dict(value), tag="session:1") == {"version": 1}
+
+    value["version"] = 2
+    writer.invalidate("session:1")
+    assert reader.get_or_set("detail:1", lambda: dict(value), tag="session:1") == {"version": 2}
+    # Other tags are untouched
+    assert reader.get_or_set("detail:2", lambda: "two", tag="session:2") == "two"
+    assert reader.get_or_set("detail:2", lambda: "changed", tag="session:2") == "two"
+
+
+def test_a_fill_racing_an_invalidation_is_not_served_afterwards(l2_path):
+    cache = Cache(L2Store(l2_path))
+
+    def slow_stale_loader():
+        # The data was read, then a write committed and invalidated the tag
+        cache.invalidate("session:1")
+        return "stale"
+
+    assert cache.get_or_set("detail:1", slow_stale_loader, tag="session:1") == "stale"
+    assert cache.get_or_set("detail:1", lambda: "fresh", tag="session:1") == "fresh"
+
+
+def test_concurrent_misses_compute_the_value_once(l2_path):
+    # Two "processes" with several threads each ask for the same missing key
+    caches = [Cache(L2Store(l2_path)), Cache(L2Store(l2_path))]
+    calls = []
+    results = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return "value"
+
+    def worker(cache):
+        results.append(cache.get_or_set("hot", loader))
+
+    threads = [threading.Thread(target=worker, args=(caches[i % 2],)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["value"] * 10
+    assert len(calls) == 1
+    assert sum(cache.stats()["lease_waits"] for cache in caches) >= 1
+
+
+def test_none_is_not_cached_and_l2_failures_fall_back_to_the_loader(tmp_path):
+    cache = Cache(L2Store(str(tmp_path)))   # a directory: every L2 call fails
+    assert cache.get_or_set("missing", lambda: None) is None
+    assert cache.get_or_set("missing", lambda: "now there") == "now there"
+    assert cache.get_or_set("missing", lambda: "again") == "now there"   # from L1
+    assert cache.stats()["l2_errors"] > 0
+
+
+def test_l1_evicts_least_recently_used_entries():
+    cache = Cache(l1_size=2)
+    for key in ("a", "b", "c"):
+        cache.get_or_set(key, lambda key=key: key.upper())
+    assert cache.stats()["l1_size"] == 2
+    assert cache.get_or_set("a", lambda: "reloaded") == "reloaded"
+
+
+@pytest.fixture
+def cached_session(user, make_session):
+    return make_session(user.id, "Cached Calculus", days=2, members=[user.id], time="4:00 PM",
+                        location="Room 12", topic="Limits").id
+
+
+def test_detail_page_is_cached_until_a_comment_is_added(app, auth_client, cached_session):
+    cache = get_cache(app)
+    assert auth_client.get(f"/session/{cached_session}").status_code == 200
+    assert auth_client.get(f"/session/{cached_session}").status_code == 200
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["l1_hits"] == 1
+
+    auth_client.post(f"/session/{cached_session}/comment", data={"content": "Cache me if you can"})
+    page = auth_client.get(f"/session/{cached_session}").get_data(as_text=True)
+    assert "Cache me if you can" in page
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_edit_invalidates_the_cached_detail(app, auth_client, cached_session):
+    auth_client.get(f"/session/{cached_session}")
+    auth_client.post(f"/edit_session/{cached_session}", data={
+        "title": "Renamed Calculus", "date": (datetime.utcnow() + timedelta(days=2)).strftime("%Y-%m-%d"),
+        "time": "4:00 PM", "location": "Room 12", "topic": "Limits", "recurrence_interval": "weekly",
+    })
+    page = auth_client.get(f"/session/{cached_session}").get_data(as_text=True)
+    assert "Renamed Calculus" in page
+
+
+def test_cache_stats_endpoint(auth_client, cached_session):
+    auth_client.get(f"/session/{cached_session}")
+    stats = auth_client.get("/api/cache-stats").get_json()
+    assert stats["misses"] == 1
+    assert stats["l2_size"] == 1
+    assert 0.0 <= stats["hit_ratio"] <= 1.0
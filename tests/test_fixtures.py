@@ -0,0 +1,43 @@
+# tests/test_fixtures.py
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.models import db, User
+
+
+def _committed_users(app):
+    """Count users as another process would see them (outside the test transaction)."""
+    path = db.engines[None].url.database
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM user").fetchone()[0]
+
+
+def test_commits_stay_inside_the_test_transaction(app):
+    db.session.add(User(username="temp", email="temp@example.com"))
+    db.session.commit()
+
+    assert User.query.count() == 1
+    assert _committed_users(app) == 0
+
+
+def test_previous_test_was_rolled_back(app):
+    assert User.query.count() == 0
+
+
+def test_rollback_after_error_keeps_earlier_work(app, user):
+    db.session.add(User(username="dupe", email=user.email))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+    assert User.query.filter_by(email=user.email).count() == 1
+
+
+@pytest.mark.live_db
+def test_live_db_commits_to_a_private_copy(app):
+    db.session.add(User(username="kept", email="kept@example.com"))
+    db.session.commit()
+
+    assert _committed_users(app) == 1
@@ -0,0 +1,113 @@
+# tests/test_idempotency.py
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask import g
+
+from app.idempotency import get_store, purge_idempotency_keys
+from app.models import db, SessionComment, StudySession
+
+
+def _session_form(**overrides):
+    data = {
+        "title": "Idempotent Integrals",
+        "date": (datetime.utcnow() + timedelta(days=3)).strftime("%Y-%m-%d"),
+        "time": "2:00 PM",
+        "location": "Room 7",
+        "topic": "Integrals",
+        "recurrence_interval": "weekly",
+        "idempotency_key": "form-key-1",
+    }
+    data.update(overrides)
+    return data
+
+
+@pytest.fixture
+def open_session(user, make_session):
+    return make_session(user.id, "Open Session", time="1:00 PM", members=[user.id]).id
+
+
+def test_forms_carry_a_fresh_key(auth_client):
+    first = auth_client.get("/create_session").get_data(as_text=True)
+    second = auth_client.get("/create_session").get_data(as_text=True)
+    assert 'name="idempotency_key"' in first
+    key = first.split('name="idempotency_key" value="')[1].split('"')[0]
+    assert key and key not in second
+
+
+def test_double_submitted_create_form_makes_one_session(auth_client):
+    first = auth_client.post("/create_session", data=_session_form())
+    second = auth_client.post("/create_session", data=_session_form())
+
+    assert first.status_code == second.status_code == 302
+    assert second.location == first.location
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert StudySession.query.filter_by(title="Idempotent Integrals").count() == 1
+    # The replay shows the same confirmation
+    with auth_client.session_transaction() as cookie_session:
+        assert any("created" in message.lower() for _, message in cookie_session["_flashes"])
+
+
+def test_retried_comment_with_header_is_saved_once(auth_client, open_session):
+    for _ in range(3):
+        response = auth_client.post(f"/session/{open_session}/comment", data={"content": "Only once"},
+                                    headers={"Idempotency-Key": "retry-123"})
+        assert response.status_code == 302
+    assert SessionComment.query.filter_by(content="Only once").count() == 1
+
+    # A new key is a new comment
+    auth_client.post(f"/session/{open_session}/comment", data={"content": "Only once"},
+                     headers={"Idempotency-Key": "retry-456"})
+    assert SessionComment.query.filter_by(content="Only once").count() == 2
+
+
+def test_keys_are_scoped_to_the_user(app, auth_client, open_session, make_user):
+    other = make_user("other")
+    other.set_password("password123")
+    db.session.commit()
+    auth_client.post(f"/join_session/{open_session}", headers={"Idempotency-Key": "shared"})
+
+    # Requests share the test's app context; forget the first client's user
+    g.pop("_login_user", None)
+    other_client = app.test_client()
+    other_client.post("/auth/login", data={"email": "other@example.com", "password": "password123"})
+    response = other_client.post(f"/join_session/{open_session}", headers={"Idempotency-Key": "shared"})
+    assert "Idempotent-Replayed" not in response.headers
+    assert other in db.session.get(StudySession, open_session).members
+
+
+def test_a_failed_submission_releases_its_key(auth_client):
+    response = auth_client.post("/create_session", data=_session_form(title=""))
+    assert response.status_code == 200   # form errors
+    auth_client.post("/create_session", data=_session_form())
+    assert StudySession.query.filter_by(title="Idempotent Integrals").count() == 1
+
+
+def test_a_repeat_of_a_request_still_running_gets_409(app, auth_client, user, open_session):
+    app.config["IDEMPOTENCY_WAIT"] = 0.1
+    store = get_store(app)
+    key = f"{user.id}:/session/{open_session}/comment:in-flight"
+    store.reserve(key, time.time(), 60)
+
+    response = auth_client.post(f"/session/{open_session}/comment", data={"content": "Twice"},
+                                headers={"Idempotency-Key": "in-flight"})
+    assert response.status_code == 409
+    assert SessionComment.query.filter_by(content="Twice").count() == 0
+
+    store.complete(key, 302, f"/session/{open_session}", [["success", "Comment added successfully!"]],
+                   time.time() + 60)
+    response = auth_client.post(f"/session/{open_session}/comment", data={"content": "Twice"},
+                                headers={"Idempotency-Key": "in-flight"})
+    assert response.status_code == 302
+    assert response.headers["Idempotent-Replayed"] == "true"
+
+
+def test_expired_keys_are_purged_and_can_be_reused(app, auth_client, open_session):
+    app.config["IDEMPOTENCY_TTL"] = -1
+    auth_client.post(f"/session/{open_session}/comment", data={"content": "Later"},
+                     headers={"Idempotency-Key": "old"})
+    assert purge_idempotency_keys() == 1
+    auth_client.post(f"/session/{open_session}/comment", data={"content": "Later"},
+                     headers={"Idempotency-Key": "old"})
+    assert SessionComment.query.filter_by(content="Later").count() == 2
@@ -0,0 +1,91 @@
+# tests/test_membership.py
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from app.main import membership
+from app.models import db, session_members, StudySession, SessionWaitlist
+
+
+def member_count(session_id):
+    return db.session.execute(
+        db.select(db.func.count()).select_from(session_members)
+        .where(session_members.c.session_id == session_id)
+    ).scalar()
+
+
+def test_join_twice_is_idempotent(app, user, make_session):
+    session_id = make_session(user.id).id
+
+    assert membership.join_session(session_id, user.id) == membership.JOINED
+    assert membership.join_session(session_id, user.id) == membership.ALREADY_MEMBER
+    db.session.commit()
+    assert member_count(session_id) == 1
+
+
+def test_full_session_waitlists_and_promotes_on_leave(app, user, make_users, make_session):
+    first, second, third = (u.id for u in make_users("first", "second", "third"))
+    session_id = make_session(user.id, capacity=2).id
+
+    assert membership.join_session(session_id, first) == membership.JOINED
+    assert membership.join_session(session_id, second) == membership.JOINED
+    assert membership.join_session(session_id, third) == membership.WAITLISTED
+    assert membership.join_session(session_id, third) == membership.ALREADY_WAITLISTED
+    db.session.commit()
+
+    assert membership.leave_session(session_id, first) is True
+    db.session.commit()
+
+    assert membership.is_member(session_id, third)
+    assert not membership.is_waitlisted(session_id, third)
+    assert member_count(session_id) == 2
+
+
+def test_raising_capacity_promotes_in_order(app, user, make_users, make_session):
+    ids = [u.id for u in make_users(*(f"member{i}" for i in range(4)))]
+    session_id = make_session(user.id, capacity=1).id
+    for user_id in ids:
+        membership.join_session(session_id, user_id)
+    db.session.commit()
+
+    db.session.get(StudySession, session_id).capacity = 3
+    promoted = membership.promote_waitlist(session_id)
+    db.session.commit()
+
+    assert promoted == ids[1:3]
+    assert SessionWaitlist.query.filter_by(session_id=session_id).count() == 1
+
+
+@pytest.mark.live_db
+def test_concurrent_joins_never_exceed_capacity(app, user, make_users, make_session):
+    """Hundreds of simultaneous joins: exactly `capacity` seats, everyone else waitlisted."""
+    ids = [u.id for u in make_users(*(f"racer{i}" for i in range(300)))]
+    session_id = make_session(user.id, capacity=50).id
+
+    def attempt(user_id):
+        with app.app_context():
+            try:
+                status = membership.join_session(session_id, user_id)
+                db.session.commit()
+                return status
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        results = list(pool.map(attempt, ids))
+
+    assert results.count(membership.JOINED) == 50
+    assert results.count(membership.WAITLISTED) == 250
+    assert member_count(session_id) == 50
+    assert SessionWaitlist.query.filter_by(session_id=session_id).count() == 250
+
+
+def test_join_route_reports_waitlist(auth_client, app, user, make_user, make_session):
+    other = make_user("other").id
+    session_id = make_session(other, capacity=1).id
+    membership.join_session(session_id, other)
+    db.session.commit()
+
+    response = auth_client.post(f"/join_session/{session_id}", follow_redirects=True)
+    assert response.status_code == 200
+    assert b"added to the waitlist" in response.data
+    assert membership.is_waitlisted(session_id, user.id)
@@ -0,0 +1,109 @@
+# tests/test_notifications.py
+import pytest
+from flask import g
+from sqlalchemy import MetaData, create_engine
+
+from app import notifications
+from app.main import commenting, membership
+from app.models import db, ActivityEvent, DigestCursor
+from app.schema import upgrade_foreign_keys
+
+
+@pytest.fixture
+def sink(app):
+    app.config["NOTIFICATION_SINK"] = "memory"
+    app.extensions.pop("notification_sink", None)
+    return notifications.get_sink()
+
+
+def test_one_digest_per_user_covering_all_events(app, user, sink, make_user, make_session):
+    bob, carol = make_user("bob"), make_user("carol")
+    algebra = make_session(user.id, "Algebra", members=[user.id])
+    physics = make_session(user.id, "Physics", members=[user.id])
+    notifications.send_digests()  # flush the setup events
+    sink.messages.clear()
+
+    for session in (algebra, physics):
+        membership.join_session(session.id, bob.id)
+    membership.join_session(algebra.id, carol.id)
+    notifications.record_event(algebra.id, carol.id, notifications.COMMENTED, "Bring notes")
+    db.session.commit()
+
+    # Recipients are the members at digest time: the creator, bob and carol
+    assert notifications.send_digests() == 3
+    by_recipient = {m.to: m for m in sink.messages}
+
+    # The creator hears about everything in both sessions
+    creator_digest = by_recipient[user.email]
+    assert creator_digest.subject == "Study Sessions: 4 new updates"
+    assert "Algebra" in creator_digest.body and "Physics" in creator_digest.body
+    assert 'carol commented: "Bring notes"' in creator_digest.body
+
+    # Bob is not told about his own joins, only carol's activity in algebra
+    assert "bob joined" not in by_recipient[bob.email].body
+    assert "carol joined" in by_recipient[bob.email].body
+
+    # Nothing new since the last run
+    assert notifications.send_digests() == 0
+
+
+def test_events_after_deleting_the_newest_are_still_sent(auth_client, user, sink, make_user, make_session):
+    bob = make_user("bob")
+    keep = make_session(user.id, "Keep", members=[user.id])
+    membership.join_session(keep.id, bob.id)
+    doomed = make_session(user.id, "Doomed", members=[user.id])
+    membership.join_session(doomed.id, bob.id)   # the newest events belong to this session
+    db.session.commit()
+    notifications.send_digests()
+    sink.messages.clear()
+    sent_upto = db.session.get(DigestCursor, "digest").last_event_id
+
+    assert auth_client.post(f"/delete_session/{doomed.id}").status_code == 302
+    g.pop("_login_user", None)
+    commenting.add_comment(keep.id, bob.id, "Still on for Keep?")
+    db.session.commit()
+
+    # The new event's id is above every id the digest already covered
+    assert ActivityEvent.query.filter_by(detail="Still on for Keep?").one().id > sent_upto
+    assert notifications.send_digests() == 1
+    assert 'bob commented: "Still on for Keep?"' in sink.messages[0].body
+
+
+def test_old_event_table_is_rebuilt_with_autoincrement(tmp_path):
+    old = MetaData()
+    for table in db.metadata.sorted_tables:
+        table.to_metadata(old)
+    old.tables["activity_event"].dialect_options["sqlite"]["autoincrement"] = False
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    old.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO user (id, username, email, schedule_version) VALUES (1, 'old', 'old@example.com', 0)")
+        conn.exec_driver_sql(
+            "INSERT INTO study_session (id, title, date, time, location, creator_id, created_at, is_recurring) "
+            "VALUES (1, 'Old', '2030-01-01', '1 PM', 'Here', 1, '2029-01-01', 0)")
+        conn.exec_driver_sql(
+            "INSERT INTO activity_event (id, session_id, actor_id, kind, created_at) "
+            "VALUES (1, 1, 1, 'joined', '2029-01-01'), (2, 1, 1, 'left', '2029-01-01')")
+
+    assert upgrade_foreign_keys(engine, db.metadata) == ["activity_event"]
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM activity_event WHERE id = 2")
+        conn.exec_driver_sql(
+            "INSERT INTO activity_event (session_id, actor_id, kind, created_at) VALUES (1, 1, 'joined', '2029-01-02')")
+        assert conn.exec_driver_sql("SELECT max(id) FROM activity_event").scalar() == 3
+    engine.dispose()
+
+
+def test_comment_route_records_event(auth_client, user, make_session):
+    session = make_session(user.id, "Chemistry", members=[user.id])
+    auth_client.post(f"/session/{session.id}/comment", data={"content": "Room changed"})
+    event = ActivityEvent.query.filter_by(kind=notifications.COMMENTED).one()
+    assert event.detail == "Room changed"
+
+
+def test_maildir_sink_writes_one_file_per_message(tmp_path):
+    sink = notifications.MaildirSink(str(tmp_path / "maildir"))
+    sent = sink.deliver([notifications.Message("a@example.com", "Hi", "Body")])
+    files = list((tmp_path / "maildir" / "new").iterdir())
+    assert sent == 1 and len(files) == 1
+    assert files[0].read_text().startswith("To: a@example.com\nSubject: Hi")
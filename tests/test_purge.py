@@ -0,0 +1,177 @@
+# tests/test_purge.py
+import sqlite3
+
+import pytest
+from sqlalchemy import MetaData, create_engine, event, select
+
+from app import notifications
+from app.main import membership, purge
+from app.models import (
+    db, session_members, ActivityEvent, DigestCursor, ScheduleEntry, SessionComment, SessionWaitlist, StudySession, User,
+)
+from app.schema import upgrade_foreign_keys
+
+
+@pytest.fixture
+def members(make_users):
+    return make_users(*(f"member{i}" for i in range(5)))
+
+
+@pytest.fixture
+def busy_session(user, members, make_session):
+    session = make_session(user.id, capacity=3)
+    for member in [user, *members]:
+        membership.join_session(session.id, member.id)   # the last two are waitlisted
+    for member in members[:2]:
+        db.session.add(SessionComment(content=f"Hi from {member.username}", user_id=member.id,
+                                      session_id=session.id))
+        db.session.add(ActivityEvent(kind="comment", session_id=session.id, actor_id=member.id))
+    db.session.commit()
+    return session.id
+
+
+def _rows_for(session_id):
+    return {
+        "members": db.session.scalar(select(db.func.count()).where(session_members.c.session_id == session_id)),
+        "comments": SessionComment.query.filter_by(session_id=session_id).count(),
+        "waitlist": SessionWaitlist.query.filter_by(session_id=session_id).count(),
+        "schedule": ScheduleEntry.query.filter_by(session_id=session_id).count(),
+        "events": ActivityEvent.query.filter_by(session_id=session_id).count(),
+    }
+
+
+def test_deleting_a_session_cascades_in_a_couple_of_statements(app, busy_session):
+    assert all(_rows_for(busy_session).values())
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        purge.purge_sessions([busy_session])
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    db.session.commit()
+
+    assert db.session.get(StudySession, busy_session) is None
+    assert set(_rows_for(busy_session).values()) == {0}
+    # Members lookup + schedule version bump + schedule delete + session delete, whatever the size
+    assert len(statements) == 4
+
+
+def test_raw_deletes_cascade_too(app, busy_session):
+    db.session.execute(db.delete(StudySession).where(StudySession.id == busy_session))
+    db.session.commit()
+    assert set(_rows_for(busy_session).values()) == {0}
+
+
+def test_delete_series_removes_every_occurrence(auth_client, user, make_session):
+    root = make_session(user.id, "Weekly Review", is_recurring=True, recurrence_interval="weekly")
+    children = [make_session(user.id, "Weekly Review", days=2 + 7 * i, parent_id=root.id) for i in (1, 2)]
+    series = {root.id, *(child.id for child in children)}
+    other = make_session(user.id, "Something Else").id
+    membership.join_session(children[0].id, user.id)
+    db.session.commit()
+    version = user.schedule_version
+
+    response = auth_client.post(f"/delete_session/{children[0].id}", data={"series": "1"})
+    assert response.status_code == 302
+    remaining = set(db.session.execute(select(StudySession.id)).scalars())
+    assert series.isdisjoint(remaining)
+    assert other in remaining
+    assert db.session.get(User, user.id).schedule_version > version
+
+
+def test_deleting_one_occurrence_leaves_the_rest_of_the_series(auth_client, user, make_session):
+    root = make_session(user.id, "Weekly Review", is_recurring=True, recurrence_interval="weekly")
+    root_id = root.id
+    child_id = make_session(user.id, "Weekly Review", days=9, parent_id=root_id).id
+
+    auth_client.post(f"/delete_session/{root_id}")
+    assert db.session.get(StudySession, root_id) is None
+    assert db.session.get(StudySession, child_id).parent_id is None   # ON DELETE SET NULL
+
+
+@pytest.mark.live_db
+def test_sweep_removes_orphans_left_with_foreign_keys_off(app, user, members, make_session):
+    session = make_session(user.id)
+    for member in members[:2]:
+        membership.join_session(session.id, member.id)
+    child = make_session(user.id, parent_id=session.id)
+    db.session.commit()
+
+    # A writer that never turned foreign keys on deletes the session behind our back
+    raw = sqlite3.connect(app.config["SQLALCHEMY_DATABASE_URI"].removeprefix("sqlite:///"))
+    with raw:
+        raw.execute("INSERT INTO session_comment (content, timestamp, user_id, session_id) "
+                    "VALUES ('orphan', CURRENT_TIMESTAMP, ?, ?)", (user.id, session.id))
+        raw.execute("DELETE FROM study_session WHERE id = ?", (session.id,))
+    raw.close()
+
+    removed = purge.sweep_orphans()
+    assert removed["session_members"] == 2
+    assert removed["session_comment"] == 1
+    assert removed["schedule_entry"] == 2
+    assert removed["study_session.parent_id"] == 1
+    assert db.session.get(StudySession, child.id).parent_id is None
+    assert set(purge.sweep_orphans().values()) == {0}
+
+
+def test_events_after_a_purge_still_reach_the_next_digest(app, user, members, make_session):
+    app.config["NOTIFICATION_SINK"] = "memory"
+    app.extensions.pop("notification_sink", None)
+    keep_id, doomed_id = make_session(user.id, "Keep").id, make_session(user.id, "Doomed", days=3).id
+    membership.join_session(keep_id, user.id)
+    for member in members:
+        membership.join_session(doomed_id, member.id)   # the highest event ids
+    db.session.commit()
+    notifications.send_digests()
+    sent_upto = db.session.get(DigestCursor, "digest").last_event_id
+
+    purge.purge_sessions([doomed_id])
+    db.session.commit()
+    assert ActivityEvent.query.filter_by(session_id=doomed_id).count() == 0
+    membership.join_session(keep_id, members[0].id)
+    db.session.commit()
+
+    assert ActivityEvent.query.filter_by(session_id=keep_id, actor_id=members[0].id).one().id > sent_upto
+    sink = notifications.get_sink()
+    sink.messages.clear()
+    assert notifications.send_digests() == 1
+    assert f"{members[0].username} joined" in sink.messages[0].body
+
+
+def test_old_tables_are_rebuilt_with_their_on_delete_rules(tmp_path):
+    # The schema as created before the cascades existed
+    old = MetaData()
+    for table in db.metadata.sorted_tables:
+        table.to_metadata(old)
+    for table in old.sorted_tables:
+        for constraint in table.foreign_key_constraints:
+            constraint.ondelete = None
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    old.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO user (id, username, email, schedule_version) VALUES (1, 'old', 'old@example.com', 0)")
+        conn.exec_driver_sql(
+            "INSERT INTO study_session (id, title, date, time, location, creator_id, created_at, is_recurring) "
+            "VALUES (7, 'Old', '2030-01-01', '1 PM', 'Here', 1, '2029-01-01', 0), "
+            "(8, 'Gone', '2030-01-01', '1 PM', 'Here', 1, '2029-01-01', 0)")
+        conn.exec_driver_sql("DELETE FROM study_session WHERE id = 8")
+        conn.exec_driver_sql("INSERT INTO session_members (user_id, session_id) VALUES (1, 7)")
+
+    rebuilt = upgrade_foreign_keys(engine, db.metadata)
+    assert {"session_members", "session_comment", "study_session", "schedule_entry"} <= set(rebuilt)
+    assert upgrade_foreign_keys(engine, db.metadata) == []
+
+    with engine.begin() as conn:
+        rules = {row[3]: row[6] for row in conn.exec_driver_sql("PRAGMA foreign_key_list(session_members)")}
+        assert rules == {"user_id": "CASCADE", "session_id": "CASCADE"}
+        # Rows, indexes and the autoincrement high-water mark survive
+        assert conn.exec_driver_sql("SELECT count(*) FROM session_members").scalar() == 1
+        assert conn.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = 'study_session'").scalar() == 8
+        indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(schedule_entry)")}
+        assert "ix_schedule_entry_user_date" in indexes
+        assert conn.exec_driver_sql("PRAGMA foreign_key_check").fetchall() == []
+
+        conn.exec_driver_sql("DELETE FROM study_session WHERE id = 7")
+        assert conn.exec_driver_sql("SELECT count(*) FROM session_members").scalar() == 0
+    engine.dispose()
@@ -0,0 +1,83 @@
+# tests/test_recommend.py
+from app.main import membership, recommend
+from app.models import db
+
+
+def test_topic_similarity_ranks_related_sessions_first(app, user, make_user, make_session):
+    other = make_user("other").id
+    joined = make_session(other, "Linear Algebra", topic="matrices eigenvalues").id
+    history = make_session(other, "Organic Chemistry", topic="reactions").id
+    algebra = make_session(other, "Algebra Practice", topic="matrices").id
+    poetry = make_session(other, "Poetry Workshop", topic="sonnets").id
+    past = make_session(other, "Old Algebra", topic="matrices", days=-10).id
+    membership.join_session(joined, user.id)
+    db.session.commit()
+
+    scores = recommend.scores_for(user.id)
+    assert joined not in scores and past not in scores
+    assert scores[algebra] > scores[poetry]
+    assert scores[algebra] > scores[history]
+
+
+def test_co_membership_boosts_sessions_peers_joined(app, user, make_user, make_session):
+    peer, stranger = make_user("peer").id, make_user("stranger").id
+    shared = make_session(peer, "Group A").id
+    with_peer = make_session(peer, "Group B").id
+    with_stranger = make_session(stranger, "Group C").id
+    for session_id, user_id in ((shared, user.id), (shared, peer), (with_peer, peer), (with_stranger, stranger)):
+        membership.join_session(session_id, user_id)
+    db.session.commit()
+
+    scores = recommend.scores_for(user.id)
+    assert scores[with_peer] > scores[with_stranger]
+
+
+def test_incremental_updates_invalidate_cached_ranking(app, user, make_user, make_session):
+    other = make_user("other").id
+    make_session(other, "Calculus", topic="derivatives").id
+    base = recommend.scores_for(user.id)
+    assert recommend.scores_for(user.id) is base  # served from cache
+
+    new_id = make_session(other, "Calculus Drills", topic="derivatives").id
+    recommend.session_changed(new_id)
+    assert new_id in recommend.scores_for(user.id)
+
+
+def test_a_join_only_invalidates_rankings_it_can_change(app, user, make_user, make_session):
+    peer, loner, newcomer = make_user("peer").id, make_user("loner").id, make_user("newcomer").id
+    shared = make_session(peer, "Statistics", topic="regression").id
+    apart = make_session(loner, "Painting", topic="watercolor").id
+    target = make_session(peer, "Probability", topic="distributions").id
+    for session_id, user_id in ((shared, user.id), (shared, peer), (apart, loner)):
+        membership.join_session(session_id, user_id)
+    db.session.commit()
+    before = {u: recommend.scores_for(u) for u in (user.id, loner)}
+
+    membership.join_session(target, newcomer)
+    db.session.commit()
+    recommend.members_changed(target)
+    assert recommend.scores_for(loner) is before[loner]         # shares nothing with the newcomer
+    assert recommend.scores_for(user.id) is before[user.id]
+
+    membership.join_session(shared, newcomer)                    # now a peer of user's
+    db.session.commit()
+    recommend.members_changed(shared)
+    assert recommend.scores_for(loner) is before[loner]
+    after = recommend.scores_for(user.id)
+    assert after is not before[user.id] and after[target] > before[user.id][target]
+
+
+def test_sessions_page_orders_available_by_recommendation(auth_client, app, user, make_user, make_session):
+    other = make_user("other").id
+    joined = make_session(other, "Databases", topic="sql joins").id
+    make_session(other, "Pottery", topic="clay", days=1).id
+    related = make_session(other, "Advanced Databases", topic="sql indexes", days=5).id
+    membership.join_session(joined, user.id)
+    db.session.commit()
+    # Logging in already rendered /sessions; drop that (empty) index
+    app.extensions.pop("recommender", None)
+
+    html = auth_client.get("/sessions").get_data(as_text=True)
+    available = html.split("Available Sessions to Join")[1]
+    assert available.index("Advanced Databases") < available.index("Pottery")
+    assert "Recommended" in available
@@ -1,4 +1,5 @@
 # tests/test_routes.py
+import time
 from datetime import datetime, timedelta
 
 from app.models import db, StudySession, User
@@ -121,3 +122,19 @@ def test_join_and_leave_session(auth_client, app, user, future_session):
     with app.app_context():
         session = StudySession.query.get(session_id)
         assert user not in session.members
+
+
+def test_wsgi_comment_polls_answer_at_once(auth_client, app, user):
+    session = StudySession(title="Polling", date=datetime.utcnow() + timedelta(days=1), time="3:00 PM",
+                           location="Library", creator_id=user.id)
+    db.session.add(session)
+    db.session.commit()
+
+    page = auth_client.get(f"/session/{session.id}").get_data(as_text=True)
+    assert "var wait = 0," in page                  # short polls: no worker thread waits
+
+    app.config["COMMENT_POLL_INTERVAL"] = 5
+    started = time.monotonic()
+    response = auth_client.get(f"/session/{session.id}/comments/fragment?wait=25")
+    assert response.status_code == 204
+    assert time.monotonic() - started < 2
@@ -0,0 +1,122 @@
+# tests/test_routing.py
+from datetime import datetime, timedelta
+
+import pytest
+from flask import session
+from sqlalchemy import func, insert, select
+
+from app import create_app, init_db, writes
+from app.models import db, StudySession, User
+from app.routing import STICKY_KEY, replicas, sync_replicas
+
+
+@pytest.fixture
+def replicated_app(tmp_path):
+    """An app with a primary database and two read replicas in tmp_path."""
+    app = create_app({
+        "TESTING": True,
+        "WTF_CSRF_ENABLED": False,
+        "TASK_QUEUE_MODE": "eager",
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+        "SQLALCHEMY_BINDS": {
+            "archive": f"sqlite:///{tmp_path / 'archive.db'}",
+            "tasks": f"sqlite:///{tmp_path / 'tasks.db'}",
+        },
+        "SQLALCHEMY_REPLICAS": [f"sqlite:///{tmp_path / 'replica0.db'}", f"sqlite:///{tmp_path / 'replica1.db'}"],
+        "TEMPLATE_CACHE_DIR": str(tmp_path / "jinja_cache"),
+        "CACHE_L2_PATH": str(tmp_path / "cache.sqlite3"),
+    })
+    init_db(app)
+    # No app context is pushed here: each request gets its own, with its own db session
+    return app
+
+
+def _users_on(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(User)).scalar()
+
+
+def _bind_for_read(app, method="GET", sticky=False):
+    with app.test_request_context("/sessions", method=method):
+        if sticky:
+            session[STICKY_KEY] = float("inf")
+        app.preprocess_request()
+        return db.session.get_bind(mapper=User, clause=select(User))
+
+
+def test_reads_in_safe_requests_go_to_a_replica(replicated_app):
+    with replicated_app.app_context():
+        primary = db.engines[None]
+    assert _bind_for_read(replicated_app) in replicas(replicated_app)
+    assert _bind_for_read(replicated_app, method="POST") is primary
+    assert _bind_for_read(replicated_app, sticky=True) is primary
+
+
+def test_reads_after_a_write_in_the_same_request_use_the_primary(replicated_app):
+    with replicated_app.test_request_context("/sessions"):
+        replicated_app.preprocess_request()
+        db.session.execute(insert(User).values(username="w", email="w@example.com", password_hash="x"))
+        assert db.session.get_bind(mapper=User, clause=select(User)) is db.engines[None]
+        assert db.session.execute(select(func.count()).select_from(User)).scalar() == 1
+        db.session.rollback()
+
+
+def test_sync_copies_the_primary_into_every_replica(replicated_app):
+    with replicated_app.app_context():
+        db.session.add(User(username="synced", email="synced@example.com", password_hash="x"))
+        db.session.commit()
+        first, second = replicas(replicated_app)
+        assert _users_on(first) == 0
+
+        assert sync_replicas() == 2
+        assert _users_on(first) == _users_on(second) == 1
+
+
+def test_client_reads_its_own_writes_until_the_sticky_window_ends(replicated_app):
+    client = replicated_app.test_client()
+    client.post("/auth/register", data={
+        "username": "fresh", "email": "fresh@example.com",
+        "password": "password123", "confirm_password": "password123",
+    })
+    client.post("/auth/login", data={"email": "fresh@example.com", "password": "password123"})
+
+    # The replicas don't have the new user yet; the client still sees itself
+    assert client.get("/sessions").status_code == 200
+
+    # Once the window is over, reads go to a replica that hasn't caught up
+    with client.session_transaction() as session:
+        session.pop(STICKY_KEY)
+    assert client.get("/sessions").status_code == 302
+
+    with replicated_app.app_context():
+        sync_replicas()
+    assert client.get("/sessions").status_code == 200
+
+
+def test_batched_writes_keep_the_client_on_the_primary(replicated_app):
+    replicated_app.config.update(WRITE_BATCHING=True, WRITE_BATCH_WINDOW=0.01)
+    client = replicated_app.test_client()
+    client.post("/auth/register", data={
+        "username": "fresh", "email": "fresh@example.com",
+        "password": "password123", "confirm_password": "password123",
+    })
+    client.post("/auth/login", data={"email": "fresh@example.com", "password": "password123"})
+    with replicated_app.app_context():
+        user = User.query.filter_by(username="fresh").one()
+        session = StudySession(title="Replicated", date=datetime.utcnow() + timedelta(days=1),
+                               time="3:00 PM", location="Library", creator_id=user.id)
+        db.session.add(session)
+        db.session.commit()
+        session_id = session.id
+        sync_replicas()
+    with client.session_transaction() as cookie:
+        cookie.pop(STICKY_KEY)
+
+    try:
+        assert client.post(f"/join_session/{session_id}").status_code == 302
+        with client.session_transaction() as cookie:
+            assert STICKY_KEY in cookie
+        joined = client.get("/api/sessions").get_json()["joined"]
+        assert [s["title"] for s in joined] == ["Replicated"]
+    finally:
+        writes.get_batcher(replicated_app).stop()
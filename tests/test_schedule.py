@@ -0,0 +1,70 @@
+# tests/test_schedule.py
+from app.main import membership, schedule
+from app.models import db, ScheduleEntry
+
+
+def test_schedule_follows_join_edit_and_leave(app, user, make_session):
+    session = make_session(user.id, "Schedule Session")
+
+    membership.join_session(session.id, user.id)
+    db.session.commit()
+    assert [e.title for e in schedule.upcoming(user.id)] == ["Schedule Session"]
+
+    session.title = "Renamed"
+    db.session.flush()
+    schedule.refresh_session(session.id)
+    db.session.commit()
+    assert [e.title for e in schedule.upcoming(user.id)] == ["Renamed"]
+
+    membership.leave_session(session.id, user.id)
+    db.session.commit()
+    assert schedule.upcoming(user.id).count() == 0
+
+
+def test_upcoming_skips_past_sessions_and_rebuild_matches(app, user, make_session):
+    past = make_session(user.id, "Old", days=-3)
+    future = make_session(user.id, "New", days=2)
+    for s in (past, future):
+        membership.join_session(s.id, user.id)
+    db.session.commit()
+
+    assert [e.session_id for e in schedule.upcoming(user.id)] == [future.id]
+
+    ScheduleEntry.query.delete()
+    schedule.rebuild()
+    db.session.commit()
+    assert ScheduleEntry.query.filter_by(user_id=user.id).count() == 2
+
+
+def test_calendar_feed_etag_and_invalidation(client, app, user, make_session):
+    session = make_session(user.id, "Schedule Session", time="3:00 PM - 5:00 PM")
+    membership.join_session(session.id, user.id)
+    db.session.commit()
+    url = f"/schedule/{schedule.feed_token(user)}.ics"
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == "text/calendar"
+    body = response.get_data(as_text=True)
+    assert "SUMMARY:Schedule Session" in body
+    assert "T150000" in body and "T170000" in body
+    etag = response.headers["ETag"]
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    membership.leave_session(session.id, user.id)
+    db.session.commit()
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert "VEVENT" not in changed.get_data(as_text=True)
+
+
+def test_calendar_feed_rejects_bad_token(client):
+    assert client.get("/schedule/not-a-token.ics").status_code == 404
+
+
+def test_my_schedule_page(auth_client, user, make_session):
+    make_session(user.id)
+    response = auth_client.get("/my_schedule")
+    assert response.status_code == 200
+    assert b"/schedule/" in response.data
@@ -0,0 +1,244 @@
+# tests/test_sharding.py
+import io
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from flask import g
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, inspect
+
+from app import create_app, init_db, notifications, sharding
+from app.main import bulk, commenting, membership, schedule
+from app.models import db, Course, User
+from app.schema import add_missing_columns
+
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    """An app over file databases in tmp_path with two course shards and one logged-in-able user."""
+    app = create_app({
+        "TESTING": True,
+        "WTF_CSRF_ENABLED": False,
+        "TASK_QUEUE_MODE": "eager",
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'main.db'}",
+        "SQLALCHEMY_BINDS": {
+            "archive": f"sqlite:///{tmp_path / 'archive.db'}",
+            "tasks": f"sqlite:///{tmp_path / 'tasks.db'}",
+        },
+        "COURSE_SHARDS": [f"sqlite:///{tmp_path / 'shard1.db'}", f"sqlite:///{tmp_path / 'shard2.db'}"],
+        "TEMPLATE_CACHE_DIR": str(tmp_path / "jinja_cache"),
+        "CACHE_L2_PATH": str(tmp_path / "cache.sqlite3"),
+        "IDEMPOTENCY_STORE_PATH": str(tmp_path / "idempotency.sqlite3"),
+        "NOTIFICATION_MAILDIR": str(tmp_path / "maildir"),
+    })
+    init_db(app)
+    with app.app_context():
+        user = User(username="sharded", email="sharded@example.com")
+        user.set_password("password123")
+        db.session.add(user)
+        db.session.commit()
+        yield app
+        db.session.remove()
+        for engine in [*db.engines.values(), *sharding.shards(app).values()]:
+            engine.dispose()
+
+
+@pytest.fixture
+def client(sharded_app):
+    client = sharded_app.test_client()
+    client.post("/auth/login", data={"email": "sharded@example.com", "password": "password123"})
+    return client
+
+
+def _add_courses(app, *codes):
+    runner = app.test_cli_runner()
+    for code in codes:
+        result = runner.invoke(args=["create-course", code, f"{code} course"])
+        assert result.exit_code == 0, result.output
+    return {c.code: c for c in Course.query}
+
+
+def _create(client, title, days, course=None, **fields):
+    data = {
+        "title": title, "date": (datetime.utcnow() + timedelta(days=days)).strftime("%Y-%m-%d"),
+        "time": "3:00 PM", "location": "Library", "recurrence_interval": "weekly", **fields,
+    }
+    if course is not None:
+        data["course"] = course.id
+    assert client.post("/create_session", data=data).status_code == 302
+
+
+def _rows(path, sql):
+    with sqlite3.connect(path) as connection:
+        return connection.execute(sql).fetchall()
+
+
+def test_courses_go_to_the_least_loaded_shard(sharded_app):
+    courses = _add_courses(sharded_app, "CS101", "MATH2", "PHYS1")
+    assert [courses[code].shard for code in ("CS101", "MATH2", "PHYS1")] == [1, 2, 1]
+    result = sharded_app.test_cli_runner().invoke(args=["create-course", "CS101", "Again"])
+    assert result.exit_code != 0
+
+
+def test_a_course_session_lives_in_its_shard(sharded_app, client, tmp_path):
+    course = _add_courses(sharded_app, "CS101", "MATH2")["MATH2"]
+    _create(client, "Proofs", 2, course)
+
+    [(session_id, course_id)] = _rows(tmp_path / "shard2.db", "SELECT id, course_id FROM study_session")
+    assert session_id > 2 * sharding.SHARD_ID_SPAN and course_id == course.id
+    assert _rows(tmp_path / "main.db", "SELECT id FROM study_session") == []
+    assert _rows(tmp_path / "shard2.db", "SELECT session_id FROM schedule_entry") == [(session_id,)]
+
+    page = client.get("/course/MATH2").get_data(as_text=True)
+    assert "Proofs" in page
+    detail = client.get(f"/session/{session_id}")
+    assert detail.status_code == 200 and "Proofs" in detail.get_data(as_text=True)
+
+
+def test_join_comment_and_delete_stay_in_the_shard(sharded_app, client, tmp_path):
+    course = _add_courses(sharded_app, "CS101")["CS101"]
+    other = User(username="other", email="other@example.com")
+    other.set_password("password123")
+    db.session.add(other)
+    db.session.commit()
+    _create(client, "Pointers", 2, course)
+    [(session_id,)] = _rows(tmp_path / "shard1.db", "SELECT id FROM study_session")
+
+    guest = sharded_app.test_client()
+    g.pop("_login_user", None)   # the fixture's app context (and g) outlives each request
+    guest.post("/auth/login", data={"email": "other@example.com", "password": "password123"})
+    assert guest.post(f"/join_session/{session_id}").status_code == 302
+    assert guest.post(f"/session/{session_id}/comment", data={"content": "See you there"}).status_code == 302
+    g.pop("_login_user", None)
+    assert "See you there" in client.get(f"/session/{session_id}").get_data(as_text=True)
+    assert len(_rows(tmp_path / "shard1.db", "SELECT * FROM session_members")) == 2
+
+    g.pop("_login_user", None)
+    assert client.post(f"/delete_session/{session_id}").status_code == 302
+    for table in ("study_session", "session_members", "session_comment", "schedule_entry"):
+        assert _rows(tmp_path / "shard1.db", f"SELECT * FROM {table}") == []
+
+
+def test_raising_capacity_promotes_the_waitlist_in_the_shard(sharded_app, client, tmp_path):
+    course = _add_courses(sharded_app, "CS101")["CS101"]
+    other = User(username="other", email="other@example.com")
+    db.session.add(other)
+    db.session.commit()
+    _create(client, "Pointers", 2, course, capacity=1)
+    [(session_id,)] = _rows(tmp_path / "shard1.db", "SELECT id FROM study_session")
+    with sharding.for_session(session_id):
+        assert membership.join_session(session_id, other.id) == membership.WAITLISTED
+        db.session.commit()
+
+    g.pop("_login_user", None)
+    response = client.post(f"/edit_session/{session_id}", data={
+        "title": "Pointers", "date": (datetime.utcnow() + timedelta(days=2)).strftime("%Y-%m-%d"),
+        "time": "3:00 PM", "location": "Library", "recurrence_interval": "weekly", "capacity": 2,
+    })
+    assert response.status_code == 302
+    assert len(_rows(tmp_path / "shard1.db", "SELECT * FROM session_members")) == 2
+    assert _rows(tmp_path / "shard1.db", "SELECT * FROM session_waitlist") == []
+    assert (other.id,) in _rows(tmp_path / "shard1.db", "SELECT user_id FROM schedule_entry")
+    assert _rows(tmp_path / "main.db", f"SELECT schedule_version > 0 FROM user WHERE id = {other.id}") == [(1,)]
+
+
+def test_listing_and_schedule_merge_every_shard(sharded_app, client, tmp_path):
+    courses = _add_courses(sharded_app, "CS101", "MATH2")
+    _create(client, "Late", 9, courses["CS101"])
+    _create(client, "Middle", 5)
+    _create(client, "Early", 1, courses["MATH2"])
+
+    listing = client.get("/api/sessions").get_json()
+    assert [s["title"] for s in listing["joined"]] == ["Middle", "Late", "Early"]   # id order
+
+    page = client.get("/my_schedule").get_data(as_text=True)
+    assert page.index("Early") < page.index("Middle") < page.index("Late")
+    token = schedule.feed_token(User.query.filter_by(username="sharded").one())
+    ics = client.get(f"/schedule/{token}.ics").get_data(as_text=True)
+    assert ics.index("Early") < ics.index("Middle") < ics.index("Late")
+
+
+def test_digests_cover_every_shard(sharded_app, client, tmp_path):
+    sharded_app.config["NOTIFICATION_SINK"] = "memory"
+    sharded_app.extensions.pop("notification_sink", None)
+    courses = _add_courses(sharded_app, "CS101", "MATH2")
+    other = User(username="other", email="other@example.com")
+    db.session.add(other)
+    db.session.commit()
+    _create(client, "Pointers", 2, courses["CS101"])
+    _create(client, "Proofs", 2, courses["MATH2"])
+    _create(client, "Essays", 2)
+    session_ids = [row[0] for db_file in ("shard1.db", "shard2.db", "main.db")
+                   for row in _rows(tmp_path / db_file, "SELECT id FROM study_session")]
+    notifications.send_digests()
+
+    for session_id in session_ids:
+        with sharding.for_session(session_id):
+            membership.join_session(session_id, other.id)
+            commenting.add_comment(session_id, other.id, f"Hello {session_id}")
+            db.session.commit()
+
+    sink = notifications.get_sink()
+    sink.messages.clear()
+    assert notifications.send_digests() == 1
+    body = sink.messages[0].body
+    assert all(title in body for title in ("Pointers", "Proofs", "Essays"))
+    assert all(f'other commented: "Hello {session_id}"' in body for session_id in session_ids)
+    assert notifications.send_digests() == 0
+
+
+def test_analytics_and_member_import_cover_every_shard(sharded_app, client, tmp_path):
+    np = pytest.importorskip("numpy")
+    from app.main import analytics
+
+    courses = _add_courses(sharded_app, "CS101", "MATH2")
+    other = User(username="other", email="other@example.com")
+    db.session.add(other)
+    db.session.commit()
+    _create(client, "Pointers", 2, courses["CS101"], topic="Computing")
+    _create(client, "Proofs", 2, courses["MATH2"], topic="Maths")
+    session_ids = [row[0] for db_file in ("shard1.db", "shard2.db")
+                   for row in _rows(tmp_path / db_file, "SELECT id FROM study_session")]
+
+    members = "session_id,member\n" + "".join(f"{session_id},other\n" for session_id in session_ids)
+    result = bulk.import_memberships(bulk.read_rows(io.StringIO(members), "csv"))
+    assert result.errors == [] and sorted(result.imported) == [(i, other.id) for i in session_ids]
+    assert [len(_rows(tmp_path / f, "SELECT * FROM session_members")) for f in ("shard1.db", "shard2.db")] == [2, 2]
+
+    dataset = analytics.Dataset(np)
+    dataset.refresh(rebuild_interval=3600)
+    assert list(dataset.session_id) == session_ids
+    assert list(dataset.participants) == [2, 2]
+
+    _create(client, "Essays", 3, topic="Writing")            # a primary id, below both shards' ranges
+    with sharding.for_session(session_ids[0]):
+        commenting.add_comment(session_ids[0], other.id, "Bring a laptop")
+        db.session.commit()
+    dataset.refresh(rebuild_interval=3600)
+    assert dataset.loads == 1                                # appended, not reloaded
+    assert list(dataset.session_id[1:]) == session_ids and list(dataset.participants) == [1, 2, 2]
+    assert list(dataset.topic) == ["Writing", "Computing", "Maths"]
+    assert list(dataset.comment_session) == [session_ids[0]]
+
+
+def test_recurring_copies_follow_their_parent(sharded_app, client, tmp_path):
+    course = _add_courses(sharded_app, "CS101")["CS101"]
+    _create(client, "Weekly", 1, course, is_recurring="y")
+    rows = _rows(tmp_path / "shard1.db", "SELECT title, course_id FROM study_session")
+    assert rows == [("Weekly", course.id)] * 5
+
+
+def test_add_missing_columns(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    old = MetaData()
+    Table("study_session", old, Column("id", Integer, primary_key=True), Column("title", String(200)))
+    old.create_all(engine)
+
+    new = MetaData()
+    Table("study_session", new, Column("id", Integer, primary_key=True), Column("title", String(200)),
+          Column("course_id", Integer, index=True))
+    assert add_missing_columns(engine, new) == ["study_session.course_id"]
+    assert add_missing_columns(engine, new) == []
+    assert "course_id" in {c["name"] for c in inspect(engine).get_columns("study_session")}
+    assert inspect(engine).get_indexes("study_session")[0]["column_names"] == ["course_id"]
+    engine.dispose()
@@ -0,0 +1,94 @@
+# tests/test_startup.py
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import inspect, text
+
+from app import create_app
+from app.models import db
+
+
+def test_create_app_does_not_open_database_connections():
+    app = create_app()
+    with app.app_context():
+        for engine in db.engines.values():
+            assert engine.pool.checkedin() == 0
+            assert engine.pool.checkedout() == 0
+
+
+@pytest.mark.live_db   # drops and creates tables through the engines
+def test_init_db_command_creates_tables(app):
+    db.drop_all()
+    assert "study_session" not in inspect(db.engine).get_table_names()
+
+    result = app.test_cli_runner().invoke(args=["init-db"])
+
+    assert "Database initialized." in result.output
+    assert "study_session" in inspect(db.engine).get_table_names()
+    assert "task_queue" in inspect(db.engines["tasks"]).get_table_names()
+
+
+def test_compile_templates_fills_bytecode_cache(app):
+    cache = app.jinja_env.bytecode_cache
+    cache.clear()
+
+    result = app.test_cli_runner().invoke(args=["compile-templates"])
+
+    assert "Compiled" in result.output
+    assert any(name.endswith(".cache") for name in os.listdir(cache.directory))
+
+
+def test_heavy_modules_are_deferred_until_needed():
+    # A fresh interpreter, so nothing imported by other tests leaks in
+    code = (
+        "import sys\n"
+        "from app import create_app, tasks\n"
+        "create_app()\n"
+        "assert 'app.main.bulk' not in sys.modules\n"
+        "assert 'app.main.archive' not in sys.modules\n"
+        "tasks._lookup('archive_sessions')\n"
+        "assert 'app.main.archive' in sys.modules\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], cwd=root, check=True)
+
+
+# The tables as the app created them before schema upgrades existed
+BASELINE_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER NOT NULL PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE,
+    email VARCHAR(120) NOT NULL UNIQUE, password_hash VARCHAR(128));
+CREATE TABLE study_session (
+    id INTEGER NOT NULL PRIMARY KEY, title VARCHAR(200) NOT NULL, date DATETIME NOT NULL,
+    time VARCHAR(20) NOT NULL, location VARCHAR(200) NOT NULL, topic VARCHAR(100),
+    creator_id INTEGER NOT NULL REFERENCES user (id), created_at DATETIME, is_recurring BOOLEAN,
+    recurrence_interval VARCHAR(20), parent_id INTEGER REFERENCES study_session (id));
+CREATE TABLE session_members (
+    user_id INTEGER NOT NULL REFERENCES user (id),
+    session_id INTEGER NOT NULL REFERENCES study_session (id), PRIMARY KEY (user_id, session_id));
+CREATE TABLE session_comment (
+    id INTEGER NOT NULL PRIMARY KEY, content TEXT NOT NULL, timestamp DATETIME,
+    user_id INTEGER NOT NULL REFERENCES user (id),
+    session_id INTEGER NOT NULL REFERENCES study_session (id));
+INSERT INTO user (id, username, email) VALUES (1, 'old', 'old@example.com');
+INSERT INTO study_session (id, title, date, time, location, creator_id)
+    VALUES (1, 'Old Algebra', '2999-01-01 15:00:00.000000', '3:00 PM', 'Library', 1);
+INSERT INTO session_members VALUES (1, 1);
+"""
+
+
+@pytest.mark.live_db
+def test_init_db_upgrades_a_database_from_before_the_upgrades(app):
+    db.drop_all()
+    with db.engine.begin() as conn:
+        conn.connection.driver_connection.executescript(BASELINE_SCHEMA)
+    db.engine.dispose()
+
+    result = app.test_cli_runner().invoke(args=["init-db"])
+
+    assert result.exit_code == 0, result.output
+    assert db.session.scalar(text("SELECT schedule_version FROM user WHERE id = 1")) is not None
+    assert db.session.execute(text("SELECT user_id, session_id, title FROM schedule_entry")).all() == [
+        (1, 1, "Old Algebra")]
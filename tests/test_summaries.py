@@ -0,0 +1,56 @@
+# tests/test_summaries.py
+import pytest
+
+from app.main import membership, summaries
+from app.models import db, StudySession
+
+
+@pytest.fixture
+def other(make_user):
+    return make_user("other")
+
+
+def test_listing_splits_joined_and_available_with_precomputed_fields(app, user, other, make_session):
+    mine = make_session(user.id, "Mine").id
+    membership.join_session(mine, user.id)
+    full = make_session(other.id, "Full", capacity=1).id
+    membership.join_session(full, other.id)
+    past = make_session(other.id, "Past", days=-3).id
+    db.session.commit()
+
+    joined, available = summaries.listing(user.id)
+
+    assert [s.id for s in joined] == [mine]
+    assert [s.id for s in available] == [full, past]
+    by_id = {s.id: s for s in available}
+    assert by_id[full].is_full and not by_id[full].is_past
+    assert by_id[full].participant_count == 1
+    assert by_id[full].creator_name == "other"
+    assert by_id[past].is_past and not by_id[past].is_full
+    assert joined[0].is_member and not by_id[full].is_member
+
+
+def test_summaries_are_slotted_and_not_in_the_session(app, user, make_session):
+    make_session(user.id, "Compact")
+    summary = summaries.load_summaries(summaries.summary_query())[0]
+
+    assert not hasattr(summary, "__dict__")
+    with pytest.raises(AttributeError):
+        summary.extra = 1
+    assert not any(isinstance(obj, StudySession) for obj in db.session.identity_map.values())
+
+
+def test_sessions_page_and_api_use_summaries(auth_client, user, other, make_session):
+    session_id = make_session(other.id, "Algebra", capacity=1).id
+    membership.join_session(session_id, other.id)
+    db.session.commit()
+
+    page = auth_client.get("/sessions")
+    assert b"Join Waitlist" in page.data
+    assert b"other" in page.data
+
+    data = auth_client.get("/api/sessions").get_json()
+    assert data["joined"] == []
+    assert data["available"][0]["id"] == session_id
+    assert data["available"][0]["is_full"] is True
+    assert data["available"][0]["creator"] == "other"
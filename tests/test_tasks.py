@@ -0,0 +1,103 @@
+# tests/test_tasks.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import tasks
+from app.models import db, StudySession, Task
+
+# The worker claims tasks on its own connections, so these tests commit for real
+pytestmark = pytest.mark.live_db
+
+calls = []
+
+
+@tasks.task("test_record")
+def record(value):
+    calls.append(value)
+
+
+@tasks.task("test_flaky", max_attempts=2)
+def flaky():
+    calls.append("attempt")
+    if len(calls) == 1:
+        raise RuntimeError("first attempt fails")
+
+
+@pytest.fixture
+def queued_app(app):
+    """App whose tasks are queued in the table instead of running eagerly."""
+    calls.clear()
+    app.config.update(TASK_QUEUE_MODE="external", TASK_RETRY_BACKOFF=0)
+    yield app
+    Task.query.delete()
+    db.session.commit()
+
+
+def test_eager_mode_runs_inline(app):
+    calls.clear()
+    assert tasks.enqueue("test_record", 42) is None
+    assert calls == [42]
+
+
+def test_worker_runs_queued_tasks(queued_app):
+    task_id = tasks.enqueue("test_record", "hello")
+    assert calls == []
+    assert db.session.get(Task, task_id).status == "pending"
+
+    assert tasks.Worker(queued_app).run_until_empty() == 1
+    assert calls == ["hello"]
+    db.session.expire_all()
+    assert db.session.get(Task, task_id).status == "done"
+
+
+def test_failed_task_is_retried_then_succeeds(queued_app):
+    task_id = tasks.enqueue("test_flaky")
+    worker = tasks.Worker(queued_app)
+
+    assert worker.run_until_empty() == 2
+    task = db.session.get(Task, task_id)
+    assert task.status == "done"
+    assert task.attempts == 2
+    assert "first attempt fails" in task.last_error
+
+
+def test_delayed_and_deduplicated_tasks(queued_app):
+    assert tasks.enqueue("test_record", 1, delay=3600) is not None
+    assert tasks.Worker(queued_app).run_until_empty() == 0
+
+    first = tasks.enqueue_periodic("test_record", 60)
+    assert tasks.enqueue_periodic("test_record", 60) is None
+    assert first is not None
+
+
+def test_finished_tasks_are_purged_daily(queued_app):
+    old = datetime.utcnow() - timedelta(days=8)
+    db.session.add_all([
+        Task(name="test_record", payload="[[], {}]", status="done", attempts=1, max_attempts=3,
+             run_at=old, created_at=old, finished_at=old),
+        Task(name="test_flaky", payload="[[], {}]", status="failed", attempts=2, max_attempts=2,
+             run_at=old, created_at=old, finished_at=old + timedelta(days=2)),
+    ])
+    db.session.commit()
+
+    worker = tasks.Worker(queued_app)
+    worker.schedule_periodic()
+    worker.run_until_empty()
+    db.session.expire_all()
+    remaining = {(task.name, task.status) for task in Task.query}
+    assert ("test_record", "done") not in remaining
+    assert ("test_flaky", "failed") in remaining           # finished 6 days ago
+    assert ("purge_finished_tasks", "done") in remaining
+
+
+def test_recurring_sessions_created_by_background_task(queued_app, auth_client, user):
+    date = (datetime.utcnow() + timedelta(days=2)).strftime("%Y-%m-%d")
+    auth_client.post("/create_session", data={
+        "title": "Weekly Review", "date": date, "time": "3:00 PM", "location": "Library",
+        "is_recurring": "y", "recurrence_interval": "weekly",
+    })
+    assert StudySession.query.filter_by(title="Weekly Review").count() == 1
+
+    tasks.Worker(queued_app).run_until_empty()
+    assert StudySession.query.filter_by(title="Weekly Review").count() == 5
@@ -0,0 +1,99 @@
+# tests/test_writes.py
+import threading
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import writes
+from app.main import commenting, membership
+from app.models import ActivityEvent, SessionComment
+
+pytestmark = pytest.mark.live_db
+
+
+@pytest.fixture
+def batching(app):
+    app.config.update(WRITE_BATCHING=True, WRITE_BATCH_WINDOW=0.05)
+    yield writes.get_batcher(app)
+    writes.get_batcher(app).stop()
+
+
+@pytest.fixture
+def session_id(user, make_session):
+    return make_session(user.id, "Rush Hour", time="9:00 AM", location="Hall A", capacity=5).id
+
+
+@pytest.fixture
+def students(make_users):
+    return [u.id for u in make_users(*(f"student{i}" for i in range(12)))]
+
+
+def _in_threads(app, calls):
+    results, errors = {}, {}
+
+    def worker(key, func, args):
+        with app.app_context():
+            try:
+                results[key] = writes.run(func, *args)
+            except Exception as exc:
+                errors[key] = exc
+
+    threads = [threading.Thread(target=worker, args=call) for call in calls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_writes_share_commits(app, batching, session_id, students):
+    calls = [(f"join{uid}", membership.join_session, (session_id, uid)) for uid in students]
+    calls += [(f"comment{uid}", commenting.add_comment, (session_id, uid, f"hi from {uid}")) for uid in students]
+    results, errors = _in_threads(app, calls)
+
+    assert errors == {}
+    statuses = [results[f"join{uid}"] for uid in students]
+    assert statuses.count(membership.JOINED) == 5          # the capacity still holds
+    assert statuses.count(membership.WAITLISTED) == 7
+    assert SessionComment.query.filter_by(session_id=session_id).count() == 12
+    assert batching.writes == 24
+    assert batching.batches < 24
+
+
+def test_a_failing_write_only_fails_its_own_request(app, batching, session_id, students):
+    calls = [(uid, commenting.add_comment, (session_id, uid, "fine")) for uid in students[:5]]
+    calls.append(("bad", commenting.add_comment, (999999, students[0], "no such session")))
+    results, errors = _in_threads(app, calls)
+
+    assert set(errors) == {"bad"} and isinstance(errors["bad"], IntegrityError)
+    assert len(results) == 5
+    assert SessionComment.query.filter_by(content="fine").count() == 5
+    assert ActivityEvent.query.filter_by(session_id=999999).count() == 0   # its event rolled back too
+
+
+def test_one_users_writes_apply_in_order(app, batching, session_id, students):
+    uid = students[0]
+    noise = [(f"n{other}", commenting.add_comment, (session_id, other, "noise")) for other in students[1:]]
+    ids = []
+
+    def in_order():
+        with app.app_context():
+            for i in range(10):
+                ids.append(writes.run(commenting.add_comment, session_id, uid, f"step {i}"))
+
+    thread = threading.Thread(target=in_order)
+    thread.start()
+    _in_threads(app, noise)
+    thread.join()
+
+    steps = [c.content for c in SessionComment.query.filter_by(user_id=uid).order_by(SessionComment.id)]
+    assert steps == [f"step {i}" for i in range(10)]
+    assert ids == sorted(ids)
+
+
+def test_routes_write_through_the_batcher(app, batching, auth_client, session_id):
+    response = auth_client.post(f"/session/{session_id}/comment", data={"content": "Batched hello"})
+    assert response.status_code == 302
+    assert auth_client.post(f"/join_session/{session_id}").status_code == 302
+    assert batching.writes == 2
+    assert "Batched hello" in auth_client.get(f"/session/{session_id}").get_data(as_text=True)